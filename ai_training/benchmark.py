@@ -0,0 +1,243 @@
+"""
+One benchmark over every trained model: accuracy on test.csv next to what
+it costs to serve.
+
+  stage1     final_model_uncertainty.cbm (+ calibration factor from calibration_info.json)
+  twostage   stage1 + stage2_luxury_model.cbm, sigmoid-gated (calibration_info stage2_config)
+  tweedie    final_model_tweedie_fixed.cbm (+ tweedie_scale.txt)
+  student    student_model.cbm (ai_training/distill.py)
+  linear     linear_baseline.joblib (ai_training/linear_reg.py)
+
+Models whose files are missing are skipped. Each one gets MAE (AED), MedAPE,
+90% interval coverage (models with an uncertainty), the median latency of a
+one-listing predict call, batch throughput over the whole test set, size on
+disk and load time (best of LOAD_REPEATS, so one-off imports don't count).
+Latency is the model call only. Every model gets the same build_features
+frame, with string columns as the API builds it (category columns make
+one-row CatBoost calls several times slower).
+
+Every run is appended to BENCHMARK_PATH with a timestamp, so runs can be
+compared over time.
+
+    python -m ai_training.benchmark
+    python -m ai_training.benchmark --models stage1 student --repeats 500
+"""
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor
+
+from ai_training.distill import predict_mu_sigma
+from ai_training.features import FEATURES, NUM_FEATURES, SCHEMA_HASH, check_schema
+from ai_training.incremental import load_rows
+
+# =========================
+# CONFIG
+# =========================
+MODELS_DIR = Path("ai_training/outputs")
+TEST_PATH = Path("ai_training/datasets/test.csv")
+BENCHMARK_PATH = Path("ai_training/outputs/benchmarks.csv")
+
+TARGET = "log_price"  # log1p(price)
+LATENCY_REPEATS = 200
+LOAD_REPEATS = 3
+Z_90 = 1.645
+
+# (predicted price, interval low, interval high); no interval -> None, None
+Prediction = Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]
+
+
+@dataclass
+class Candidate:
+    files: List[str]                                  # in MODELS_DIR
+    load: Callable[[Path], Any]                       # models dir -> loaded model(s)
+    predict: Callable[[Any, pd.DataFrame], Prediction]
+
+
+# =========================
+# LOADERS / PREDICTORS
+# =========================
+def _load_cbm(path: Path, check: bool = True) -> CatBoostRegressor:
+    model = CatBoostRegressor()
+    model.load_model(str(path))
+    if check:
+        check_schema(model)
+    return model
+
+
+def _calibration_info(models_dir: Path) -> Dict[str, Any]:
+    path = models_dir / "calibration_info.json"
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _calibration_factor(info: Dict[str, Any]) -> float:
+    return float(info.get("recommended_for_production", info.get("calibration_factor", 1.0)))
+
+
+def _interval(center_log: np.ndarray, sigma_log: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return (np.maximum(np.expm1(center_log - Z_90 * sigma_log), 0.0),
+            np.maximum(np.expm1(center_log + Z_90 * sigma_log), 0.0))
+
+
+def _uncertainty_loader(filename: str) -> Callable[[Path], Any]:
+    """Stage 1 or a distilled student: [mu, log sigma] model + calibration factor."""
+    def load(models_dir: Path):
+        return _load_cbm(models_dir / filename), _calibration_factor(_calibration_info(models_dir))
+    return load
+
+
+def _predict_uncertainty(loaded, X: pd.DataFrame) -> Prediction:
+    model, factor = loaded
+    mu, sigma = predict_mu_sigma(model, X)
+    price = np.maximum(np.expm1(mu + 0.5 * sigma ** 2), 0.0)
+    return (price, *_interval(mu, sigma * factor))
+
+
+def _load_twostage(models_dir: Path):
+    info = _calibration_info(models_dir)
+    config = info["stage2_config"]
+    return {
+        "stage1": _load_cbm(models_dir / "final_model_uncertainty.cbm"),
+        "stage2": _load_cbm(models_dir / "stage2_luxury_model.cbm", check=False),  # Stage 1 outputs as inputs
+        "factor": _calibration_factor(info),
+        "threshold_log": float(np.log1p(config["luxury_threshold_aed"])),
+        "tau": float(config["sigmoid_tau"]),
+        "beta": float(config["sigma_inflation_beta"]),
+        "features": list(config["stage2_features"]),
+    }
+
+
+def _predict_twostage(m, X: pd.DataFrame) -> Prediction:
+    """predict_price_two_stage from catboost_reg.py."""
+    mu, sigma = predict_mu_sigma(m["stage1"], X)
+    w = 1 / (1 + np.exp(-np.clip((mu - m["threshold_log"]) / m["tau"], -500, 500)))
+    X2 = X.assign(mu_log_stage1=mu, sigma_log_stage1=sigma)[m["features"]]
+    final_log = mu + w * m["stage2"].predict(X2)
+    price = np.maximum(np.expm1(final_log + 0.5 * sigma ** 2), 0.0)
+    return (price, *_interval(final_log, sigma * m["factor"] * (1 + m["beta"] * w)))
+
+
+def _load_tweedie(models_dir: Path):
+    return _load_cbm(models_dir / "final_model_tweedie_fixed.cbm"), float((models_dir / "tweedie_scale.txt").read_text())
+
+
+def _predict_tweedie(loaded, X: pd.DataFrame) -> Prediction:
+    model, scale = loaded
+    return np.asarray(model.predict(X), dtype=float) * scale, None, None
+
+
+def _load_linear(models_dir: Path):
+    import joblib
+
+    return joblib.load(models_dir / "linear_baseline.joblib")
+
+
+def _predict_linear(pipeline, X: pd.DataFrame) -> Prediction:
+    return np.expm1(pipeline.predict(X[NUM_FEATURES].astype(float))), None, None
+
+
+CANDIDATES: Dict[str, Candidate] = {
+    "stage1": Candidate(["final_model_uncertainty.cbm", "calibration_info.json"],
+                        _uncertainty_loader("final_model_uncertainty.cbm"), _predict_uncertainty),
+    "twostage": Candidate(["final_model_uncertainty.cbm", "stage2_luxury_model.cbm", "calibration_info.json"],
+                          _load_twostage, _predict_twostage),
+    "tweedie": Candidate(["final_model_tweedie_fixed.cbm", "tweedie_scale.txt"], _load_tweedie, _predict_tweedie),
+    "student": Candidate(["student_model.cbm", "calibration_info.json"],
+                         _uncertainty_loader("student_model.cbm"), _predict_uncertainty),
+    "linear": Candidate(["linear_baseline.joblib"], _load_linear, _predict_linear),
+}
+
+
+# =========================
+# MEASURE
+# =========================
+def accuracy(true_price: np.ndarray, pred: Prediction) -> Dict[str, float]:
+    price, low, high = pred
+    return {
+        "MAE_AED": float(np.mean(np.abs(true_price - price))),
+        "MedAPE_%": float(np.median(np.abs((true_price - price) / np.maximum(true_price, 1e-9))) * 100),
+        "Coverage_90_%": float(np.mean((true_price >= low) & (true_price <= high)) * 100) if low is not None else np.nan,
+    }
+
+
+def serving_cost(candidate: Candidate, loaded, X: pd.DataFrame, repeats: int = LATENCY_REPEATS) -> Dict[str, float]:
+    """Median ms of a one-listing call (cycling through the test rows) and rows/s of one batch call."""
+    singles = [X.iloc[[i % len(X)]] for i in range(repeats)]
+    candidate.predict(loaded, singles[0])  # warm-up
+    times = []
+    for row in singles:
+        t0 = time.perf_counter()
+        candidate.predict(loaded, row)
+        times.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    candidate.predict(loaded, X)
+    return {"single_ms": float(np.median(times) * 1e3), "batch_rows_per_s": len(X) / (time.perf_counter() - t0)}
+
+
+def run(names: Sequence[str] = tuple(CANDIDATES), models_dir: Path = MODELS_DIR,
+        test_path: Path = TEST_PATH, repeats: int = LATENCY_REPEATS) -> pd.DataFrame:
+    test = load_rows(test_path)
+    X, true_price = test[FEATURES], np.expm1(test[TARGET].to_numpy())
+    run_at = datetime.now().isoformat(timespec="seconds")
+
+    rows = []
+    for name in names:
+        candidate = CANDIDATES[name]
+        missing = [f for f in candidate.files if not (models_dir / f).exists()]
+        if missing:
+            print(f"[!] {name}: skipped, missing {', '.join(missing)}")
+            continue
+        load_times = []
+        for _ in range(LOAD_REPEATS):
+            t0 = time.perf_counter()
+            loaded = candidate.load(models_dir)
+            load_times.append(time.perf_counter() - t0)
+        rows.append({
+            "run_at": run_at,
+            "model": name,
+            "rows": len(X),
+            **accuracy(true_price, candidate.predict(loaded, X)),
+            **serving_cost(candidate, loaded, X, repeats),
+            "size_mb": sum((models_dir / f).stat().st_size for f in candidate.files) / 2**20,
+            "load_ms": min(load_times) * 1e3,
+            "feature_schema": SCHEMA_HASH,
+        })
+        print(f"[+] {name}: done")
+    return pd.DataFrame(rows)
+
+
+def main(names: Sequence[str] = tuple(CANDIDATES), models_dir: Path = MODELS_DIR,
+         repeats: int = LATENCY_REPEATS, out_path: Optional[Path] = BENCHMARK_PATH) -> pd.DataFrame:
+    report = run(names, models_dir, TEST_PATH, repeats)
+    if report.empty:
+        print(f"[!] No model artifacts found in {models_dir}")
+        return report
+
+    shown = report.drop(columns=["run_at", "feature_schema"])
+    with pd.option_context("display.width", 200, "display.float_format", "{:,.3f}".format):
+        print("\n" + shown.to_string(index=False))
+
+    if out_path is not None:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        report.to_csv(out_path, mode="a", header=not out_path.exists(), index=False)
+        print(f"\n[+] Appended {len(report)} rows to {out_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every trained model on test.csv.")
+    parser.add_argument("--models", nargs="+", choices=list(CANDIDATES), default=list(CANDIDATES))
+    parser.add_argument("--models-dir", type=Path, default=MODELS_DIR)
+    parser.add_argument("--repeats", type=int, default=LATENCY_REPEATS, help="one-listing calls timed per model")
+    parser.add_argument("--output", type=Path, default=BENCHMARK_PATH, help="history CSV the results are appended to")
+    parser.add_argument("--no-save", action="store_true", help="print only")
+    args = parser.parse_args()
+
+    main(args.models, args.models_dir, args.repeats, None if args.no_save else args.output)
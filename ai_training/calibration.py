@@ -0,0 +1,150 @@
+"""
+Uncertainty calibration for log-space (mu, sigma) predictions.
+
+A sigma scale s gives coverage = share of rows with |y - mu| / sigma <= z * s,
+so the scale that hits a target coverage is simply a quantile of the
+normalised residuals r = |y - mu| / sigma divided by z. Everything here sorts
+r once (O(n log n)) and reads answers off the sorted array:
+
+  calibration_factor    one factor for a target coverage
+  segment_factors       one factor per segment (price band, brand, gate weight bin)
+  coverage_curve        actual coverage at many nominal levels at once
+
+Used by catboost_reg.py (factor from the K-fold OOF predictions) and
+plot_calibration.py (calibration curves).
+"""
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+# =========================
+# CONFIG
+# =========================
+TARGET_COVERAGE = 0.90
+FACTOR_BOUNDS = (0.5, 3.0)       # same range the old minimize_scalar search used
+MIN_SEGMENT_ROWS = 50            # smaller segments use the overall factor
+CURVE_LEVELS = (0.50, 0.68, 0.80, 0.90, 0.95)
+
+# Price bands (AED) for per-segment factors; pass the *predicted* price so
+# the same bands can be looked up at serving time
+PRICE_BAND_EDGES = (0, 50_000, 100_000, 200_000, 400_000, 800_000, np.inf)
+
+
+def z_for(coverage: float) -> float:
+    """Half-width in sigmas of a central normal interval: 0.90 -> 1.645."""
+    return float(norm.ppf(0.5 + coverage / 2))
+
+
+# =========================
+# RESIDUALS
+# =========================
+def normalized_residuals(y_true_log, mu_log, sigma_log) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (|y - mu| / sigma, valid mask). Rows with a missing value or sigma <= 0
+    are not valid and get NaN.
+    """
+    y = np.asarray(y_true_log, dtype=float)
+    mu = np.asarray(mu_log, dtype=float)
+    sigma = np.asarray(sigma_log, dtype=float)
+    valid = np.isfinite(y) & np.isfinite(mu) & np.isfinite(sigma) & (sigma > 0)
+    r = np.full(len(y), np.nan)
+    r[valid] = np.abs(y[valid] - mu[valid]) / sigma[valid]
+    return r, valid
+
+
+def _factor_from_sorted(r_sorted: np.ndarray, coverage: float, bounds=FACTOR_BOUNDS) -> float:
+    """Smallest scale covering at least `coverage` of the sorted residuals."""
+    n = len(r_sorted)
+    if n == 0:
+        return np.nan
+    k = min(n - 1, max(0, int(np.ceil(coverage * n)) - 1))
+    factor = r_sorted[k] / z_for(coverage)
+    return float(np.clip(factor, *bounds)) if bounds else float(factor)
+
+
+# =========================
+# FACTORS
+# =========================
+def calibration_factor(y_true_log, mu_log, sigma_log, target_coverage=TARGET_COVERAGE,
+                       bounds: Optional[Tuple[float, float]] = FACTOR_BOUNDS) -> float:
+    """Scale for sigma so that mu ± z * scale * sigma covers target_coverage of the rows."""
+    r, valid = normalized_residuals(y_true_log, mu_log, sigma_log)
+    return _factor_from_sorted(np.sort(r[valid]), target_coverage, bounds)
+
+
+def segment_factors(y_true_log, mu_log, sigma_log, segments, target_coverage=TARGET_COVERAGE,
+                    min_rows: int = MIN_SEGMENT_ROWS,
+                    bounds: Optional[Tuple[float, float]] = FACTOR_BOUNDS) -> pd.DataFrame:
+    """
+    One factor per segment value (columns: segment, rows, factor, coverage_before).
+    All segments come from a single sort by (segment, residual). Segments
+    with fewer than min_rows valid rows get the overall factor.
+    """
+    r, valid = normalized_residuals(y_true_log, mu_log, sigma_log)
+    segments = segments if isinstance(segments, pd.Categorical) else np.asarray(segments, dtype=object)
+    codes, labels = pd.factorize(pd.Series(segments)[valid], sort=True)  # categoricals keep their order
+    r = r[valid]
+    order = np.lexsort((r, codes))
+    r_sorted = r[order]
+
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]]) + int((codes < 0).sum())  # NaN segments sort first
+    overall = _factor_from_sorted(np.sort(r), target_coverage, bounds)
+    z = z_for(target_coverage)
+
+    rows = []
+    for i, label in enumerate(labels):
+        seg = r_sorted[starts[i]:starts[i] + counts[i]]
+        factor = _factor_from_sorted(seg, target_coverage, bounds) if counts[i] >= min_rows else overall
+        rows.append({
+            "segment": label,
+            "rows": int(counts[i]),
+            "factor": factor,
+            "coverage_before": float(np.searchsorted(seg, z, side="right") / max(counts[i], 1)),
+        })
+    return pd.DataFrame(rows, columns=["segment", "rows", "factor", "coverage_before"])
+
+
+def apply_segment_factors(sigma_log, segments, factors: pd.DataFrame, default: float = 1.0) -> np.ndarray:
+    """sigma times its segment's factor (`default` for segments not in `factors`)."""
+    lookup: Dict = dict(zip(factors["segment"], factors["factor"]))
+    scale = pd.Series(np.asarray(segments, dtype=object)).map(lookup).fillna(default).to_numpy(dtype=float)
+    return np.asarray(sigma_log, dtype=float) * scale
+
+
+def price_band(price_aed, edges: Sequence[float] = PRICE_BAND_EDGES) -> pd.Categorical:
+    """Price (AED) -> band label ("0k-50k", ..., "800k+"), ordered cheapest first."""
+    def fmt(v):
+        return f"{v / 1000:g}k"
+    labels = [f"{fmt(lo)}-{fmt(hi)}" if np.isfinite(hi) else f"{fmt(lo)}+" for lo, hi in zip(edges[:-1], edges[1:])]
+    return pd.cut(np.asarray(price_aed, dtype=float), bins=list(edges), labels=labels, right=False)
+
+
+# =========================
+# CURVES
+# =========================
+def coverage_curve(y_true_log, mu_log, sigma_log, levels: Sequence[float] = CURVE_LEVELS,
+                   scale: float = 1.0) -> np.ndarray:
+    """Actual coverage (0-1) of mu ± z(level) * scale * sigma for every nominal level."""
+    r, valid = normalized_residuals(y_true_log, mu_log, sigma_log)
+    r_sorted = np.sort(r[valid])
+    if len(r_sorted) == 0:
+        return np.full(len(levels), np.nan)
+    z = np.array([z_for(c) for c in levels]) * scale
+    return np.searchsorted(r_sorted, z, side="right") / len(r_sorted)
+
+
+def calibrate_uncertainty(mu_log, sigma_log, y_true_log, target_coverage=TARGET_COVERAGE, verbose=True):
+    """calibration_factor with a before/after coverage printout."""
+    factor = calibration_factor(y_true_log, mu_log, sigma_log, target_coverage)
+    if verbose:
+        before, after = (
+            coverage_curve(y_true_log, mu_log, sigma_log, [target_coverage], scale)[0]
+            for scale in (1.0, factor)
+        )
+        print(f"  Before calibration: {before*100:.2f}% coverage (target: {target_coverage*100:.0f}%)")
+        print(f"  Calibration factor: {factor:.4f}")
+        print(f"  After calibration:  {after*100:.2f}% coverage")
+    return factor
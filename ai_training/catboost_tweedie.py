@@ -7,6 +7,10 @@ from catboost import CatBoostRegressor
 from sklearn.model_selection import StratifiedKFold
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+from ai_training.dataset import load_dataset, peak_rss_mb
+from ai_training.features import CAT_FEATURES, FEATURES, record_schema
+from ai_training.pools import cached_pool, fold_pools, load_pool
+
 
 # =========================
 # CONFIG
@@ -16,17 +20,7 @@ TEST_PATH  = "ai_training/datasets/test_raw_price.csv"
 
 TARGET_ORIGINAL = "price_aed"
 
-CAT_FEATURES = [
-    "brand", "model", "trim", "fuel_type", "body_type",
-    "steering_side", "regional_specs", "doors", "seating_capacity",
-    "cylinders", "age_bucket"
-]
-
-NUM_FEATURES = [
-    "kms", "vehicle_age", "kms_per_year", "horsepower_mid", "engine_cc_mid"
-]
-
-FEATURES = CAT_FEATURES + NUM_FEATURES
+# CAT_FEATURES / FEATURES come from ai_training/features.py (shared with the API)
 
 # Tweedie settings
 VARIANCE_POWER = 1.8   # try 1.7–1.9 for continuous positive prices
@@ -68,22 +62,15 @@ def clip_positive(y):
 # =========================
 # 1) LOAD DATA
 # =========================
-train_df = pd.read_csv(TRAIN_PATH)
-test_df  = pd.read_csv(TEST_PATH)
+# Reads the typed *.parquet copies when present (python -m scraper.columnar convert ...)
+# build_features with categorical / float32 columns, rows without a price dropped (ai_training/dataset.py)
+train_df = load_dataset(TRAIN_PATH, FEATURES, TARGET_ORIGINAL)
+test_df  = load_dataset(TEST_PATH, FEATURES, TARGET_ORIGINAL)
+print(f"Loaded {len(train_df):,} train / {len(test_df):,} test rows, peak RSS {peak_rss_mb():.0f} MB")
 
 # =========================
 # 2) CLEAN TYPES
 # =========================
-for col in CAT_FEATURES:
-    train_df[col] = train_df[col].astype("string").fillna("Unknown")
-    test_df[col]  = test_df[col].astype("string").fillna("Unknown")
-
-for col in NUM_FEATURES + [TARGET_ORIGINAL]:
-    train_df[col] = pd.to_numeric(train_df[col], errors="coerce")
-    test_df[col]  = pd.to_numeric(test_df[col], errors="coerce")
-
-train_df = train_df.dropna(subset=[TARGET_ORIGINAL])
-test_df  = test_df.dropna(subset=[TARGET_ORIGINAL])
 
 # ensure positive prices
 train_df[TARGET_ORIGINAL] = clip_positive(train_df[TARGET_ORIGINAL].values)
@@ -111,13 +98,14 @@ skf = StratifiedKFold(n_splits=N_SPLITS, shuffle=True, random_state=RANDOM_SEED)
 
 fold_metrics = []
 
+# Quantized once and cached on disk (ai_training/pools.py); every fold and the final model slice it
+train_pool = load_pool(cached_pool(X_train_full, y_train_scaled, CAT_FEATURES, "tweedie_train"))
+splits = list(skf.split(X_train_full, bins))
+
 print(f"\nStarting {N_SPLITS}-Fold Stratified CV (Tweedie)...")
 
-for fold, (train_idx, val_idx) in enumerate(skf.split(X_train_full, bins), start=1):
-    X_tr = X_train_full.iloc[train_idx]
+for fold, ((train_idx, val_idx), (pool_tr, pool_va)) in enumerate(zip(splits, fold_pools(train_pool, splits)), start=1):
     X_va = X_train_full.iloc[val_idx]
-    y_tr = y_train_scaled[train_idx]
-    y_va = y_train_scaled[val_idx]
 
     # IMPORTANT: early stop based on Tweedie, not RMSE
     model = CatBoostRegressor(
@@ -142,9 +130,8 @@ for fold, (train_idx, val_idx) in enumerate(skf.split(X_train_full, bins), start
     )
 
     model.fit(
-        X_tr, y_tr,
-        cat_features=CAT_FEATURES,
-        eval_set=(X_va, y_va),
+        pool_tr,
+        eval_set=pool_va,
         use_best_model=True
     )
 
@@ -205,7 +192,8 @@ final_model = CatBoostRegressor(
     allow_writing_files=False
 )
 
-final_model.fit(X_train_full, y_train_scaled, cat_features=CAT_FEATURES)
+final_model.fit(train_pool)
+record_schema(final_model)
 
 os.makedirs("ai_training/outputs", exist_ok=True)
 final_model.save_model("ai_training/outputs/final_model_tweedie_fixed.cbm")
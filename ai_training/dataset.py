@@ -0,0 +1,109 @@
+"""
+Memory-lean loading of the training tables.
+
+The plain path (read_csv -> build_features -> assign back) holds every text
+column as one Python string per row, twice. load_dataset keeps only the
+model columns + target:
+
+  - CSV text columns are parsed straight into pandas categories
+    (the typed Parquet copy, if present, already has them)
+  - build_features(compact=True): categoricals stay categories, numerics are float32
+  - rows without a target are dropped before any features are built
+
+CatBoost hashes category values and quantizes in float32, so models trained
+on this frame are the same as on the default one. The target stays float64
+for the metrics.
+
+    python -m ai_training.dataset bench    # default vs lean: time, frame size, peak RSS
+"""
+import argparse
+import multiprocessing as mp
+import sys
+import time
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from ai_training.features import CAT_FEATURES, FEATURES, build_features
+from scraper.columnar import read_table
+
+TARGET = "log_price"  # log1p(price)
+BENCH_PATH = Path("ai_training/datasets/train.csv")
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far (MB); NaN where unsupported (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes on macOS, KB on Linux
+
+
+def frame_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def load_dataset(path: Path, features: Sequence[str] = FEATURES, target: str = TARGET) -> pd.DataFrame:
+    """
+    features (compact dtypes) + target for the rows with a numeric target.
+    The index is the row number in the file, as with read_csv.
+    """
+    raw = read_table(path, columns=list(features) + [target],
+                     dtype={c: "category" for c in CAT_FEATURES})
+    y = pd.to_numeric(raw[target], errors="coerce")
+    keep = y.notna().to_numpy()
+    if not keep.all():
+        raw, y = raw[keep], y[keep]
+    df = build_features(raw, compact=True)[list(features)]
+    df[target] = y.to_numpy(dtype=np.float64)
+    return df
+
+
+def _load_default(path: Path) -> pd.DataFrame:
+    """What catboost_reg.py did before load_dataset."""
+    df = read_table(path, columns=FEATURES + [TARGET])
+    df[FEATURES] = build_features(df)
+    df[TARGET] = pd.to_numeric(df[TARGET], errors="coerce")
+    return df.dropna(subset=[TARGET])
+
+
+def _bench_one(mode: str, path: Path, queue) -> None:
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    df = load_dataset(path) if mode == "lean" else _load_default(path)
+    queue.put({
+        "loader": mode,
+        "rows": len(df),
+        "seconds": round(time.perf_counter() - start, 3),
+        "frame_mb": round(frame_mb(df), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_growth_mb": round(peak_rss_mb() - base, 1),
+    })
+
+
+def main_bench(path: Path = BENCH_PATH) -> pd.DataFrame:
+    """Each loader in a fresh interpreter, so peak RSS is its own."""
+    ctx = mp.get_context("spawn")
+    rows = []
+    for mode in ("default", "lean"):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_bench_one, args=(mode, path, queue))
+        proc.start()
+        rows.append(queue.get())
+        proc.join()
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory-lean training data loading.")
+    parser.add_argument("mode", choices=["bench"])
+    parser.add_argument("--path", type=Path, default=BENCH_PATH)
+    args = parser.parse_args()
+
+    main_bench(args.path)
@@ -0,0 +1,264 @@
+"""
+Distil the Stage 1 model into a smaller, faster serving model.
+
+The teacher (final_model_uncertainty.cbm, depth 8, up to 3000 trees) is
+RMSEWithUncertainty: its raw prediction is [mu, log sigma]. A student is a
+MultiRMSE CatBoost model fitted to exactly those two numbers, so it serves
+through the same code path (prediction_type="RawFormulaVal", sigma = exp).
+
+Transfer set = the training rows + SYNTHETIC_COPIES perturbed copies of them
+(mileage jitter, age +-1, trim / specs / cylinders borrowed from another
+listing of the same model), all labelled by the teacher, so the student also
+sees the teacher between the listings it was trained on.
+
+Each student depth is trained once with MAX_TREES trees; smaller models are
+the same student truncated to its first N trees (CatBoost shrink). Every
+(depth, trees) candidate is scored on test.csv (MedAPE, RMSE_log, coverage,
+fidelity to the teacher) and timed on single-listing and batch predict calls.
+The fastest one within MEDAPE_BUDGET of the teacher is saved, ranked by batch
+time per row (single-listing time only breaks ties).
+
+A one-listing predict call has a fixed cost (DataFrame -> Pool conversion)
+of a few tenths of a ms whatever the model size, so fewer / shallower trees
+show up mostly in the batch column; the single-listing column is mostly that
+fixed cost plus timing noise.
+
+    python -m ai_training.distill                      # report + save the pick
+    python -m ai_training.distill --depths 4 5 6 --budget 0.3 --no-save
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor
+
+from ai_training.features import CAT_FEATURES, FEATURES, age_bucket, check_schema, record_schema
+from ai_training.incremental import load_rows
+
+# =========================
+# CONFIG
+# =========================
+TEACHER_PATH = Path("ai_training/outputs/final_model_uncertainty.cbm")
+STUDENT_PATH = Path("ai_training/outputs/student_model.cbm")
+REPORT_PATH = Path("ai_training/outputs/distill_report.csv")
+TRAIN_PATH = Path("ai_training/datasets/train.csv")
+HOLDOUT_PATH = Path("ai_training/datasets/test.csv")
+
+TARGET = "log_price"  # log1p(price)
+
+STUDENT_DEPTHS = (6, 8)
+MAX_TREES = 1000
+TREE_COUNTS = (100, 250, 500, 1000)   # truncation points per depth
+LEARNING_RATE = 0.25                  # few trees: larger steps than the teacher's 0.05
+RANDOM_SEED = 42
+
+SYNTHETIC_COPIES = 2      # each copy lowers the student's holdout distance to the teacher
+KMS_JITTER = 0.15                                  # sd of the log-normal mileage factor
+SWAP_COLUMNS = ["trim", "regional_specs", "cylinders"]
+SWAP_PROB = 0.2
+
+MEDAPE_BUDGET = 0.5        # allowed holdout MedAPE increase over the teacher (percentage points)
+LATENCY_REPEATS = 200      # single-listing predict calls timed per candidate
+Z_90 = 1.645
+
+
+# =========================
+# PREDICTION
+# =========================
+def predict_mu_sigma(model: CatBoostRegressor, X: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """(mu_log, sigma_log) from a teacher (RMSEWithUncertainty) or a student (MultiRMSE)."""
+    raw = np.asarray(model.predict(X, prediction_type="RawFormulaVal"))
+    return raw[:, 0], np.exp(raw[:, 1])
+
+
+def price_metrics(y_log: np.ndarray, mu: np.ndarray, sigma: np.ndarray) -> Dict[str, float]:
+    true_price = np.expm1(y_log)
+    pred_price = np.maximum(np.expm1(mu + 0.5 * sigma ** 2), 0.0)
+    return {
+        "MedAPE": float(np.median(np.abs((true_price - pred_price) / np.maximum(true_price, 1e-9))) * 100),
+        "RMSE_log": float(np.sqrt(np.mean((mu - y_log) ** 2))),
+        "Coverage_90pct_raw_%": float(np.mean(np.abs(y_log - mu) <= Z_90 * sigma) * 100),
+    }
+
+
+def predict_latency(model: CatBoostRegressor, X: pd.DataFrame, repeats: int = LATENCY_REPEATS) -> Dict[str, float]:
+    """Median ms of a one-listing predict call, and µs per row of one batch call over X."""
+    one = X.iloc[[0]]
+    predict_mu_sigma(model, one)  # warm-up
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        predict_mu_sigma(model, one)
+        times.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    predict_mu_sigma(model, X)
+    batch = time.perf_counter() - t0
+    return {"single_ms": float(np.median(times) * 1e3), "batch_us_per_row": batch / len(X) * 1e6}
+
+
+# =========================
+# TRANSFER SET
+# =========================
+def perturb(X: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    A plausible neighbour of every row: mileage * lognormal, age +-1 (with
+    kms_per_year / age_bucket recomputed), and with SWAP_PROB each
+    SWAP_COLUMNS value taken from another listing of the same model.
+    """
+    out = X.copy()
+    n = len(out)
+
+    kms = out["kms"].to_numpy(dtype=float) * rng.lognormal(0.0, KMS_JITTER, n)
+    age = np.maximum(out["vehicle_age"].to_numpy(dtype=float) + rng.integers(-1, 2, n), 0)
+    out["kms"] = kms
+    out["vehicle_age"] = age
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kpy = np.where(age > 0, kms / age, np.where(np.isnan(age), np.nan, 0.0))
+    kpy[np.isnan(kms)] = np.nan
+    out["kms_per_year"] = kpy
+    out["age_bucket"] = age_bucket(age)
+
+    # donor[i] is a random row with the same model as row i
+    codes = pd.factorize(out["model"])[0]
+    donor = np.empty(n, dtype=np.int64)
+    donor[np.argsort(codes, kind="stable")] = np.lexsort((rng.random(n), codes))
+    for col in SWAP_COLUMNS:
+        values = out[col].to_numpy(dtype=object)
+        swap = rng.random(n) < SWAP_PROB
+        values[swap] = values[donor[swap]]
+        out[col] = values
+    return out
+
+
+def transfer_set(X: pd.DataFrame, copies: int = SYNTHETIC_COPIES, seed: int = RANDOM_SEED) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.concat([X] + [perturb(X, rng) for _ in range(copies)], ignore_index=True)
+
+
+# =========================
+# STUDENTS
+# =========================
+def fit_student(X: pd.DataFrame, teacher_raw: np.ndarray, depth: int,
+                iterations: int = MAX_TREES, learning_rate: float = LEARNING_RATE) -> CatBoostRegressor:
+    student = CatBoostRegressor(
+        loss_function="MultiRMSE",
+        iterations=iterations,
+        depth=depth,
+        learning_rate=learning_rate,
+        random_seed=RANDOM_SEED,
+        verbose=0,
+        allow_writing_files=False,
+    )
+    student.fit(X, teacher_raw, cat_features=CAT_FEATURES)
+    return student
+
+
+def truncated(model: CatBoostRegressor, trees: int) -> CatBoostRegressor:
+    """Copy of `model` keeping only its first `trees` trees."""
+    small = model.copy()
+    if trees < small.tree_count_:
+        small.shrink(ntree_end=trees)
+    return small
+
+
+def _report_row(name: str, depth: int, trees: int, model: CatBoostRegressor, X_hold: pd.DataFrame,
+                y_hold: np.ndarray, teacher_mu: np.ndarray) -> Dict:
+    mu, sigma = predict_mu_sigma(model, X_hold)
+    return {
+        "model": name, "depth": depth, "trees": trees,
+        **price_metrics(y_hold, mu, sigma),
+        "RMSE_vs_teacher": float(np.sqrt(np.mean((mu - teacher_mu) ** 2))),
+        **predict_latency(model, X_hold),
+    }
+
+
+# =========================
+# RUN
+# =========================
+def main(
+    teacher_path: Path = TEACHER_PATH,
+    student_path: Optional[Path] = STUDENT_PATH,
+    depths: Sequence[int] = STUDENT_DEPTHS,
+    max_trees: int = MAX_TREES,
+    copies: int = SYNTHETIC_COPIES,
+    budget: float = MEDAPE_BUDGET,
+) -> pd.DataFrame:
+    """Latency-vs-accuracy report (also written to REPORT_PATH); saves the pick unless student_path is None."""
+    start = time.perf_counter()
+
+    teacher = CatBoostRegressor()
+    teacher.load_model(str(teacher_path))
+    check_schema(teacher)
+    teacher_depth = int(teacher.get_all_params().get("depth", 0))
+    print(f"[+] Teacher: {teacher_path} (depth {teacher_depth}, {teacher.tree_count_} trees)")
+
+    X = transfer_set(load_rows(TRAIN_PATH)[FEATURES], copies)
+    teacher_raw = np.asarray(teacher.predict(X, prediction_type="RawFormulaVal"))
+    print(f"[+] Transfer set: {len(X):,} rows ({copies} perturbed copies of train.csv)")
+
+    holdout = load_rows(HOLDOUT_PATH)
+    X_hold, y_hold = holdout[FEATURES], holdout[TARGET].to_numpy()
+    teacher_mu, _ = predict_mu_sigma(teacher, X_hold)
+
+    rows = [_report_row("teacher", teacher_depth, teacher.tree_count_, teacher, X_hold, y_hold, teacher_mu)]
+    students = {}
+    for depth in depths:
+        t0 = time.perf_counter()
+        student = fit_student(X, teacher_raw, depth, max_trees)
+        print(f"[+] Student depth {depth}: {student.tree_count_} trees in {time.perf_counter() - t0:.1f}s")
+        for trees in sorted({min(t, max_trees) for t in TREE_COUNTS} | {max_trees}):
+            small = truncated(student, trees)
+            students[(depth, trees)] = small
+            rows.append(_report_row("student", depth, trees, small, X_hold, y_hold, teacher_mu))
+
+    report = pd.DataFrame(rows)
+    base = report.iloc[0]
+    report["speedup_single"] = base["single_ms"] / report["single_ms"]
+    report["speedup_batch"] = base["batch_us_per_row"] / report["batch_us_per_row"]
+    report["MedAPE_delta"] = report["MedAPE"] - base["MedAPE"]
+    report["within_budget"] = report["MedAPE_delta"] <= budget
+
+    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(REPORT_PATH, index=False)
+    with pd.option_context("display.width", 200, "display.float_format", "{:.3f}".format):
+        print("\n" + report.to_string(index=False))
+    print(f"\n[+] Report saved to {REPORT_PATH}")
+
+    ok = report[(report["model"] == "student") & report["within_budget"]]
+    if ok.empty:
+        print(f"[!] No student within {budget} pp MedAPE of the teacher; try deeper students or more trees")
+    else:
+        pick = ok.sort_values(["batch_us_per_row", "single_ms", "MedAPE"]).iloc[0]
+        print(f"[+] Pick: depth {pick['depth']}, {pick['trees']} trees -> "
+              f"{pick['speedup_single']:.1f}x faster per listing, {pick['speedup_batch']:.1f}x per batch row, "
+              f"MedAPE {pick['MedAPE']:.2f}% ({pick['MedAPE_delta']:+.2f} pp)")
+        if student_path is not None:
+            student = students[(int(pick["depth"]), int(pick["trees"]))]
+            record_schema(student)
+            student.get_metadata()["distilled_from"] = str(teacher_path)
+            student_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = student_path.with_suffix(".part")
+            student.save_model(str(tmp))
+            tmp.replace(student_path)
+            print(f"[+] Saved student to {student_path} (serve it with ML_MODEL_PATH)")
+
+    print(f"[+] Done in {time.perf_counter() - start:.1f}s")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distil the Stage 1 model into a faster student.")
+    parser.add_argument("--teacher", type=Path, default=TEACHER_PATH)
+    parser.add_argument("--output", type=Path, default=STUDENT_PATH)
+    parser.add_argument("--depths", type=int, nargs="+", default=list(STUDENT_DEPTHS))
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES)
+    parser.add_argument("--copies", type=int, default=SYNTHETIC_COPIES, help="perturbed copies of each training row")
+    parser.add_argument("--budget", type=float, default=MEDAPE_BUDGET, help="allowed MedAPE increase (pp)")
+    parser.add_argument("--no-save", action="store_true", help="only write the report")
+    args = parser.parse_args()
+
+    main(args.teacher, None if args.no_save else args.output, args.depths,
+         args.max_trees, args.copies, args.budget)
@@ -0,0 +1,337 @@
+"""
+Feature engineering shared by training and serving.
+
+The training scripts (catboost_reg.py, catboost_tweedie.py) and the API
+(server/api/services/ml_service.py) both call build_features(), so a listing
+is turned into model inputs the same way in both places: same columns in the
+same order, same age buckets, same horsepower / engine-size bins.
+
+build_features() works on whole columns; a single API request is just a
+one-row frame.
+
+The schema hash covers everything here that changes what the model sees.
+Training stores it in the model file (record_schema) and the API refuses a
+model whose hash doesn't match (check_schema).
+"""
+import hashlib
+import json
+import re
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# =========================
+# SCHEMA
+# =========================
+CAT_FEATURES = [
+    "brand", "model", "trim", "fuel_type", "body_type",
+    "steering_side", "regional_specs", "doors", "seating_capacity",
+    "cylinders", "age_bucket"
+]
+
+NUM_FEATURES = [
+    "kms", "vehicle_age", "kms_per_year", "horsepower_mid", "engine_cc_mid"
+]
+
+FEATURES = CAT_FEATURES + NUM_FEATURES
+
+UNKNOWN = "Unknown"  # missing categoricals
+
+# (max vehicle_age, bucket), checked in order; older cars are OLDEST_BUCKET.
+# These are the buckets in the training datasets.
+AGE_BUCKETS = [(1, "0-1"), (3, "2-3"), (6, "4-6"), (10, "7-10")]
+OLDEST_BUCKET = "10+"
+
+# Listings give horsepower / engine size as ranges ("500 - 599 HP",
+# "3500 - 3999 cc", "4000+ cc"); the model sees the range midpoint. Plain
+# numbers are put in the same range first. (bin width, open-ended top or None)
+NUMERIC_BINS = {
+    "horsepower_mid": (100, None),
+    "engine_cc_mid": (500, 4000),
+}
+
+MAX_DOORS = 5     # "5+ doors"
+MAX_SEATS = 8     # "8+ Seater" above this
+
+# Raw field names accepted for each feature, first match wins
+# (dataset columns first, then Dubizzle listing / API request names).
+SOURCE_COLUMNS = {
+    "kms": ["kms", "mileage"],
+    "horsepower_mid": ["horsepower_mid", "horsepower"],
+    "engine_cc_mid": ["engine_cc_mid", "engine_cc", "engine_capacity_cc"],
+}
+
+# Bump when the derivation changes in a way the constants above don't show
+FEATURE_VERSION = 1
+
+SCHEMA_METADATA_KEY = "feature_schema_hash"
+
+
+def schema_hash() -> str:
+    """Short sha256 of the feature schema (names, order, buckets, bins)."""
+    schema = {
+        "version": FEATURE_VERSION,
+        "cat_features": CAT_FEATURES,
+        "num_features": NUM_FEATURES,
+        "unknown": UNKNOWN,
+        "age_buckets": AGE_BUCKETS + [(None, OLDEST_BUCKET)],
+        "numeric_bins": NUMERIC_BINS,
+        "max_doors": MAX_DOORS,
+        "max_seats": MAX_SEATS,
+    }
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()[:16]
+
+
+SCHEMA_HASH = schema_hash()
+
+
+# =========================
+# VALUE NORMALISATION
+# =========================
+# Each function maps one raw value; build_features calls it once per
+# distinct value in a column, not once per row.
+RANGE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*-\s*(\d+(?:\.\d+)?)")
+BELOW_RE = re.compile(r"(?:less than|under|below)\s*(\d+)")
+PLUS_RE = re.compile(r"(\d+)\s*\+|(?:more than|over|above)\s*(\d+)")
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def _is_missing(value) -> bool:
+    return value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value))
+
+
+def _text(value) -> Optional[str]:
+    """Stripped string, None for missing / blank; 6.0 -> "6"."""
+    if _is_missing(value):
+        return None
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return text or None
+
+
+def _count(value) -> Optional[int]:
+    """Whole number in a bare numeric value ("4", 4, 4.0), else None."""
+    text = _text(value)
+    try:
+        return int(round(float(text))) if text is not None else None
+    except ValueError:
+        return None
+
+
+def _doors(value) -> Optional[str]:
+    """4 -> "4 door", 6 -> "5+ doors"; listing wording passes through."""
+    n = _count(value)
+    if n is None:
+        return _text(value)
+    return f"{MAX_DOORS}+ doors" if n >= MAX_DOORS else f"{n} door"
+
+
+def _seats(value) -> Optional[str]:
+    """5 -> "5 Seater", 9 -> "8+ Seater"."""
+    n = _count(value)
+    if n is None:
+        return _text(value)
+    return f"{MAX_SEATS}+ Seater" if n > MAX_SEATS else f"{n} Seater"
+
+
+def _steering(value) -> Optional[str]:
+    """"Left" -> "Left Hand" (the listing wording)."""
+    text = _text(value)
+    if text is not None and text.lower() in ("left", "right"):
+        return text.capitalize() + " Hand"
+    return text
+
+
+def _specs(value) -> Optional[str]:
+    """"GCC" -> "GCC Specs"; "Other" stays as is."""
+    text = _text(value)
+    if text is None or text.endswith("Specs") or text == "Other":
+        return text
+    return text + " Specs"
+
+
+def range_midpoint(value, width: int, top: Optional[int]) -> float:
+    """
+    "500 - 599 HP" -> 549.5, "Less than 100 HP" -> 49.5, "4000+ cc" -> 4000,
+    and plain numbers -> the midpoint of their `width` range (capped at `top`).
+    Values that already are a midpoint map to themselves.
+    """
+    text = _text(value)
+    if text is None:
+        return np.nan
+    text = text.lower().replace(",", "")
+
+    m = RANGE_RE.search(text)
+    if m:
+        mid = (float(m.group(1)) + float(m.group(2))) / 2
+    elif BELOW_RE.search(text):
+        mid = (float(BELOW_RE.search(text).group(1)) - 1) / 2
+    elif PLUS_RE.search(text):
+        m = PLUS_RE.search(text)
+        mid = float(m.group(1) or m.group(2))
+    else:
+        m = NUMBER_RE.search(text)
+        if not m:
+            return np.nan
+        mid = float(m.group(0))
+        if mid % width != (width - 1) / 2:
+            mid = (mid // width) * width + (width - 1) / 2
+
+    if top is not None and mid >= top:
+        mid = float(top)
+    return mid
+
+
+# =========================
+# BATCH TRANSFORM
+# =========================
+def _column(df: pd.DataFrame, names: Iterable[str]) -> Optional[pd.Series]:
+    """First of `names` present in df."""
+    for name in names:
+        if name in df.columns:
+            return df[name]
+    return None
+
+
+def _factorize(values: pd.Series):
+    """(codes, distinct values), code -1 for missing; categoricals reuse their own codes."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories.to_numpy(dtype=object)
+    return pd.factorize(values.to_numpy(dtype=object), use_na_sentinel=True)
+
+
+def _map_distinct(values: Optional[pd.Series], fn: Callable, n: int, **kwargs) -> np.ndarray:
+    """fn applied to every distinct value (missing included), broadcast back to rows."""
+    if values is None:
+        return np.full(n, fn(None, **kwargs), dtype=object)
+    codes, uniques = _factorize(values)
+    mapped = np.array([fn(v, **kwargs) for v in uniques] + [fn(None, **kwargs)], dtype=object)
+    return mapped[codes]  # code -1 (missing) picks the last entry
+
+
+def _map_categorical(values: Optional[pd.Series], fn: Callable, n: int) -> pd.Categorical:
+    """_map_distinct with UNKNOWN for missing, as a Categorical: no per-row object array."""
+    codes, uniques = _factorize(values) if values is not None else (np.full(n, -1), [])
+    mapped = [fn(v) for v in uniques] + [fn(None)]
+    labels = np.array([UNKNOWN if _is_missing(v) else v for v in mapped], dtype=object)
+    label_codes, categories = pd.factorize(labels)
+    return pd.Categorical.from_codes(label_codes[codes], categories)
+
+
+def _numeric(values: Optional[pd.Series], n: int) -> np.ndarray:
+    if values is None:
+        return np.full(n, np.nan)
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+def age_bucket(vehicle_age: np.ndarray) -> np.ndarray:
+    """vehicle_age -> training age bucket ("0-1", "2-3", "4-6", "7-10", "10+")."""
+    age = np.asarray(vehicle_age, dtype=float)
+    conditions = [age <= limit for limit, _ in AGE_BUCKETS]
+    labels = [label for _, label in AGE_BUCKETS]
+    out = np.select(conditions, labels, default=OLDEST_BUCKET).astype(object)
+    out[np.isnan(age)] = UNKNOWN
+    return out
+
+
+TEXT_COLUMNS = {
+    "brand": _text,
+    "model": _text,
+    "trim": _text,
+    "fuel_type": _text,
+    "body_type": _text,
+    "steering_side": _steering,
+    "regional_specs": _specs,
+    "doors": _doors,
+    "seating_capacity": _seats,
+    "cylinders": _text,
+}
+
+
+def build_features(df: pd.DataFrame, as_of_year: Optional[int] = None, compact: bool = False) -> pd.DataFrame:
+    """
+    Raw listing fields -> model inputs, columns in FEATURES order.
+
+    Takes either the dataset columns (vehicle_age, horsepower_mid, ...) or
+    raw listing / API fields (year, mileage, horsepower, engine_cc, doors=4, ...).
+    `year` is turned into vehicle_age against `as_of_year` (default: this year).
+    Categoricals are strings with UNKNOWN for missing, numerics are floats
+    with NaN for missing (CatBoost handles NaN).
+
+    compact=True (training on large tables): categoricals come back as pandas
+    categories and numerics as float32. CatBoost hashes the category values
+    and quantizes in float32 anyway, so the model sees exactly the same inputs.
+    """
+    if as_of_year is None:
+        as_of_year = date.today().year
+    n = len(df)
+
+    out = {}
+    for col, fn in TEXT_COLUMNS.items():
+        if compact:
+            out[col] = _map_categorical(_column(df, [col]), fn, n)
+            continue
+        values = _map_distinct(_column(df, [col]), fn, n)
+        out[col] = np.where(pd.isna(values), UNKNOWN, values)
+
+    if "vehicle_age" in df.columns:
+        age = _numeric(df["vehicle_age"], n)
+    else:
+        age = as_of_year - _numeric(_column(df, ["year"]), n)
+    age = np.maximum(age, 0)  # NaN stays NaN
+    out["age_bucket"] = pd.Categorical(age_bucket(age)) if compact else age_bucket(age)
+
+    kms = _numeric(_column(df, SOURCE_COLUMNS["kms"]), n)
+    out["kms"] = kms
+    out["vehicle_age"] = age
+    # brand-new cars (age 0) have no yearly rate yet
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["kms_per_year"] = np.where(age > 0, kms / age, np.where(np.isnan(age), np.nan, 0.0))
+    out["kms_per_year"][np.isnan(kms)] = np.nan
+
+    for col, (width, top) in NUMERIC_BINS.items():
+        values = _map_distinct(_column(df, SOURCE_COLUMNS[col]), range_midpoint, n, width=width, top=top)
+        out[col] = values.astype(float)
+
+    if compact:
+        for col in NUM_FEATURES:
+            out[col] = out[col].astype(np.float32)
+    return pd.DataFrame(out, index=df.index, columns=FEATURES)
+
+
+def build_features_from_records(records: Iterable[Dict[str, Any]], as_of_year: Optional[int] = None) -> pd.DataFrame:
+    """build_features for a list of dicts (API requests)."""
+    return build_features(pd.DataFrame.from_records(list(records)), as_of_year)
+
+
+# =========================
+# SCHEMA CHECK
+# =========================
+def record_schema(model) -> None:
+    """Store SCHEMA_HASH in a CatBoost model's metadata (saved with the .cbm)."""
+    model.get_metadata()[SCHEMA_METADATA_KEY] = SCHEMA_HASH
+
+
+def check_schema(model, fallback_hash: Optional[str] = None) -> None:
+    """
+    Raise ValueError if the model was trained on different features.
+
+    Uses the hash stored by record_schema (or `fallback_hash`, e.g. from
+    calibration_info.json, for models saved without one); with no hash at
+    all, the model's feature names must equal FEATURES.
+    """
+    recorded = dict(model.get_metadata()).get(SCHEMA_METADATA_KEY) or fallback_hash
+    if recorded is not None:
+        if recorded != SCHEMA_HASH:
+            raise ValueError(
+                f"Model feature schema {recorded} does not match this code ({SCHEMA_HASH}); "
+                "retrain the model or use the matching ai_training/features.py"
+            )
+        return
+
+    names = list(model.feature_names_ or [])
+    if names != FEATURES:
+        raise ValueError(f"Model features {names} do not match {FEATURES} and no schema hash was recorded")
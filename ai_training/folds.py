@@ -0,0 +1,126 @@
+"""
+Cross-validation folds trained side by side.
+
+run_folds() fits one CatBoost model per (train_idx, val_idx) split on a
+process pool. Each fold gets an equal share of the cores as its
+thread_count, so five folds on a 40-core box train at once with 8 threads
+each instead of one after another with 40.
+
+The training frame is sent to each worker once (pool initializer); tasks
+only carry the fold's row indices. Given the path of a quantized Pool
+(ai_training/pools.py) instead, each worker loads the file and every fold
+trains on slices of it. Models come back to the caller, which
+predicts its validation rows and writes them into preallocated OOF arrays
+at val_idx.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from ai_training.pools import load_pool
+
+# =========================
+# THREAD BUDGET
+# =========================
+def fold_workers(n_folds: int, n_jobs: Optional[int] = None) -> Tuple[int, int]:
+    """
+    (folds trained at once, CatBoost threads per fold) for this machine.
+    n_jobs caps the folds at once; default is one per core up to n_folds.
+    """
+    cores = os.cpu_count() or 1
+    workers = max(1, min(n_folds, n_jobs or cores, cores))
+    return workers, max(1, cores // workers)
+
+
+# =========================
+# WORKER
+# =========================
+_DATA: Dict[str, Any] = {}
+
+
+def _init_worker(X: Union[pd.DataFrame, str, Path], y: Optional[pd.Series]) -> None:
+    if y is None:
+        _DATA["pool"] = load_pool(X)
+    else:
+        _DATA["X"], _DATA["y"] = X, y
+
+
+@dataclass
+class FoldResult:
+    fold: int
+    train_idx: np.ndarray
+    val_idx: np.ndarray
+    model: Any
+    seconds: float
+
+
+def _fit_fold(task) -> FoldResult:
+    fold, train_idx, val_idx, model_cls, params, fit_kwargs = task
+    start = time.perf_counter()
+    model = model_cls(**params)
+    if "pool" in _DATA:
+        pool = _DATA["pool"]
+        model.fit(pool.slice(train_idx), eval_set=pool.slice(val_idx), **fit_kwargs)
+    else:
+        X, y = _DATA["X"], _DATA["y"]
+        model.fit(
+            X.iloc[train_idx], y.iloc[train_idx],
+            eval_set=(X.iloc[val_idx], y.iloc[val_idx]),
+            **fit_kwargs,
+        )
+    return FoldResult(fold, train_idx, val_idx, model, time.perf_counter() - start)
+
+
+# =========================
+# EXECUTOR
+# =========================
+def run_folds(
+    model_cls,
+    params: Dict[str, Any],
+    X: Union[pd.DataFrame, str, Path],
+    y: Optional[pd.Series],
+    splits: Sequence[Tuple[np.ndarray, np.ndarray]],
+    fit_kwargs: Optional[Dict[str, Any]] = None,
+    n_jobs: Optional[int] = None,
+) -> List[FoldResult]:
+    """
+    Fit model_cls(**params) on every split, validating on the held-out rows.
+    Results come back in fold order whatever order the folds finish in.
+
+    X, y are the training frame and label, or X is the path of a pool saved
+    by ai_training.pools.cached_pool() and y is None (cat_features then come
+    from the pool and must not be in fit_kwargs).
+
+    params must not set thread_count; it is chosen per fold from the cores.
+    With one worker (n_jobs=1 or a single core) the folds run in this
+    process, one after another.
+    """
+    splits = list(splits)
+    workers, threads = fold_workers(len(splits), n_jobs)
+    params = {**params, "thread_count": threads}
+    tasks = [
+        (fold, np.asarray(tr), np.asarray(va), model_cls, params, fit_kwargs or {})
+        for fold, (tr, va) in enumerate(splits, 1)
+    ]
+    print(f"[+] {len(tasks)} folds: {workers} at once x {threads} threads")
+
+    if workers == 1:
+        _init_worker(X, y)
+        try:
+            return [_report(_fit_fold(t), len(tasks)) for t in tasks]
+        finally:
+            _DATA.clear()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y)) as pool:
+        return [_report(r, len(tasks)) for r in pool.map(_fit_fold, tasks)]
+
+
+def _report(result: FoldResult, n_folds: int) -> FoldResult:
+    print(f"    fold {result.fold}/{n_folds} fitted in {result.seconds:.1f}s")
+    return result
@@ -0,0 +1,217 @@
+"""
+Warm-start retraining of the Stage 1 model on newly scraped listings.
+
+Instead of a full retrain on train.csv, the previous final_model_uncertainty.cbm
+is continued for a few hundred trees (CatBoost init_model) on the new rows
+plus a random replay sample of the rows it was trained on, so it learns the
+new listings without drifting away from the old ones.
+
+The result is scored against a frozen holdout (test.csv, never trained on)
+next to the previous model, and only replaces it when no metric regresses
+beyond MAX_REGRESSION. Every attempt is appended to HISTORY_PATH.
+
+    python -m ai_training.incremental --delta data/processed/new_listings.csv
+    python -m ai_training.incremental --delta new.csv --append-to-train   # keep the rows for next time
+
+Trees pile up with every refresh; past MAX_TREES a full catboost_reg.py run
+is due (it also refreshes the calibration factor, which this leaves as is).
+"""
+import argparse
+import json
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor
+
+from ai_training.features import CAT_FEATURES, FEATURES, build_features, check_schema, record_schema
+from scraper.columnar import read_table
+
+# =========================
+# CONFIG
+# =========================
+MODEL_PATH = Path("ai_training/outputs/final_model_uncertainty.cbm")
+TRAIN_PATH = Path("ai_training/datasets/train.csv")
+HOLDOUT_PATH = Path("ai_training/datasets/test.csv")   # frozen: never appended to or trained on
+HISTORY_PATH = Path("ai_training/outputs/retrain_history.jsonl")
+
+TARGET = "log_price"  # log1p(price)
+
+ITERATIONS = 300          # new trees per refresh
+LEARNING_RATE = 0.03      # below the full run's 0.05: small steps from a trained model
+REPLAY_ROWS = 5000        # old rows mixed in with the new ones
+RANDOM_SEED = 42
+MAX_TREES = 6000          # warn that a full retrain is due
+
+# Largest allowed worsening on the holdout (absolute) for the new model to be promoted
+MAX_REGRESSION = {
+    "RMSE_log": 0.002,
+    "MedAPE": 0.25,       # percentage points
+}
+
+
+# =========================
+# DATA
+# =========================
+def load_rows(path: Path) -> pd.DataFrame:
+    """
+    Model features + log_price for a CSV in train.csv layout, or raw
+    listings (year, mileage, price_aed, ...) which build_features understands.
+    """
+    df = read_table(path)
+    if TARGET not in df.columns and "price_aed" in df.columns:
+        df[TARGET] = np.log1p(pd.to_numeric(df["price_aed"], errors="coerce"))
+    if TARGET not in df.columns:
+        raise ValueError(f"{path} has neither {TARGET} nor price_aed")
+    out = build_features(df)
+    out[TARGET] = pd.to_numeric(df[TARGET], errors="coerce")
+    return out.dropna(subset=[TARGET])
+
+
+# =========================
+# MODEL
+# =========================
+def holdout_metrics(model: CatBoostRegressor, X: pd.DataFrame, y: np.ndarray) -> Dict[str, float]:
+    pred = np.asarray(model.predict(X, prediction_type="RMSEWithUncertainty"))
+    mu, sigma = pred[:, 0], np.sqrt(np.maximum(pred[:, 1], 0.0))
+    true_price = np.expm1(y)
+    pred_price = np.maximum(np.expm1(mu + 0.5 * sigma ** 2), 0.0)
+    return {
+        "RMSE_log": float(np.sqrt(np.mean((mu - y) ** 2))),
+        "MedAPE": float(np.median(np.abs((true_price - pred_price) / np.maximum(true_price, 1e-9))) * 100),
+        "Coverage_90pct_raw_%": float(np.mean(np.abs(y - mu) <= 1.645 * sigma) * 100),
+    }
+
+
+def warm_start(previous: CatBoostRegressor, X: pd.DataFrame, y: np.ndarray,
+               iterations: int = ITERATIONS, learning_rate: float = LEARNING_RATE) -> CatBoostRegressor:
+    """previous + `iterations` new trees fitted on (X, y)."""
+    params = previous.get_all_params()
+    model = CatBoostRegressor(
+        loss_function=params.get("loss_function", "RMSEWithUncertainty"),
+        eval_metric=params.get("eval_metric", "RMSE"),
+        depth=params.get("depth", 8),
+        iterations=iterations,
+        learning_rate=learning_rate,
+        random_seed=RANDOM_SEED,
+        verbose=0,
+        allow_writing_files=False,
+    )
+    model.fit(X, y, cat_features=CAT_FEATURES, init_model=previous)
+    # CatBoost adds the bias of init_model to the continued model's own for
+    # RMSEWithUncertainty, doubling mu; the trees already start from the old bias
+    model.set_scale_and_bias(*previous.get_scale_and_bias())
+    return model
+
+
+def _regressions(old: Dict[str, float], new: Dict[str, float]) -> Dict[str, float]:
+    """Metrics that got worse by more than allowed -> by how much."""
+    return {k: new[k] - old[k] for k, limit in MAX_REGRESSION.items() if new[k] - old[k] > limit}
+
+
+def _append_rows(rows: pd.DataFrame, train_path: Path) -> None:
+    columns = list(pd.read_csv(train_path, nrows=0).columns)
+    missing = [c for c in columns if c not in rows.columns]
+    if missing:
+        print(f"[!] Not appended to {train_path}: new rows lack {missing}")
+        return
+    rows[columns].to_csv(train_path, mode="a", header=False, index=False)
+    print(f"[+] Appended {len(rows):,} rows to {train_path}")
+
+
+# =========================
+# RUN
+# =========================
+def main(
+    delta_path: Path,
+    model_path: Path = MODEL_PATH,
+    train_path: Path = TRAIN_PATH,
+    holdout_path: Path = HOLDOUT_PATH,
+    replay_rows: int = REPLAY_ROWS,
+    iterations: int = ITERATIONS,
+    append_to_train: bool = False,
+    force: bool = False,
+) -> Optional[Path]:
+    """Returns the promoted model's path, or None if the previous model was kept."""
+    start = time.perf_counter()
+
+    previous = CatBoostRegressor()
+    previous.load_model(str(model_path))
+    check_schema(previous)
+    print(f"[+] Previous model: {model_path} ({previous.tree_count_} trees)")
+
+    delta = load_rows(delta_path)
+    if delta.empty:
+        print(f"[!] No usable rows in {delta_path}; nothing to do")
+        return None
+    train = load_rows(train_path)
+    replay = train.sample(n=min(replay_rows, len(train)), random_state=RANDOM_SEED)
+    fit_rows = pd.concat([delta, replay], ignore_index=True)
+    print(f"[+] Training on {len(delta):,} new + {len(replay):,} replayed rows, {iterations} new trees")
+
+    model = warm_start(previous, fit_rows[FEATURES], fit_rows[TARGET].to_numpy(), iterations)
+    record_schema(model)
+    fit_seconds = time.perf_counter() - start
+
+    holdout = load_rows(holdout_path)
+    X_hold, y_hold = holdout[FEATURES], holdout[TARGET].to_numpy()
+    old_metrics = holdout_metrics(previous, X_hold, y_hold)
+    new_metrics = holdout_metrics(model, X_hold, y_hold)
+
+    print(f"\n{'Holdout metric':<22} {'previous':>12} {'warm-start':>12}")
+    for k in old_metrics:
+        print(f"{k:<22} {old_metrics[k]:>12.4f} {new_metrics[k]:>12.4f}")
+
+    worse = _regressions(old_metrics, new_metrics)
+    promote = force or not worse
+
+    if promote:
+        backup = model_path.with_suffix(".prev.cbm")
+        shutil.copy2(model_path, backup)
+        tmp = model_path.with_suffix(".part")
+        model.save_model(str(tmp))
+        tmp.replace(model_path)
+        print(f"\n[+] Promoted: {model_path} ({model.tree_count_} trees; previous kept as {backup})")
+        if append_to_train:
+            _append_rows(delta, train_path)
+        if model.tree_count_ > MAX_TREES:
+            print(f"[!] {model.tree_count_} trees > {MAX_TREES}: time for a full retrain (python -m ai_training.catboost_reg)")
+    else:
+        print(f"\n[!] Not promoted, holdout regressed: {', '.join(f'{k} +{v:.4f}' for k, v in worse.items())}")
+
+    HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(HISTORY_PATH, "a") as f:
+        f.write(json.dumps({
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "delta": str(delta_path),
+            "delta_rows": len(delta),
+            "replay_rows": len(replay),
+            "trees": model.tree_count_,
+            "fit_seconds": round(fit_seconds, 1),
+            "previous": old_metrics,
+            "new": new_metrics,
+            "promoted": promote,
+        }) + "\n")
+
+    print(f"[+] Done in {time.perf_counter() - start:.1f}s")
+    return model_path if promote else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continue the Stage 1 model on new listings.")
+    parser.add_argument("--delta", type=Path, required=True, help="CSV of new listings (train.csv layout or raw)")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH)
+    parser.add_argument("--train", type=Path, default=TRAIN_PATH, help="rows the replay sample is drawn from")
+    parser.add_argument("--holdout", type=Path, default=HOLDOUT_PATH)
+    parser.add_argument("--replay-rows", type=int, default=REPLAY_ROWS)
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--append-to-train", action="store_true", help="add the new rows to --train once promoted")
+    parser.add_argument("--force", action="store_true", help="promote even if the holdout regressed")
+    args = parser.parse_args()
+
+    main(args.delta, args.model, args.train, args.holdout, args.replay_rows,
+         args.iterations, args.append_to_train, args.force)
@@ -1,4 +1,7 @@
+import os
+import joblib
 import pandas as pd
+from sklearn.impute import SimpleImputer
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
@@ -6,10 +9,10 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import numpy as np
 
 # Load training data
-df_train = pd.read_csv("/Users/saif/Desktop/University Saif/Y3/dissertion/project/ai_training/datasets/train.csv")
+df_train = pd.read_csv("ai_training/datasets/train.csv")
 
 # Load test data
-df_test = pd.read_csv("/Users/saif/Desktop/University Saif/Y3/dissertion/project/ai_training/datasets/test.csv")
+df_test = pd.read_csv("ai_training/datasets/test.csv")
 
 # We will only use neumeric features
 features = [
@@ -20,13 +23,6 @@ features = [
     "engine_cc_mid"
 ]
 
-# Fill missing values with median (simple imputation for baseline)
-for feature in features:
-    if df_train[feature].isnull().any():
-        median_val = df_train[feature].median()
-        df_train.loc[:, feature] = df_train[feature].fillna(median_val)
-        df_test.loc[:, feature] = df_test[feature].fillna(median_val)
-
 X_train = df_train[features]
 y_train = df_train["log_price"]
 
@@ -34,8 +30,10 @@ X_test = df_test[features]
 y_test = df_test["log_price"]
 
 
-# Pipeline: scaling + regression (instead of manually doing it this normalizes then fits)
+# Pipeline: median imputation (simple imputation for baseline, medians from the
+# training set) + scaling + regression (instead of manually doing it this normalizes then fits)
 pipeline = Pipeline([
+    ("impute", SimpleImputer(strategy="median")),
     ("scaler", StandardScaler()),
     ("lr", LinearRegression())
 ])
@@ -91,3 +89,8 @@ print("=" * 50)
 print(f"Linear Regression RMSE: {test_rmse_currency:.2f} AED")
 print(f"Linear Regression MAE : {test_mae_currency:.2f} AED")
 print(f"Linear Regression R²  : {test_r2_currency:.4f}")
+
+# Save the fitted pipeline (loaded by ai_training/benchmark.py)
+os.makedirs("ai_training/outputs", exist_ok=True)
+joblib.dump(pipeline, "ai_training/outputs/linear_baseline.joblib")
+print("\nSaved model to: ai_training/outputs/linear_baseline.joblib")
@@ -0,0 +1,128 @@
+"""
+Out-of-fold prediction store.
+
+Stage 2 (and calibration studies) only need Stage 1's out-of-fold mu / sigma
+for every training row, not the Stage 1 models. catboost_reg.py saves them
+here after its K-fold CV, one Parquet file per model version:
+
+  ai_training/cache/oof/<name>-<version>.parquet
+    row_id     row number in the training CSV
+    row_hash   hash of the row's features + target (checked on attach)
+    fold       CV fold that held the row out (1-based)
+    mu_log, sigma_log, y_true_log
+
+The version is a hash of everything that changes the predictions (model
+params, CV split, feature schema, training data), so a rerun with the same
+setup loads the file instead of retraining the folds, and any change makes
+a new file.
+
+    python -m ai_training.oof list
+"""
+import argparse
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+OOF_DIR = Path("ai_training/cache/oof")
+
+COLUMNS = ["row_id", "row_hash", "fold", "mu_log", "sigma_log", "y_true_log"]
+
+
+def model_version(**parts: Any) -> str:
+    """Short sha256 of the keyword arguments (params, data hash, CV spec, ...)."""
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """One uint64 per row from its values (index excluded)."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def oof_path(name: str, version: str, oof_dir: Path = OOF_DIR) -> Path:
+    return Path(oof_dir) / f"{name}-{version}.parquet"
+
+
+def save_oof(
+    name: str,
+    version: str,
+    rows: pd.DataFrame,
+    fold: np.ndarray,
+    mu_log: np.ndarray,
+    sigma_log: np.ndarray,
+    y_true_log: np.ndarray,
+    oof_dir: Path = OOF_DIR,
+) -> Path:
+    """
+    Store OOF predictions for `rows` (the training frame: its index is the
+    row id, its values are hashed). Written to `.part` and renamed into place.
+    """
+    table = pd.DataFrame({
+        "row_id": rows.index.to_numpy(dtype=np.int64),
+        "row_hash": row_hashes(rows),
+        "fold": np.asarray(fold, dtype=np.int8),
+        "mu_log": np.asarray(mu_log, dtype=float),
+        "sigma_log": np.asarray(sigma_log, dtype=float),
+        "y_true_log": np.asarray(y_true_log, dtype=float),
+    })
+    path = oof_path(name, version, oof_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".part")
+    table.to_parquet(tmp, index=False)
+    tmp.replace(path)
+    print(f"[+] Saved {len(table):,} OOF predictions to {path}")
+    return path
+
+
+def load_oof(name: str, version: Optional[str] = None, oof_dir: Path = OOF_DIR) -> Optional[pd.DataFrame]:
+    """
+    The stored OOF frame for `version`, or the newest one for `name` when
+    version is None. None if there is no such file.
+    """
+    if version is not None:
+        path = oof_path(name, version, oof_dir)
+        if not path.exists():
+            return None
+    else:
+        files = sorted(Path(oof_dir).glob(f"{name}-*.parquet"), key=lambda p: p.stat().st_mtime)
+        if not files:
+            return None
+        path = files[-1]
+    return pd.read_parquet(path, columns=COLUMNS)
+
+
+def attach_oof(rows: pd.DataFrame, oof: pd.DataFrame) -> pd.DataFrame:
+    """
+    OOF columns aligned to `rows` by row id. Raises ValueError if a row is
+    missing from the store or its values changed since the OOF was computed.
+    """
+    aligned = oof.set_index("row_id").reindex(rows.index)
+    if aligned["row_hash"].isna().any():
+        raise ValueError(f"{int(aligned['row_hash'].isna().sum())} rows have no stored OOF prediction")
+    if not np.array_equal(aligned["row_hash"].to_numpy(dtype=np.uint64), row_hashes(rows)):
+        raise ValueError("Training rows changed since the OOF predictions were stored")
+    return aligned.drop(columns="row_hash")
+
+
+def list_oof(oof_dir: Path = OOF_DIR) -> pd.DataFrame:
+    rows = []
+    for path in sorted(Path(oof_dir).glob("*.parquet")):
+        name, _, version = path.stem.rpartition("-")
+        oof = pd.read_parquet(path, columns=["fold"])
+        rows.append({
+            "name": name, "version": version, "rows": len(oof),
+            "folds": int(oof["fold"].nunique()), "size_kb": path.stat().st_size // 1024,
+        })
+    return pd.DataFrame(rows, columns=["name", "version", "rows", "folds", "size_kb"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the stored out-of-fold predictions.")
+    parser.add_argument("mode", choices=["list"], nargs="?", default="list")
+    parser.parse_args()
+
+    print(list_oof().to_string(index=False))
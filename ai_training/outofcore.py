@@ -0,0 +1,309 @@
+"""
+Out-of-core Stage 1 training, for training sets that don't fit in RAM.
+
+catboost_reg.py reads the whole table into a DataFrame. Here nothing larger
+than one chunk is ever held in pandas:
+
+  1. stream   every source (train.csv, auto.ae / Dubicars exports, snapshots)
+              chunk by chunk from the columnar store (scraper.columnar.iter_table),
+              build_features per chunk, append to a CatBoost DSV file
+              (label, row id, features) + column description
+  2. borders  float borders from a uniform sample of BORDER_SAMPLE_ROWS rows
+              (bottom-k over random keys, kept while streaming), saved with
+              Pool.save_quantization_borders
+  3. pool     the DSV file loaded by CatBoost itself (float32 values + hashed
+              categoricals, no DataFrame), quantized with those borders and
+              saved under WORK_DIR
+  4. CV       folds come from a hash of each row's id, not from shuffling
+              an in-memory frame: a row keeps its fold when rows are added,
+              removed or reordered, in any source.
+              run_folds trains them on slices of the saved pool
+  5. OOF      the DSV is streamed again; each chunk is predicted by the models
+              that held its rows out -> calibration factor
+  6. final    model on the whole pool -> OUTPUT_DIR/final_model_uncertainty.cbm
+              + calibration_info.json (benchmark.py --models-dir reads both)
+
+Row ids are a hash of the listing's url (or listing_id) where the source has
+one, else of the row's values, so they don't depend on where the row sits.
+Rows hashed from their values get a new id (and maybe fold) when a value is
+corrected, and identical rows share one. The pool files are keyed by the sources' size
+and mtime, the feature schema and the settings, so an unchanged setup
+reuses them.
+
+    python -m ai_training.outofcore build --source ai_training/datasets/train.csv data/processed/listings_dedup.csv
+    python -m ai_training.outofcore train --source ...        # builds the pool first if needed
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import catboost
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor, Pool
+
+from ai_training.calibration import calibration_factor
+from ai_training.dataset import peak_rss_mb
+from ai_training.distill import predict_mu_sigma
+from ai_training.features import CAT_FEATURES, FEATURES, SCHEMA_HASH, build_features, record_schema
+from ai_training.folds import run_folds
+from ai_training.oof import model_version, row_hashes
+from ai_training.pools import QUANTIZE_PARAMS, load_pool
+from scraper.columnar import iter_table
+
+# =========================
+# CONFIG
+# =========================
+SOURCES = [Path("ai_training/datasets/train.csv")]
+WORK_DIR = Path("ai_training/cache/outofcore")
+OUTPUT_DIR = Path("ai_training/outputs/outofcore")
+
+TARGET = "log_price"  # log1p(price); raw listings with price_aed are converted
+CHUNK_ROWS = 200_000
+BORDER_SAMPLE_ROWS = 200_000
+N_SPLITS = 5
+FOLD_SEED = 42
+
+# Same as catboost_reg.py's Stage 1
+STAGE1_PARAMS = dict(
+    loss_function="RMSEWithUncertainty",
+    eval_metric="RMSE",
+    iterations=5000,
+    learning_rate=0.05,
+    depth=8,
+    random_seed=42,
+    verbose=0,
+    early_stopping_rounds=100,
+    allow_writing_files=False,
+)
+FINAL_ITERATIONS = 3000
+
+DSV_COLUMNS = ["label", "row_id"] + FEATURES
+LISTING_KEYS = ["url", "listing_id"]  # first one a source has is hashed into the row id
+
+
+# =========================
+# STREAM
+# =========================
+def _label(chunk: pd.DataFrame, target: str) -> np.ndarray:
+    if target in chunk.columns:
+        return pd.to_numeric(chunk[target], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    if target == "log_price" and "price_aed" in chunk.columns:
+        return np.log1p(pd.to_numeric(chunk["price_aed"], errors="coerce").to_numpy(dtype=float, na_value=np.nan))
+    raise ValueError(f"Source has neither {target} nor price_aed")
+
+
+def listing_ids(chunk: pd.DataFrame) -> np.ndarray:
+    """Row id per row: a hash of its LISTING_KEYS column, or of all its values if it has none."""
+    key = next((c for c in LISTING_KEYS if c in chunk.columns), None)
+    if key is not None:
+        values = chunk[[key]].astype(str)
+    else:
+        # numbers as float64, so a column read as int in one chunk and float in another hashes alike
+        values = chunk.apply(lambda s: s.astype(float) if pd.api.types.is_numeric_dtype(s) else s.astype(str))
+    return row_hashes(values).view(np.int64)
+
+
+def stream_rows(sources: Sequence[Path], target: str = TARGET,
+                chunk_rows: int = CHUNK_ROWS) -> Iterator[Tuple[np.ndarray, pd.DataFrame, np.ndarray]]:
+    """(row ids, features, label) per chunk over all sources; rows without a label are dropped."""
+    for source in sources:
+        for chunk in iter_table(source, chunk_rows=chunk_rows):
+            ids = listing_ids(chunk)
+            y = _label(chunk, target)
+            keep = np.isfinite(y)
+            yield ids[keep], build_features(chunk[keep]), y[keep]
+
+
+def iter_pool_file(data_path: Path, chunk_rows: int = CHUNK_ROWS) -> Iterator[Tuple[np.ndarray, pd.DataFrame, np.ndarray]]:
+    """The DSV written by build_pool, back as (row ids, features, label) chunks."""
+    reader = pd.read_csv(
+        data_path, sep="\t", header=None, names=DSV_COLUMNS, chunksize=chunk_rows,
+        dtype={c: str for c in CAT_FEATURES}, keep_default_na=False,
+        na_values={c: [""] for c in FEATURES if c not in CAT_FEATURES},
+    )
+    for chunk in reader:
+        yield chunk["row_id"].to_numpy(dtype=np.int64), chunk[FEATURES], chunk["label"].to_numpy(dtype=float)
+
+
+def _bottom_k(sample: Optional[pd.DataFrame], rows: pd.DataFrame, rng: np.random.Generator, k: int) -> pd.DataFrame:
+    """Uniform sample of k rows over everything seen so far: the k smallest random keys."""
+    rows = rows.assign(_key=rng.random(len(rows)))
+    combined = rows if sample is None else pd.concat([sample, rows], ignore_index=True)
+    return combined.nsmallest(k, "_key") if len(combined) > k else combined
+
+
+# =========================
+# POOL
+# =========================
+def _column_description() -> str:
+    lines = ["0\tLabel", "1\tSampleId"]
+    lines += [f"{i}\t{'Categ' if c in CAT_FEATURES else 'Num'}\t{c}" for i, c in enumerate(FEATURES, 2)]
+    return "\n".join(lines) + "\n"
+
+
+def pool_files(sources: Sequence[Path], target: str = TARGET, sample_rows: int = BORDER_SAMPLE_ROWS,
+               work_dir: Path = WORK_DIR) -> Dict[str, Path]:
+    """Paths of the pool built from these sources + settings (they may not exist yet)."""
+    key = model_version(
+        sources=[(str(s), Path(s).stat().st_size, Path(s).stat().st_mtime) for s in sources],
+        target=target, features=SCHEMA_HASH, quantize=QUANTIZE_PARAMS,
+        sample_rows=sample_rows, catboost=catboost.__version__,
+    )
+    work_dir = Path(work_dir)
+    return {
+        "data": work_dir / f"stage1-{key}.tsv",
+        "cd": work_dir / f"stage1-{key}.cd",
+        "borders": work_dir / f"stage1-{key}.borders",
+        "row_ids": work_dir / f"stage1-{key}.row_ids.npy",
+        "pool": work_dir / f"stage1-{key}.quantized",
+    }
+
+
+def build_pool(sources: Sequence[Path] = SOURCES, target: str = TARGET, chunk_rows: int = CHUNK_ROWS,
+               sample_rows: int = BORDER_SAMPLE_ROWS, work_dir: Path = WORK_DIR) -> Dict[str, Path]:
+    """Stream the sources into a DSV file, precompute borders, quantize; cached by pool_files()."""
+    files = pool_files(sources, target, sample_rows, work_dir)
+    if all(p.exists() for p in files.values()):
+        print(f"[+] Pool: cached ({files['pool']})")
+        return files
+
+    start = time.perf_counter()
+    files["data"].parent.mkdir(parents=True, exist_ok=True)
+    files["cd"].write_text(_column_description())
+
+    rng = np.random.default_rng(FOLD_SEED)
+    sample, row_ids, n = None, [], 0
+    tmp = files["data"].with_suffix(".part")
+    with open(tmp, "w", newline="") as f:
+        for ids, X, y in stream_rows(sources, target, chunk_rows):
+            X.insert(0, "row_id", ids)
+            X.insert(0, "label", y)
+            X.to_csv(f, sep="\t", header=False, index=False)
+            sample = _bottom_k(sample, X, rng, sample_rows)
+            row_ids.append(ids)
+            n += len(ids)
+            print(f"    {n:,} rows streamed (peak RSS {peak_rss_mb():.0f} MB)")
+    if n == 0:
+        raise ValueError(f"No rows with a {target} in {', '.join(map(str, sources))}")
+    tmp.replace(files["data"])
+    np.save(files["row_ids"], np.concatenate(row_ids))
+    del row_ids
+
+    border_pool = Pool(sample[FEATURES], sample["label"].to_numpy(), cat_features=CAT_FEATURES)
+    border_pool.quantize(**QUANTIZE_PARAMS)
+    border_pool.save_quantization_borders(str(files["borders"]))
+    print(f"[+] Borders from {len(sample):,} sampled rows -> {files['borders']}")
+    del sample, border_pool
+
+    # CatBoost reads the file itself: float32 + hashed categoricals, no DataFrame
+    pool = Pool(str(files["data"]), column_description=str(files["cd"]))
+    pool.quantize(input_borders=str(files["borders"]))
+    tmp = files["pool"].with_suffix(".part")
+    pool.save(str(tmp))
+    tmp.replace(files["pool"])
+    print(f"[+] Pool: quantized {pool.num_row():,} rows -> {files['pool']} "
+          f"in {time.perf_counter() - start:.1f}s (peak RSS {peak_rss_mb():.0f} MB)")
+
+    stale = [p for p in Path(work_dir).glob("stage1-*") if p not in files.values()]
+    for old in stale:
+        old.unlink()
+    return files
+
+
+# =========================
+# FOLDS
+# =========================
+def row_id_folds(row_ids: np.ndarray, n_splits: int = N_SPLITS, seed: int = FOLD_SEED) -> np.ndarray:
+    """Fold (0..n_splits-1) of every row from a hash of its id (splitmix64), independent of row order."""
+    x = np.asarray(row_ids).astype(np.uint64) + np.uint64(seed * 0x9E3779B97F4A7C15 % 2**64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return (x % np.uint64(n_splits)).astype(np.int8)
+
+
+def fold_splits(folds: np.ndarray, n_splits: int = N_SPLITS) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """(train, validation) pool positions per fold."""
+    return [(np.flatnonzero(folds != k), np.flatnonzero(folds == k)) for k in range(n_splits)]
+
+
+# =========================
+# TRAIN
+# =========================
+def train(sources: Sequence[Path] = SOURCES, target: str = TARGET, n_splits: int = N_SPLITS,
+          n_jobs: Optional[int] = None, chunk_rows: int = CHUNK_ROWS, output_dir: Path = OUTPUT_DIR) -> Path:
+    """CV + calibration + final Stage 1 model from the file-backed pool. Returns the model path."""
+    start = time.perf_counter()
+    files = build_pool(sources, target, chunk_rows)
+    row_ids = np.load(files["row_ids"], mmap_mode="r")
+    folds = row_id_folds(row_ids, n_splits)
+    n = len(folds)
+
+    print(f"\n--- {n_splits}-fold CV on {n:,} rows (folds by row id) ---")
+    results = run_folds(CatBoostRegressor, STAGE1_PARAMS, files["pool"], None, fold_splits(folds, n_splits), n_jobs=n_jobs)
+    models = [r.model for r in results]
+
+    # OOF: every chunk of the DSV predicted by the models that held its rows out
+    mu, sigma, y = np.empty(n), np.empty(n), np.empty(n)
+    pos = 0
+    for _, X, label in iter_pool_file(files["data"], chunk_rows):
+        chunk_folds = folds[pos:pos + len(X)]
+        for k, model in enumerate(models):
+            held_out = np.flatnonzero(chunk_folds == k)
+            if len(held_out):
+                mu[pos + held_out], sigma[pos + held_out] = predict_mu_sigma(model, X.iloc[held_out])
+        y[pos:pos + len(X)] = label
+        pos += len(X)
+
+    for k, result in enumerate(results):
+        held_out = folds == k
+        rmse = float(np.sqrt(np.mean((mu[held_out] - y[held_out]) ** 2)))
+        print(f"Fold {k + 1}: RMSE_log={rmse:.4f} | best_iter={result.model.get_best_iteration()} | val_size={int(held_out.sum()):,}")
+    factor = calibration_factor(y, mu, sigma)
+    print(f"OOF RMSE_log: {np.sqrt(np.mean((mu - y) ** 2)):.4f} | calibration factor: {factor:.4f}")
+    del models, results
+
+    print(f"\n--- Final model on all {n:,} rows ---")
+    final = CatBoostRegressor(**{**STAGE1_PARAMS, "iterations": FINAL_ITERATIONS, "verbose": 200})
+    final.fit(load_pool(files["pool"]))
+    record_schema(final)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model_path = output_dir / "final_model_uncertainty.cbm"
+    tmp = model_path.with_suffix(".part")
+    final.save_model(str(tmp))
+    tmp.replace(model_path)
+    info: Dict[str, Any] = {
+        "calibration_method": "K-fold validation (row-id folds, out-of-core)",
+        "calibration_factor_from_kfold": factor,
+        "recommended_for_production": factor,
+        "kfold_validation_samples": n,
+        "feature_schema_hash": SCHEMA_HASH,
+        "sources": [str(s) for s in sources],
+    }
+    (output_dir / "calibration_info.json").write_text(json.dumps(info, indent=2))
+
+    print(f"[+] Saved {model_path} + calibration_info.json in {time.perf_counter() - start:.1f}s "
+          f"(peak RSS {peak_rss_mb():.0f} MB)")
+    return model_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-core Stage 1 training from file-backed CatBoost pools.")
+    parser.add_argument("mode", choices=["build", "train"])
+    parser.add_argument("--source", type=Path, nargs="+", default=SOURCES, help="CSV / Parquet tables")
+    parser.add_argument("--target", default=TARGET)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--folds", type=int, default=N_SPLITS)
+    parser.add_argument("--jobs", type=int, default=None, help="folds trained at once")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    if args.mode == "build":
+        build_pool(args.source, args.target, args.chunk_rows)
+    else:
+        train(args.source, args.target, args.folds, args.jobs, args.chunk_rows, args.output_dir)
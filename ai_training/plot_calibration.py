@@ -4,6 +4,8 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from ai_training.calibration import coverage_curve
+
 # =============================
 # Config
 # =============================
@@ -12,29 +14,8 @@ OUT_DIR  = "ai_training/outputs/plots"
 SAVE_PLOTS = True
 VERBOSE = True
 
-# z-scores for common central intervals
-Z_BY_CONF = {
-    50: 0.674,
-    68: 1.0,
-    80: 1.282,
-    90: 1.645,
-    95: 1.96,
-}
-
-
-def compute_coverage(y_true_log, mu_log, sigma_log, z):
-    """Percent of points where y_true is within mu ± z*sigma."""
-    y_true_log = np.asarray(y_true_log)
-    mu_log = np.asarray(mu_log)
-    sigma_log = np.asarray(sigma_log)
-
-    valid = np.isfinite(y_true_log) & np.isfinite(mu_log) & np.isfinite(sigma_log) & (sigma_log > 0)
-    if valid.sum() == 0:
-        return np.nan
-
-    inside = (y_true_log[valid] >= (mu_log[valid] - z * sigma_log[valid])) & \
-             (y_true_log[valid] <= (mu_log[valid] + z * sigma_log[valid]))
-    return inside.mean() * 100.0
+# Nominal central-interval coverages on the calibration curve (%)
+INTERVALS = [50, 68, 80, 90, 95]
 
 
 def plot_calibration_from_csv(
@@ -48,6 +29,10 @@ def plot_calibration_from_csv(
     # -----------------------------
     df = pd.read_csv(csv_path)
 
+    # catboost_reg.py writes the Stage 1 mean (the one sigma belongs to) as pred_log_price_stage1
+    if "pred_log_price" not in df.columns and "pred_log_price_stage1" in df.columns:
+        df["pred_log_price"] = df["pred_log_price_stage1"]
+
     required_cols = [
         "true_log_price",
         "pred_log_price",
@@ -79,16 +64,11 @@ def plot_calibration_from_csv(
     # -----------------------------
     # Compute calibration curve points
     # -----------------------------
-    intervals = [50, 68, 80, 90, 95]
-    coverage_before = []
-    coverage_after = []
-
-    for conf in intervals:
-        z = Z_BY_CONF[conf]
-        cov_b = compute_coverage(y_true_log, mu_log, sigma_log, z)
-        cov_a = compute_coverage(y_true_log, mu_log, sigma_calibrated, z)
-        coverage_before.append(cov_b)
-        coverage_after.append(cov_a)
+    # One sort of |y - mu| / sigma per curve (ai_training/calibration.py)
+    intervals = INTERVALS
+    levels = [c / 100 for c in intervals]
+    coverage_before = list(coverage_curve(y_true_log, mu_log, sigma_log, levels) * 100)
+    coverage_after = list(coverage_curve(y_true_log, mu_log, sigma_calibrated, levels) * 100)
 
     if verbose:
         print("Calibration curve (Expected -> Actual)")
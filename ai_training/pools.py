@@ -0,0 +1,95 @@
+"""
+Quantized CatBoost Pools, built once and reused.
+
+Fitting on a DataFrame makes CatBoost hash the categoricals and pick the
+numeric borders again on every fit: five times in a 5-fold loop, once more
+for the final model, and again on the next run of the script. cached_pool()
+does that work once for the whole training frame and saves the quantized
+Pool under POOL_DIR. The file name includes a hash of the data (values,
+columns, label) and the quantization settings, so later runs with the same
+data load the file in milliseconds. Folds train on slices of it
+(fold_pools, or run_folds given the path).
+
+Borders are picked from the full training frame rather than per fold.
+Models trained on a quantized pool still predict from raw DataFrames as
+usual; they can't predict on a quantized pool.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+import catboost
+import numpy as np
+import pandas as pd
+from catboost import Pool
+
+POOL_DIR = Path("ai_training/cache/pools")
+
+# Pool.quantize() settings; part of the cache key
+QUANTIZE_PARAMS: Dict[str, Any] = {"border_count": 254}
+
+
+def pool_key(
+    X: pd.DataFrame,
+    y,
+    cat_features: Sequence[str],
+    quantize_params: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Short sha256 of the rows, columns, label and quantization settings."""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    h.update(np.ascontiguousarray(np.asarray(y, dtype=float)).tobytes())
+    h.update(json.dumps({
+        "columns": list(X.columns),
+        "dtypes": [str(t) for t in X.dtypes],
+        "cat_features": list(cat_features),
+        "quantize": quantize_params or QUANTIZE_PARAMS,
+        "catboost": catboost.__version__,
+    }, sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+
+def load_pool(path: Path) -> Pool:
+    """A pool saved by cached_pool()."""
+    return Pool(f"quantized://{path}")
+
+
+def cached_pool(
+    X: pd.DataFrame,
+    y,
+    cat_features: Sequence[str],
+    name: str,
+    quantize_params: Optional[Dict[str, Any]] = None,
+    cache_dir: Path = POOL_DIR,
+) -> Path:
+    """
+    Path of the quantized Pool for (X, y), building and saving it first if
+    no pool for this data exists yet. Older pools saved under the same
+    `name` are removed.
+    """
+    quantize_params = quantize_params or QUANTIZE_PARAMS
+    key = pool_key(X, y, cat_features, quantize_params)
+    path = Path(cache_dir) / f"{name}-{key}.quantized"
+    if path.exists():
+        print(f"[+] Pool {name}: cached ({path})")
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pool = Pool(X, np.asarray(y, dtype=float), cat_features=list(cat_features))
+    pool.quantize(**quantize_params)
+    tmp = path.with_suffix(".part")
+    pool.save(str(tmp))
+    tmp.replace(path)
+
+    for old in path.parent.glob(f"{name}-*.quantized"):
+        if old != path:
+            old.unlink()
+    print(f"[+] Pool {name}: quantized {pool.num_row():,} rows -> {path}")
+    return path
+
+
+def fold_pools(pool: Pool, splits: Iterable[Tuple[np.ndarray, np.ndarray]]) -> Iterator[Tuple[Pool, Pool]]:
+    """(train, validation) slices of one quantized pool per split, sliced as they are needed."""
+    for tr, va in splits:
+        yield pool.slice(np.asarray(tr)), pool.slice(np.asarray(va))
@@ -0,0 +1,320 @@
+"""
+Hyperparameter search with successive halving.
+
+Every candidate is first trained on one CV fold with a small iteration
+budget. The best 1/eta move up a rung (more folds, more iterations) and the
+rest are pruned, so only a handful of candidates ever get the full 5-fold,
+full-iteration CV that catboost_reg.py / catboost_tweedie.py run.
+
+  rung 0: 27 trials x 1 fold  x  500 iterations
+  rung 1:  9 trials x 2 folds x 1500 iterations
+  rung 2:  3 trials x 5 folds x 5000 iterations
+
+Trials of a rung train in parallel (threads split as in folds.py) on slices
+of the cached quantized Pool (pools.py). Trials are ranked on the mean
+validation metric at the best iteration (RMSE of log price for Stage 1, MAE
+of scaled price for Tweedie; early stopping is on). Every trial at every
+rung goes to SEARCH_DB with its parameters, metric, best iterations and
+wall time.
+
+    python -m ai_training.search stage1 --trials 27
+    python -m ai_training.search tweedie --trials 27 --workers 4
+    python -m ai_training.search stage1 --show        # best trials so far
+"""
+import argparse
+import json
+import math
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor
+from sklearn.model_selection import KFold, StratifiedKFold
+
+from ai_training.dataset import load_dataset
+from ai_training.features import CAT_FEATURES, FEATURES
+from ai_training.folds import fold_workers
+from ai_training.pools import cached_pool, load_pool
+
+# =========================
+# CONFIG
+# =========================
+SEARCH_DB = Path("ai_training/cache/search.sqlite")
+N_TRIALS = 27
+ETA = 3  # keep the best 1/ETA of each rung
+RANDOM_SEED = 42
+
+
+# =========================
+# SEARCH SPACES
+# =========================
+# ("int", lo, hi) | ("log", lo, hi) | ("uniform", lo, hi) | ("choice", [values])
+def _sample(spec, rng: np.random.Generator):
+    kind = spec[0]
+    if kind == "int":
+        return int(rng.integers(spec[1], spec[2] + 1))
+    if kind == "log":
+        return float(np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2]))))
+    if kind == "uniform":
+        return float(rng.uniform(spec[1], spec[2]))
+    if kind == "choice":
+        return spec[1][int(rng.integers(len(spec[1])))]
+    raise ValueError(f"Unknown search space kind: {kind}")
+
+
+def _stage1_data():
+    target = "log_price"
+    df = load_dataset("ai_training/datasets/train.csv", FEATURES, target)
+    X, y = df[FEATURES], df[target].to_numpy()
+    return X, y, list(KFold(n_splits=5, shuffle=True, random_state=42).split(X))
+
+
+def _tweedie_data():
+    target = "price_aed"
+    df = load_dataset("ai_training/datasets/train_raw_price.csv", FEATURES, target)
+    price = np.maximum(df[target].to_numpy(dtype=float), 1.0)
+    scale = max(float(np.nanmedian(price)), 1.0) / 10.0  # same scaling as catboost_tweedie.py
+    bins = pd.qcut(np.log1p(price), q=10, labels=False, duplicates="drop")
+    X = df[FEATURES]
+    return X, price / scale, list(StratifiedKFold(n_splits=5, shuffle=True, random_state=42).split(X, bins))
+
+
+def _tweedie_params(p: Dict[str, Any]) -> Dict[str, Any]:
+    vp = p.pop("variance_power")
+    return {**p, "loss_function": f"Tweedie:variance_power={vp}", "eval_metric": f"Tweedie:variance_power={vp}"}
+
+
+@dataclass
+class Space:
+    """What a study searches: data, fixed params, sampled params and the rungs."""
+    load: Callable[[], Tuple[pd.DataFrame, np.ndarray, list]]
+    base_params: Dict[str, Any]
+    params: Dict[str, tuple]
+    rungs: Sequence[Tuple[int, int]]  # (folds, max iterations) per rung
+    metric: str                       # validation metric trials are ranked on (lower is better)
+    finalize: Callable[[Dict[str, Any]], Dict[str, Any]] = field(default=lambda p: p)
+
+
+SPACES = {
+    # catboost_reg.py Stage 1
+    "stage1": Space(
+        load=_stage1_data,
+        base_params=dict(
+            loss_function="RMSEWithUncertainty", eval_metric="RMSE",
+            random_seed=42, early_stopping_rounds=100,
+        ),
+        params={
+            "depth": ("int", 5, 10),
+            "learning_rate": ("log", 0.02, 0.15),
+            "l2_leaf_reg": ("log", 1.0, 30.0),
+            "random_strength": ("log", 0.1, 10.0),
+        },
+        rungs=[(1, 500), (2, 1500), (5, 5000)],
+        metric="RMSE",
+    ),
+    # catboost_tweedie.py
+    "tweedie": Space(
+        load=_tweedie_data,
+        base_params=dict(
+            random_seed=42, leaf_estimation_method="Newton", leaf_estimation_iterations=10,
+            od_type="Iter", od_wait=800, custom_metric=["MAE"],
+        ),
+        params={
+            "variance_power": ("uniform", 1.3, 1.9),
+            "depth": ("int", 5, 10),
+            "learning_rate": ("log", 0.01, 0.1),
+            "l2_leaf_reg": ("log", 1.0, 30.0),
+        },
+        rungs=[(1, 1000), (2, 4000), (5, 12000)],
+        # Tweedie deviance isn't comparable across variance powers; MAE (scaled price) is
+        metric="MAE",
+        finalize=_tweedie_params,
+    ),
+}
+
+
+# =========================
+# RESULTS DB
+# =========================
+def open_db(path: Path = SEARCH_DB) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS trials (
+            study       TEXT NOT NULL,
+            space       TEXT NOT NULL,
+            trial       INTEGER NOT NULL,
+            rung        INTEGER NOT NULL,
+            params      TEXT NOT NULL,
+            folds       INTEGER NOT NULL,
+            iterations  INTEGER NOT NULL,
+            metric      REAL,
+            best_iters  TEXT,
+            seconds     REAL NOT NULL,
+            status      TEXT NOT NULL,
+            created_at  REAL NOT NULL,
+            PRIMARY KEY (study, trial, rung)
+        );
+        """
+    )
+    return db
+
+
+def best_trials(space: str, limit: int = 10, db_path: Path = SEARCH_DB) -> pd.DataFrame:
+    """Best trials of `space` that reached the last rung, across studies."""
+    db = open_db(db_path)
+    try:
+        df = pd.read_sql_query(
+            """
+            SELECT study, trial, metric, params, best_iters, seconds FROM trials
+            WHERE space = ? AND rung = (SELECT MAX(rung) FROM trials t WHERE t.study = trials.study)
+              AND metric IS NOT NULL
+            ORDER BY metric LIMIT ?
+            """,
+            db, params=(space, limit),
+        )
+    finally:
+        db.close()
+    return df
+
+
+# =========================
+# TRIALS
+# =========================
+_DATA: Dict[str, Any] = {}
+
+
+def _init_worker(pool_path: str, splits: list) -> None:
+    _DATA["pool"], _DATA["splits"] = load_pool(pool_path), splits
+
+
+def _run_trial(task) -> Dict[str, Any]:
+    trial, params, metric_name, n_folds = task
+    pool = _DATA["pool"]
+    start = time.perf_counter()
+    scores, best_iters = [], []
+    for train_idx, val_idx in _DATA["splits"][:n_folds]:
+        model = CatBoostRegressor(**params)
+        model.fit(pool.slice(train_idx), eval_set=pool.slice(val_idx), use_best_model=True)
+        best = model.get_best_iteration()
+        best = params["iterations"] - 1 if best is None else int(best)
+        scores.append(model.get_evals_result()["validation"][metric_name][best])
+        best_iters.append(best + 1)
+    metric = float(np.mean(scores))
+    return {
+        "trial": trial,
+        "metric": metric if math.isfinite(metric) else None,
+        "best_iters": best_iters,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def successive_halving(
+    space_name: str,
+    n_trials: int = N_TRIALS,
+    eta: int = ETA,
+    workers: Optional[int] = None,
+    seed: int = RANDOM_SEED,
+    study: Optional[str] = None,
+    db_path: Path = SEARCH_DB,
+) -> pd.DataFrame:
+    """
+    Run one study; returns the trials of the last rung, best first.
+    Every rung's results (promoted or pruned) are written to db_path.
+    """
+    space = SPACES[space_name]
+    study = study or f"{space_name}-{time.strftime('%Y%m%d-%H%M%S')}"
+    rng = np.random.default_rng(seed)
+
+    X, y, splits = space.load()
+    pool_path = cached_pool(X, y, CAT_FEATURES, f"search_{space_name}")
+    sampled = {t: {k: _sample(spec, rng) for k, spec in space.params.items()} for t in range(n_trials)}
+
+    full_cost = n_trials * space.rungs[-1][0] * space.rungs[-1][1]
+    print(f"[+] Study {study}: {n_trials} trials, rungs (folds, iterations) {list(space.rungs)}")
+
+    db = open_db(db_path)
+    alive = list(sampled)
+    spent = 0
+    results: List[Dict[str, Any]] = []
+    try:
+        with ProcessPoolExecutor(
+            max_workers=fold_workers(n_trials, workers)[0],
+            initializer=_init_worker,
+            initargs=(str(pool_path), splits),
+        ) as pool:
+            for rung, (n_folds, iterations) in enumerate(space.rungs):
+                n_workers, threads = fold_workers(len(alive), workers)
+                tasks = [
+                    (t, space.finalize({
+                        **space.base_params, **sampled[t],
+                        "iterations": iterations, "thread_count": threads,
+                        "verbose": 0, "allow_writing_files": False,
+                    }), space.metric, n_folds)
+                    for t in alive
+                ]
+                start = time.perf_counter()
+                results = list(pool.map(_run_trial, tasks))
+                spent += len(alive) * n_folds * iterations
+
+                ranked = sorted(results, key=lambda r: (r["metric"] is None, r["metric"] or 0.0))
+                last = rung == len(space.rungs) - 1
+                keep = len(ranked) if last else max(1, len(ranked) // eta)
+                promoted = {r["trial"] for r in ranked[:keep]}
+
+                db.executemany(
+                    "INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            study, space_name, r["trial"], rung, json.dumps(sampled[r["trial"]]),
+                            n_folds, iterations, r["metric"], json.dumps(r["best_iters"]), r["seconds"],
+                            "completed" if last else ("promoted" if r["trial"] in promoted else "pruned"),
+                            time.time(),
+                        )
+                        for r in results
+                    ],
+                )
+                db.commit()
+
+                best = ranked[0]
+                best_metric = "n/a" if best["metric"] is None else f"{best['metric']:.5f}"
+                print(f"    rung {rung}: {len(alive)} trials x {n_folds} folds x {iterations} it "
+                      f"({n_workers} at once x {threads} threads) in {time.perf_counter() - start:.1f}s "
+                      f"| best {space.metric} {best_metric} (trial {best['trial']}) | keep {keep}")
+                alive = [r["trial"] for r in ranked[:keep]]
+    finally:
+        db.close()
+
+    print(f"[+] Fold-iterations spent: {spent:,} (full CV on every trial: {full_cost:,}, "
+          f"{full_cost / max(spent, 1):.1f}x more)")
+
+    final = pd.DataFrame([
+        {"trial": r["trial"], "metric": r["metric"], "best_iters": r["best_iters"], **sampled[r["trial"]]}
+        for r in results
+    ]).sort_values("metric")
+    print(final.to_string(index=False))
+    return final
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search.")
+    parser.add_argument("space", choices=list(SPACES))
+    parser.add_argument("--trials", type=int, default=N_TRIALS)
+    parser.add_argument("--eta", type=int, default=ETA, help="keep the best 1/eta trials per rung")
+    parser.add_argument("--workers", type=int, default=None, help="trials trained at once (default: one per core)")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED)
+    parser.add_argument("--study", default=None, help="study name in the results DB")
+    parser.add_argument("--db", type=Path, default=SEARCH_DB)
+    parser.add_argument("--show", action="store_true", help="print the best finished trials and exit")
+    args = parser.parse_args()
+
+    if args.show:
+        print(best_trials(args.space, db_path=args.db).to_string(index=False))
+    else:
+        successive_halving(args.space, args.trials, args.eta, args.workers, args.seed, args.study, args.db)
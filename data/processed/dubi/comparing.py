@@ -1,9 +1,15 @@
 import pandas as pd
 from pathlib import Path
 
+from scraper.preprocessing.canonical import Canonicalizer
+
+# Run from the repo root: PYTHONPATH=. python data/processed/dubi/comparing.py
+# (after python -m scraper.preprocessing.canonical build)
+
 # File paths
-file1 = Path("/Users/saif/Desktop/University Saif/Y3/dissertion/project/data/processed/dubi/model_counts.csv")
-file2 = Path("/Users/saif/Desktop/University Saif/Y3/dissertion/project/data/processed/dubi/model_counts_kaggle.csv")
+file1 = Path("data/processed/dubi/model_counts.csv")
+file2 = Path("data/processed/dubi/model_counts_kaggle.csv")
+output_path = Path("data/processed/dubi/model_counts_comparison.csv")
 
 # Read the CSV files
 print("[+] Reading CSV files...")
@@ -18,21 +24,22 @@ print(f"\n[+] File 2: {file2.name}")
 print(f"    Rows: {len(df2)}")
 print(f"    Columns: {list(df2.columns)}")
 
-# Group by make and sum the counts (since each row is make+model)
-df1_grouped = df1.groupby('make_detail')['count'].sum().reset_index()
-df1_grouped.columns = ['make', 'count_file1']
+# The two files spell makes and models differently ("Mercedes-Benz" / "mercedes-benz",
+# "S-Class" / "s-class"), so both are resolved to canonical ids and compared on those
+canon = Canonicalizer()
+df1[["make_id", "model_id"]] = canon.resolve_frame(df1["make_detail"], df1["model_detail"])[["make_id", "model_id"]]
+df2[["make_id", "model_id"]] = canon.resolve_frame(df2["Make"], df2["Model"])[["make_id", "model_id"]]
+
+for name, df in [(file1.name, df1), (file2.name, df2)]:
+    unresolved = (df["model_id"] < 0).sum()
+    if unresolved:
+        print(f"[!] {name}: {unresolved} rows with a make/model not in the canonical tables (skipped)")
 
-df2_grouped = df2.groupby('Make')['count'].sum().reset_index()
-df2_grouped.columns = ['make', 'count_file2']
+df1_grouped = df1[df1["model_id"] >= 0].groupby(["make_id", "model_id"])["count"].sum().rename("count_file1")
+df2_grouped = df2[df2["model_id"] >= 0].groupby(["make_id", "model_id"])["count"].sum().rename("count_file2")
 
-# Merge the dataframes on 'make'
-comparison = pd.merge(
-    df1_grouped,
-    df2_grouped,
-    on='make',
-    how='outer',
-    suffixes=('_file1', '_file2')
-)
+# Merge on the (make_id, model_id) integer keys
+comparison = pd.concat([df1_grouped, df2_grouped], axis=1).reset_index()
 
 # Fill NaN values with 0 for better comparison
 comparison['count_file1'] = comparison['count_file1'].fillna(0).astype(int)
@@ -41,22 +48,24 @@ comparison['count_file2'] = comparison['count_file2'].fillna(0).astype(int)
 # Calculate difference
 comparison['difference'] = comparison['count_file1'] - comparison['count_file2']
 
+comparison.insert(0, "make", comparison["make_id"].map(canon.names["make"]))
+comparison.insert(1, "model", comparison["model_id"].map(canon.names["model"]))
+
 # Sort by file1 count descending
 comparison = comparison.sort_values('count_file1', ascending=False)
 
 # Display results
-print("\n" + "="*80)
+print("\n" + "="*90)
 print("COMPARISON: Model Counts")
-print("="*80)
-print(f"\n{'Make':<20} {'File 1 (model_counts)':<25} {'File 2 (kaggle)':<25} {'Difference':<15}")
-print("-"*80)
+print("="*90)
+print(f"\n{'Make':<18} {'Model':<22} {'File 1 (model_counts)':<22} {'File 2 (kaggle)':<18} {'Difference':<10}")
+print("-"*90)
 
 for _, row in comparison.iterrows():
-    make = row['make']
     count1 = int(row['count_file1'])
     count2 = int(row['count_file2'])
     diff = int(row['difference'])
-    
+
     # Color code the difference (just using symbols here)
     if diff > 0:
         diff_str = f"+{diff}"
@@ -64,32 +73,33 @@ for _, row in comparison.iterrows():
         diff_str = f"{diff}"
     else:
         diff_str = "0"
-    
-    print(f"{make:<20} {count1:<25} {count2:<25} {diff_str:<15}")
+
+    print(f"{str(row['make']):<18} {str(row['model']):<22} {count1:<22} {count2:<18} {diff_str:<10}")
 
 # Summary statistics
-print("\n" + "="*80)
+makes = comparison.groupby("make_id")[["count_file1", "count_file2"]].sum()
+print("\n" + "="*90)
 print("SUMMARY")
-print("="*80)
-print(f"Total unique makes in File 1: {len(df1_grouped)}")
-print(f"Total unique makes in File 2: {len(df2_grouped)}")
-print(f"Total unique makes (combined): {len(comparison)}")
-print(f"Total model entries in File 1: {len(df1)} (unique make-model combinations)")
-print(f"Total model entries in File 2: {len(df2)} (unique make-model combinations)")
+print("="*90)
+print(f"Total unique makes in File 1: {(makes['count_file1'] > 0).sum()}")
+print(f"Total unique makes in File 2: {(makes['count_file2'] > 0).sum()}")
+print(f"Total unique makes (combined): {len(makes)}")
+print(f"Models in File 1: {(comparison['count_file1'] > 0).sum()}")
+print(f"Models in File 2: {(comparison['count_file2'] > 0).sum()}")
+print(f"Models in both files: {((comparison['count_file1'] > 0) & (comparison['count_file2'] > 0)).sum()}")
 print(f"Total listings in File 1: {comparison['count_file1'].sum()}")
 print(f"Total listings in File 2: {comparison['count_file2'].sum()}")
 print(f"Difference: {comparison['difference'].sum()}")
 
-# Show which file has more models per make
+# Show which file has more listings per model
 file1_better = len(comparison[comparison['count_file1'] > comparison['count_file2']])
 file2_better = len(comparison[comparison['count_file2'] > comparison['count_file1']])
 equal = len(comparison[comparison['count_file1'] == comparison['count_file2']])
 
-print(f"\nMakes where File 1 has more models: {file1_better}")
-print(f"Makes where File 2 has more models: {file2_better}")
-print(f"Makes with equal models: {equal}")
+print(f"\nModels where File 1 has more listings: {file1_better}")
+print(f"Models where File 2 has more listings: {file2_better}")
+print(f"Models with equal listings: {equal}")
 
 # Save comparison to CSV
-output_path = Path("/Users/saif/Desktop/University Saif/Y3/dissertion/project/data/processed/dubi/model_counts_comparison.csv")
 comparison.to_csv(output_path, index=False)
 print(f"\n[+] Comparison saved to: {output_path}")
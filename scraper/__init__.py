@@ -0,0 +1 @@
+# Scraper Package
@@ -0,0 +1,193 @@
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+import pandas as pd
+
+# ---- Config ------------------------------------------------------------
+
+# Always dictionary-encoded (pandas "category"), whatever their cardinality
+CATEGORICAL_COLUMNS = [
+    "brand", "model", "trim", "type", "fuel_type", "body_type", "steering_side",
+    "regional_specs", "doors", "seating_capacity", "cylinders", "age_bucket",
+    "city", "currency", "make_detail", "model_detail", "vehicle_type", "specs_detail",
+]
+
+# Other text columns are dictionary-encoded when they repeat this much
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+BENCH_CSV = Path("ai_training/datasets/train.csv")
+
+CHUNK_ROWS = 200_000  # iter_table default
+
+
+def parquet_path(path: Path) -> Path:
+    """The Parquet copy that lives next to a CSV (train.csv -> train.parquet)."""
+    return Path(path).with_suffix(".parquet")
+
+
+def type_columns(df: pd.DataFrame, categorical: Sequence[str] = CATEGORICAL_COLUMNS) -> pd.DataFrame:
+    """
+    Settle column types once, so readers don't re-infer them: text columns
+    that are fully numeric become numbers, known categoricals and repetitive
+    text become pandas categoricals (Arrow dictionary columns).
+    """
+    df = df.copy()
+    for col in df.columns:
+        s = df[col]
+        if col in categorical:
+            df[col] = s.astype("string").astype("category")
+            continue
+        if s.dtype != object:
+            continue
+        numeric = pd.to_numeric(s, errors="coerce")
+        if numeric.notna().sum() == s.notna().sum():
+            df[col] = numeric
+        elif s.nunique(dropna=True) <= CATEGORY_MAX_UNIQUE_RATIO * max(len(s), 1):
+            df[col] = s.astype("string").astype("category")
+        else:
+            df[col] = s.astype("string")
+    return df
+
+
+def write_table(df: pd.DataFrame, path: Path, categorical: Sequence[str] = CATEGORICAL_COLUMNS) -> Path:
+    """
+    Write df as zstd Parquet with typed + dictionary-encoded columns.
+    Like the scrape sinks, the file is written to `<path>.part` first and
+    renamed into place, so readers never see a half-written table.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = path.with_name(path.name + ".part")
+
+    table = pa.Table.from_pandas(type_columns(df, categorical), preserve_index=False)
+    pq.write_table(table, part, compression="zstd")
+    os.replace(part, path)
+    return path
+
+
+def read_table(path: Path, columns: Optional[Sequence[str]] = None,
+               dtype: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Load a dataset by its CSV path (or a .parquet path directly).
+
+    If an up-to-date Parquet copy sits next to the CSV, only the requested
+    columns are read from it, memory-mapped, with types and categoricals
+    already in place. Otherwise this is plain pd.read_csv, so callers work
+    the same whether or not the data has been converted. `dtype` only
+    applies to the CSV (e.g. {"brand": "category"}); Parquet is already typed.
+    """
+    path = Path(path)
+    pq_path = _fresh_parquet(path)
+    if pq_path is not None:
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(pq_path, columns=list(columns) if columns else None, memory_map=True)
+        return table.to_pandas()
+
+    if dtype and columns:
+        dtype = {c: t for c, t in dtype.items() if c in columns}
+    return pd.read_csv(path, usecols=list(columns) if columns else None, dtype=dtype)
+
+
+def iter_table(path: Path, columns: Optional[Sequence[str]] = None,
+               chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    read_table in chunks of up to chunk_rows rows, for tables that don't fit
+    in memory: Parquet record batches when an up-to-date copy exists, else
+    pd.read_csv(chunksize=...). The chunks keep the file's row numbers as
+    their index.
+    """
+    path = Path(path)
+    pq_path = _fresh_parquet(path)
+    if pq_path is None:
+        yield from pd.read_csv(path, usecols=list(columns) if columns else None, chunksize=chunk_rows)
+        return
+
+    import pyarrow.parquet as pq
+
+    start = 0
+    for batch in pq.ParquetFile(pq_path).iter_batches(batch_size=chunk_rows, columns=list(columns) if columns else None):
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def _fresh_parquet(path: Path) -> Optional[Path]:
+    """The Parquet file to read for `path`, or None to read the CSV."""
+    pq_path = path if path.suffix == ".parquet" else parquet_path(path)
+    fresh = pq_path.exists() and (
+        not path.exists() or pq_path.stat().st_mtime >= path.stat().st_mtime
+    )
+    return pq_path if fresh else None
+
+
+def convert(csv_path: Path) -> Path:
+    """Write the typed Parquet copy of a CSV next to it."""
+    csv_path = Path(csv_path)
+    df = pd.read_csv(csv_path, low_memory=False)
+    out = write_table(df, parquet_path(csv_path))
+    print(f"[+] {csv_path} ({csv_path.stat().st_size / 1e6:.1f} MB) -> "
+          f"{out} ({out.stat().st_size / 1e6:.1f} MB), {len(df):,} rows")
+    return out
+
+
+def main_bench(path: Path = BENCH_CSV, repeat: int = 5):
+    """
+    Time loading the training columns from CSV (plus the dtype coercion the
+    training scripts do) against the Parquet copy, and compare memory use.
+    """
+    cat_features = [
+        "brand", "model", "trim", "fuel_type", "body_type", "steering_side",
+        "regional_specs", "doors", "seating_capacity", "cylinders", "age_bucket",
+    ]
+    num_features = ["kms", "vehicle_age", "kms_per_year", "horsepower_mid", "engine_cc_mid"]
+
+    def from_csv():
+        df = pd.read_csv(path)
+        for col in cat_features:
+            df[col] = df[col].astype("string").fillna("Unknown")
+        for col in num_features:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        return df
+
+    pq_path = parquet_path(path)
+    if not pq_path.exists() or pq_path.stat().st_mtime < Path(path).stat().st_mtime:
+        convert(path)
+
+    variants = [
+        ("csv + coercion", from_csv),
+        ("parquet, all columns", lambda: read_table(pq_path)),
+        ("parquet, 3 columns", lambda: read_table(pq_path, columns=["brand", "model", "kms"])),
+    ]
+    print(f"[+] {path}")
+    for name, fn in variants:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            df = fn()
+            best = min(best, time.perf_counter() - start)
+        mem = df.memory_usage(deep=True).sum() / 1e6
+        print(f"    {name:<22} {best * 1000:7.1f} ms  {mem:7.1f} MB in memory")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Typed Parquet copies of the CSV datasets.")
+    parser.add_argument(
+        "mode", choices=["convert", "bench"],
+        help="'convert' writes <name>.parquet next to each CSV; 'bench' compares load time + memory",
+    )
+    parser.add_argument("paths", nargs="*", type=Path, help="CSV files (bench: one file)")
+    args = parser.parse_args()
+
+    if args.mode == "bench":
+        main_bench(*(args.paths[:1] or [BENCH_CSV]))
+    else:
+        for p in args.paths:
+            convert(p)
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+from scraper.http_client import HttpClient
+
+CRAWL_WORKERS = 4          # pages fetched + parsed concurrently
+MIN_REQUEST_INTERVAL = 0.5  # seconds between request starts, across all workers
+
+
+class RateLimiter:
+    """Spaces out request starts so concurrent workers stay polite."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self.min_interval
+        delay = start_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def crawl_pages(
+    client: HttpClient,
+    urls: Iterable[str],
+    parse: Callable[[str], List[Any]],
+    kind: str = "page",
+    workers: int = CRAWL_WORKERS,
+    min_interval: float = MIN_REQUEST_INTERVAL,
+) -> Iterator[Tuple[str, List[Any]]]:
+    """
+    Fetch and parse pages on a thread pool, yielding (url, parse(html)) in the
+    same order as `urls`. At most 2 * workers pages are in flight, so the
+    caller can stop early (e.g. on an empty page) by simply breaking out of
+    the loop; pages not started yet are cancelled.
+
+    Fetch errors are re-raised in the caller when their page is reached.
+    """
+    limiter = RateLimiter(min_interval)
+
+    def fetch_and_parse(url: str) -> Tuple[str, List[Any]]:
+        limiter.wait()
+        html = client.get(url, kind=kind)
+        return url, parse(html)
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    url_iter = iter(urls)
+    try:
+        for url in url_iter:
+            pending.append(pool.submit(fetch_and_parse, url))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import zstandard as zstd
+
+# ---- Paths -------------------------------------------------------------
+
+ARCHIVE_DIR = Path("data/raw/html_archive")
+
+PACK_NAME = "pages.pack"     # append-only stream of independent zstd frames
+INDEX_NAME = "index.sqlite"  # url -> sha256 -> (offset, length) in the pack
+
+ZSTD_LEVEL = 10
+REPARSE_CHUNKSIZE = 16  # pages handed to a worker at a time
+
+
+class HtmlArchive:
+    """
+    Content-addressed, zstd-compressed store of every fetched HTML page.
+
+    Each distinct page body is compressed once into its own zstd frame and
+    appended to a single pack file; a SQLite index maps sha256 -> byte range
+    and url -> sha256 (one row per fetch, so re-crawls keep their history).
+    """
+
+    def __init__(self, root: Path = ARCHIVE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.pack_path = self.root / PACK_NAME
+        self.index_path = self.root / INDEX_NAME
+
+        # Shared by crawler threads; every access goes through self._lock
+        self._db = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256   TEXT PRIMARY KEY,
+                offset   INTEGER NOT NULL,
+                length   INTEGER NOT NULL,
+                raw_size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                url        TEXT NOT NULL,
+                kind       TEXT NOT NULL,
+                sha256     TEXT NOT NULL REFERENCES blobs(sha256),
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_url ON pages(url);
+            CREATE INDEX IF NOT EXISTS pages_kind ON pages(kind);
+            """
+        )
+        self._pack = None
+        self._compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+
+    # ---- Writing -------------------------------------------------------
+
+    def put(self, url: str, html: str, kind: str = "page") -> str:
+        """
+        Store one fetched page. Identical bodies are written to the pack only
+        once; every call still records a (url, kind, fetched_at) index row.
+        Returns the sha256 of the page body.
+        """
+        raw = html.encode("utf-8")
+        sha = hashlib.sha256(raw).hexdigest()
+
+        with self._lock:
+            known = self._db.execute(
+                "SELECT 1 FROM blobs WHERE sha256 = ?", (sha,)
+            ).fetchone()
+
+            if known is None:
+                if self._pack is None:
+                    self._pack = open(self.pack_path, "ab")
+                frame = self._compressor.compress(raw)
+                self._pack.seek(0, os.SEEK_END)
+                offset = self._pack.tell()
+                self._pack.write(frame)
+                # Pack bytes must hit disk before the index points at them
+                self._pack.flush()
+                os.fsync(self._pack.fileno())
+                self._db.execute(
+                    "INSERT INTO blobs (sha256, offset, length, raw_size) VALUES (?, ?, ?, ?)",
+                    (sha, offset, len(frame), len(raw)),
+                )
+
+            self._db.execute(
+                "INSERT INTO pages (url, kind, sha256, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, kind, sha, time.time()),
+            )
+            self._db.commit()
+        return sha
+
+    # ---- Reading -------------------------------------------------------
+
+    def read_blob(self, offset: int, length: int) -> str:
+        with open(self.pack_path, "rb") as f:
+            f.seek(offset)
+            frame = f.read(length)
+        # ZstdDecompressor instances are not safe to share between threads
+        return zstd.ZstdDecompressor().decompress(frame).decode("utf-8")
+
+    def get(self, url: str) -> Optional[str]:
+        """Return the most recently archived HTML for url, or None."""
+        with self._lock:
+            row = self._db.execute(
+                """
+                SELECT b.offset, b.length FROM pages p JOIN blobs b USING (sha256)
+                WHERE p.url = ? ORDER BY p.fetched_at DESC LIMIT 1
+                """,
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return self.read_blob(*row)
+
+    def get_by_sha(self, sha: str) -> Optional[str]:
+        """Return the archived page body with the given sha256, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT offset, length FROM blobs WHERE sha256 = ?", (sha,)
+            ).fetchone()
+        if row is None:
+            return None
+        return self.read_blob(*row)
+
+    def latest_entries(self, kind: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """
+        (url, offset, length) of the latest fetch of every archived url,
+        optionally restricted to one page kind ("dubicars_search", ...).
+        """
+        query = """
+            SELECT p.url, b.offset, b.length
+            FROM pages p JOIN blobs b USING (sha256)
+            WHERE p.rowid IN (SELECT MAX(rowid) FROM pages {where} GROUP BY url)
+            ORDER BY p.rowid
+        """
+        with self._lock:
+            if kind is None:
+                return self._db.execute(query.format(where="")).fetchall()
+            return self._db.execute(query.format(where="WHERE kind = ?"), (kind,)).fetchall()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n_pages, n_urls = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT url) FROM pages"
+            ).fetchone()
+            n_blobs, raw, packed = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(length), 0) FROM blobs"
+            ).fetchone()
+        return {
+            "fetches": n_pages,
+            "urls": n_urls,
+            "unique_pages": n_blobs,
+            "raw_bytes": raw,
+            "packed_bytes": packed,
+        }
+
+    def close(self) -> None:
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+        self._db.close()
+
+
+# ---- Offline re-parse --------------------------------------------------
+
+# Per-worker state, set up once by _init_worker
+_worker_pack = None
+_worker_parser = None
+_worker_decompressor = None
+
+
+def _init_worker(pack_path: str, parser: Callable[[str], Any]) -> None:
+    global _worker_pack, _worker_parser, _worker_decompressor
+    _worker_pack = open(pack_path, "rb")
+    _worker_parser = parser
+    _worker_decompressor = zstd.ZstdDecompressor()
+
+
+def _parse_entry(entry: Tuple[str, int, int]) -> Tuple[str, Any]:
+    url, offset, length = entry
+    _worker_pack.seek(offset)
+    html = _worker_decompressor.decompress(_worker_pack.read(length)).decode("utf-8")
+    return url, _worker_parser(html)
+
+
+def reparse(
+    parser: Callable[[str], Any],
+    kind: Optional[str] = None,
+    root: Path = ARCHIVE_DIR,
+    workers: Optional[int] = None,
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Run `parser` over the latest archived copy of every url (of the given
+    kind) using a process pool, yielding (url, parser_output) in archive order.
+
+    `parser` must be a module-level function so it can be sent to workers.
+    """
+    archive = HtmlArchive(root)
+    entries = archive.latest_entries(kind)
+    pack_path = str(archive.pack_path)
+    archive.close()
+
+    print(f"[+] Re-parsing {len(entries)} archived pages (kind={kind or 'any'})")
+    if not entries:
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(pack_path, parser),
+    ) as pool:
+        yield from pool.map(_parse_entry, entries, chunksize=REPARSE_CHUNKSIZE)
@@ -0,0 +1,177 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scraper.html_archive import ARCHIVE_DIR, HtmlArchive
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx only speaks HTTP/2 when h2 is installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# ---- Config ------------------------------------------------------------
+
+CACHE_PATH = ARCHIVE_DIR / "http_cache.sqlite"
+
+POOL_SIZE = 16        # keep-alive connections per host
+DEFAULT_TIMEOUT = 20  # seconds
+
+
+class HttpClient:
+    """
+    Shared HTTP client for the scrapers.
+
+    - One pooled keep-alive session (HTTP/2 via httpx when available,
+      otherwise requests + urllib3 pooling).
+    - On-disk conditional cache: the ETag / Last-Modified of every response is
+      remembered and sent back as If-None-Match / If-Modified-Since, so an
+      unchanged page costs a 304; its body comes from the HtmlArchive.
+    - Every request's status, size and latency is logged to the cache DB.
+    """
+
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        archive: Optional[HtmlArchive] = None,
+        cache_path: Path = CACHE_PATH,
+        pool_size: int = POOL_SIZE,
+        use_http2: bool = True,
+    ):
+        self.timeout = timeout
+        self.archive = archive if archive is not None else HtmlArchive()
+        self.http2 = use_http2 and HTTP2_AVAILABLE
+
+        if self.http2:
+            self._session = httpx.Client(
+                http2=True,
+                headers=headers,
+                timeout=timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                ),
+            )
+        else:
+            self._session = requests.Session()
+            if headers:
+                self._session.headers.update(headers)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+
+        cache_path = Path(cache_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                url           TEXT PRIMARY KEY,
+                etag          TEXT,
+                last_modified TEXT,
+                sha256        TEXT NOT NULL,
+                fetched_at    REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS request_log (
+                ts         REAL NOT NULL,
+                url        TEXT NOT NULL,
+                status     INTEGER NOT NULL,
+                from_cache INTEGER NOT NULL,
+                bytes      INTEGER NOT NULL,
+                elapsed_ms REAL NOT NULL
+            );
+            """
+        )
+
+        # In-memory timings for report()
+        self._elapsed_ms: List[float] = []
+        self._not_modified = 0
+
+    def get(self, url: str, kind: str = "page") -> str:
+        """
+        GET url and return its HTML. Raises on HTTP errors, like
+        requests' raise_for_status(). `kind` is the archive page kind.
+        """
+        with self._lock:
+            cached = self._db.execute(
+                "SELECT etag, last_modified, sha256 FROM cache WHERE url = ?", (url,)
+            ).fetchone()
+
+        conditional = {}
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                conditional["If-None-Match"] = etag
+            if last_modified:
+                conditional["If-Modified-Since"] = last_modified
+
+        start = time.perf_counter()
+        resp = self._session.get(url, headers=conditional, timeout=self.timeout)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if resp.status_code == 304 and cached is not None:
+            html = self.archive.get_by_sha(cached[2])
+            if html is not None:
+                self._log(url, 304, True, 0, elapsed_ms)
+                return html
+            # cache row points at a body we no longer have: fetch it fresh
+            start = time.perf_counter()
+            resp = self._session.get(url, timeout=self.timeout)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+        resp.raise_for_status()
+        html = resp.text
+        sha = self.archive.put(url, html, kind=kind)
+
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        with self._lock:
+            if etag or last_modified:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (url, etag, last_modified, sha256, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (url, etag, last_modified, sha, time.time()),
+                )
+        self._log(url, resp.status_code, False, len(resp.content), elapsed_ms)
+        return html
+
+    def _log(self, url: str, status: int, from_cache: bool, n_bytes: int, elapsed_ms: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO request_log (ts, url, status, from_cache, bytes, elapsed_ms) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (time.time(), url, status, int(from_cache), n_bytes, elapsed_ms),
+            )
+            self._db.commit()
+            self._elapsed_ms.append(elapsed_ms)
+            if from_cache:
+                self._not_modified += 1
+
+    def report(self) -> None:
+        """Print request count, 304 hit rate and latency for this session."""
+        n = len(self._elapsed_ms)
+        if n == 0:
+            print("[+] HTTP: no requests made")
+            return
+        ordered = sorted(self._elapsed_ms)
+        p50 = ordered[n // 2]
+        p95 = ordered[min(n - 1, int(n * 0.95))]
+        print(
+            f"[+] HTTP ({'h2' if self.http2 else 'http/1.1'}): {n} requests, "
+            f"{self._not_modified} not modified ({self._not_modified / n * 100:.1f}%), "
+            f"p50 {p50:.0f} ms, p95 {p95:.0f} ms"
+        )
+
+    def close(self) -> None:
+        self._session.close()
+        self._db.close()
+        self.archive.close()
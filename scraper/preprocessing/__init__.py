@@ -0,0 +1 @@
+# Preprocessing Package
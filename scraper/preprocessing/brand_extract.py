@@ -1,11 +1,92 @@
+import argparse
+import os
 import re
-import pandas as pd
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
 INPUT_CSV         = Path("data/processed/dubicars_cars_clean.csv")
 OUTPUT_CSV        = Path("data/processed/dubicars_cars_clean_extracted.csv")
 MODEL_COUNTS_CSV  = Path("data/processed/dubicars_model_counts.csv")
 
+# Benchmark inputs
+BENCH_DUBICARS_CSV = Path("data/processed/dubi/extended_dubi_listings.csv")
+BENCH_DUBIZZLE_CSV = Path("ai_training/datasets/dubizzle_cars_raw_price.csv")
+
+# Below this many distinct (type, brand) pairs a process pool costs more than it saves
+PARALLEL_MIN_ROWS = 20_000
+
+
+# Tokens where we stop because they are engine/body/spec stuff, not model
+STOPWORDS = frozenset({
+    "HP", "HP)", "BHP",
+    "AWD", "FWD", "RWD",
+    "SUV", "Sedan", "Coupe", "Hatchback", "Pickup", "Van",
+    "A/T", "AT", "Automatic", "Tiptronic", "CVT",
+    "GCC", "Specs", "SPECS",
+    "Petrol", "Diesel", "Hybrid", "Electric",
+    "EXCELLENT", "DEAL", "CONDITION", "OFFER",
+    "ONLY", "PRICE", "CLEAN", "WARRANTY", "SERVICE",
+    "HISTORY", "FULL", "OPTION", "OPTIONS",
+    "KM", "KMS",
+})
+
+# Function words that almost always mean "description is starting"
+FUNCTION_STOPS = frozenset({"for", "our", "with", "and", "or", "from", "in", "on", "by", "per", "at"})
+
+HP_TOKENS = frozenset({"HP", "HP)", "BHP"})
+
+# Precompiled once instead of on every token of every row
+WS_RE = re.compile(r"\s+")
+SEGMENT_RE = re.compile(r"[|,/]")
+DISPLACEMENT_RE = re.compile(r"\d+(\.\d+)?L", flags=re.IGNORECASE)
+YEAR_RE = re.compile(r"^(19|20)\d{2}$")
+MILEAGE_RE = re.compile(r"^\d[\d,]*km$", flags=re.IGNORECASE)
+HP_RE = re.compile(r"^\d{2,4}(-?HP)?$")
+NUMERIC_RE = re.compile(r"^\d{2,4}$")
+
+# Token classes
+TOK_WORD = 0      # part of the model name
+TOK_BREAK = 1     # always ends the model (engine size, year, mileage, spec words, HP)
+TOK_NUMERIC = 2   # 2-4 digit number: model at the start ("07", "1500"), else a break
+TOK_FUNCTION = 3  # "for", "with", ...: ends the model once it has started
+
+
+@lru_cache(maxsize=None)
+def classify_token(t_clean: str) -> int:
+    """
+    Classify one cleaned token (brackets/commas stripped). The result only
+    depends on the token text, so it is cached: titles reuse a small
+    vocabulary, and most tokens are classified exactly once per run.
+    """
+    # 2) Engine displacement anywhere in the token (1.4L, 3.6L, 2L-6CYL, etc.)
+    if DISPLACEMENT_RE.search(t_clean):
+        return TOK_BREAK
+    # 3) 4-digit year (19xx or 20xx)
+    if YEAR_RE.match(t_clean):
+        return TOK_BREAK
+    # 4) Mileage tokens like "74,000Km" / "120000KM"
+    if MILEAGE_RE.match(t_clean):
+        return TOK_BREAK
+    # 5) Generic hard stopwords
+    upper = t_clean.upper()
+    if upper in STOPWORDS:
+        return TOK_BREAK
+    # 6) Horsepower-like tokens: "360HP", "108-HP", etc.
+    if HP_RE.match(upper) and "HP" in upper:
+        return TOK_BREAK
+    # 7) Plain numeric token (potential model OR horsepower / weird code)
+    if NUMERIC_RE.match(t_clean):
+        return TOK_NUMERIC
+    # 8) Function words
+    if t_clean.lower() in FUNCTION_STOPS:
+        return TOK_FUNCTION
+    return TOK_WORD
+
 
 def extract_model_from_type(type_str: str, brand: str = "") -> str:
     """
@@ -21,7 +102,7 @@ def extract_model_from_type(type_str: str, brand: str = "") -> str:
         return ""
 
     # Normalise whitespace
-    s = re.sub(r"\s+", " ", type_str).strip()
+    s = WS_RE.sub(" ", type_str).strip()
     if not s:
         return ""
 
@@ -30,30 +111,13 @@ def extract_model_from_type(type_str: str, brand: str = "") -> str:
     s = s.replace(" - ", " | ")
 
     # Take only the first segment before marketing separators
-    first_seg = re.split(r"[|,/]", s, maxsplit=1)[0]
+    first_seg = SEGMENT_RE.split(s, maxsplit=1)[0]
     first_seg = first_seg.strip()
     if not first_seg:
         return ""
 
     tokens = first_seg.split()
 
-    # Tokens where we stop because they are engine/body/spec stuff, not model
-    stopwords = {
-        "HP", "HP)", "BHP",
-        "AWD", "FWD", "RWD",
-        "SUV", "Sedan", "Coupe", "Hatchback", "Pickup", "Van",
-        "A/T", "AT", "Automatic", "Tiptronic", "CVT",
-        "GCC", "Specs", "SPECS",
-        "Petrol", "Diesel", "Hybrid", "Electric",
-        "EXCELLENT", "DEAL", "CONDITION", "OFFER",
-        "ONLY", "PRICE", "CLEAN", "WARRANTY", "SERVICE",
-        "HISTORY", "FULL", "OPTION", "OPTIONS",
-        "KM", "KMS",
-    }
-
-    # Function words that almost always mean "description is starting"
-    function_stops = {"for", "our", "with", "and", "or", "from", "in", "on", "by", "per", "at"}
-
     brand_lower = (brand or "").strip().lower()
     brand_main = brand_lower.split()[0] if brand_lower else ""
 
@@ -64,45 +128,24 @@ def extract_model_from_type(type_str: str, brand: str = "") -> str:
 
         # 1) If the brand reappears AFTER we've already got some model tokens,
         #    that usually means the dealer has started a new phrase.
-        if brand_lower:
+        if brand_lower and model_tokens:
             t_low = t_clean.lower()
-            if model_tokens and (t_low == brand_lower or t_low == brand_main):
+            if t_low == brand_lower or t_low == brand_main:
                 break
 
-        # 2) Engine displacement anywhere in the token (1.4L, 3.6L, 2L-6CYL, etc.)
-        if re.search(r"\d+(\.\d+)?L", t_clean, flags=re.IGNORECASE):
-            break
-
-        # 3) 4-digit year (19xx or 20xx)
-        if re.match(r"^(19|20)\d{2}$", t_clean):
-            break
-
-        # 4) Mileage tokens like "74,000Km" / "120000KM"
-        if re.match(r"^\d[\d,]*km$", t_clean, flags=re.IGNORECASE):
-            break
-
-        # 5) Generic hard stopwords
-        if t_clean.upper() in stopwords:
+        cls = classify_token(t_clean)
+        if cls == TOK_BREAK:
             break
 
-        # 6) Horsepower-like tokens: "360HP", "108-HP", etc.
-        upper = t_clean.upper()
-        if re.match(r"^\d{2,4}(-?HP)?$", upper):
-            if "HP" in upper:
-                break
-            # Else, let numeric handling below decide
-
-        # 7) Plain numeric token (potential model OR horsepower / weird code)
-        if re.match(r"^\d{2,4}$", t_clean):
+        if cls == TOK_NUMERIC:
             next_tok = tokens[i + 1].strip("(),") if i + 1 < len(tokens) else ""
-            if next_tok.upper() in {"HP", "HP)", "BHP"}:
+            if next_tok.upper() in HP_TOKENS:
                 break
             # If it's the first token, allow it as model (e.g. "07", "001", "1500")
             if model_tokens:
                 break
 
-        # 8) Function words once the model has started
-        if model_tokens and t_clean.lower() in function_stops:
+        elif cls == TOK_FUNCTION and model_tokens:
             break
 
         model_tokens.append(t_clean if t_clean else tok)
@@ -111,7 +154,85 @@ def extract_model_from_type(type_str: str, brand: str = "") -> str:
     return model if model else first_seg
 
 
-def main():
+def _extract_chunk(pairs):
+    return [extract_model_from_type(t, b) for t, b in pairs]
+
+
+def extract_model_batch(types: pd.Series, brands: pd.Series = None, workers: int = 1) -> pd.Series:
+    """
+    Column version of extract_model_from_type. Each distinct (type, brand)
+    pair is extracted once; with workers > 1 the distinct pairs are split
+    across a process pool.
+    """
+    if brands is None:
+        brands = pd.Series("", index=types.index)
+    brands = brands.fillna("").astype(str)
+
+    keys = pd.MultiIndex.from_arrays([types, brands])
+    codes, uniques = pd.factorize(keys)
+    pairs = list(uniques)
+
+    if workers > 1 and len(pairs) >= PARALLEL_MIN_ROWS:
+        size = -(-len(pairs) // workers)
+        chunks = [pairs[k:k + size] for k in range(0, len(pairs), size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            models = [m for chunk in pool.map(_extract_chunk, chunks) for m in chunk]
+    else:
+        models = _extract_chunk(pairs)
+
+    return pd.Series(np.asarray(models, dtype=object)[codes], index=types.index)
+
+
+def main_bench(repeat: int = 3, workers: int = None):
+    """
+    Time the per-row extractor against the batch versions on real type
+    strings (Dubicars titles split by cleaning.py, plus "model trim" strings
+    from the 34k-row Dubizzle set) and check they all give the same models.
+    Parity with the original implementation is in tests/test_brand_extract.py.
+    """
+    from scraper.preprocessing.cleaning import extract_brand_model_batch
+
+    workers = workers or os.cpu_count() or 1
+
+    dubicars = pd.read_csv(BENCH_DUBICARS_CSV, usecols=["title"])["title"]
+    dubi_brand, dubi_type = extract_brand_model_batch(dubicars)
+    dubizzle = pd.read_csv(BENCH_DUBIZZLE_CSV, usecols=["brand", "model", "trim"])
+    dubizzle_type = (
+        dubizzle["model"].fillna("").astype(str) + " " + dubizzle["trim"].fillna("").astype(str)
+    )
+    dubizzle_brand = dubizzle["brand"].fillna("").astype(str)
+
+    variants = [
+        ("compiled apply", lambda t, b: pd.Series(
+            [extract_model_from_type(x, y) for x, y in zip(t, b)], index=t.index)),
+        ("compiled batch", lambda t, b: extract_model_batch(t, b, workers=1)),
+        (f"batch x{workers}", lambda t, b: extract_model_batch(t, b, workers=workers)),
+    ]
+
+    for name, types, brands in [
+        ("dubicars", dubi_type, dubi_brand.fillna("")),
+        ("dubizzle", dubizzle_type, dubizzle_brand),
+    ]:
+        print(f"[+] {name}: {len(types):,} type strings, {types.nunique():,} distinct")
+        models = {}
+        for label, fn in variants:
+            best = float("inf")
+            for _ in range(repeat):
+                classify_token.cache_clear()
+                start = time.perf_counter()
+                models[label] = fn(types, brands)
+                best = min(best, time.perf_counter() - start)
+            print(f"    {label:<16} {best * 1000:7.1f} ms  {len(types) / best:>11,.0f} rows/s")
+
+        baseline = models["compiled apply"]
+        for label in list(models)[1:]:
+            mismatches = (models[label] != baseline).sum()
+            if mismatches:
+                raise AssertionError(f"{label}: {mismatches} models differ from the per-row extractor")
+        print("    parity: all variants match the per-row extractor")
+
+
+def main(workers: int = None):
     print(f"[+] Reading: {INPUT_CSV.resolve()}")
     df = pd.read_csv(INPUT_CSV)
     print(f"[+] Rows before filtering: {len(df)}")
@@ -122,9 +243,9 @@ def main():
         )
 
     # Build 'model' using both 'type' and 'brand'
-    df["model"] = df.apply(
-        lambda row: extract_model_from_type(row["type"], brand=row.get("brand", "")),
-        axis=1,
+    df["model"] = extract_model_batch(
+        df["type"], df["brand"] if "brand" in df.columns else None,
+        workers=workers or os.cpu_count() or 1,
     )
 
     # Quick sanity check
@@ -150,4 +271,15 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Extract model names from the Dubicars 'type' column.")
+    parser.add_argument(
+        "mode", nargs="?", choices=["extract", "bench"], default="extract",
+        help="'extract' processes INPUT_CSV; 'bench' checks parity and times the extractor",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="processes for the batch extractor")
+    args = parser.parse_args()
+
+    if args.mode == "bench":
+        main_bench(workers=args.workers)
+    else:
+        main(workers=args.workers)
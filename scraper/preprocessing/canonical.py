@@ -0,0 +1,311 @@
+import argparse
+import re
+import time
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from scraper.preprocessing.cleaning import BRAND_INDEX
+from scraper.preprocessing.validate import output_paths
+
+# ---- Paths -------------------------------------------------------------
+
+# Model spellings that were matched by similarity and reviewed by hand;
+# tracked in git like brands.csv
+ALIASES_CSV = Path("data/model_aliases.csv")
+
+# Generated id tables
+OUTPUT_DIR = Path("data/processed/canonical")
+MAKES_CSV = OUTPUT_DIR / "makes.csv"
+MODELS_CSV = OUTPUT_DIR / "models.csv"
+TRIMS_CSV = OUTPUT_DIR / "trims.csv"
+
+# Where make/model/trim spellings are collected from: path, make, model,
+# trim (or None) and a count column (or None for one per row). The scraped
+# listings are read after validate.py, without the quarantined rows.
+SOURCES = {
+    "dubicars": (output_paths("dubicars")[0], "make_detail", "model_detail", None, None),
+    "dubizzle": (output_paths("dubizzle")[0], "brand", "model", "trim", None),
+    "dubizzle_training": (Path("ai_training/datasets/dubizzle_cars_raw_price.csv"), "brand", "model", "trim", None),
+    "kaggle": (Path("data/processed/dubi/model_counts_kaggle.csv"), "Make", "Model", None, "count"),
+}
+
+# ---- Matching ----------------------------------------------------------
+
+# Two model keys of one make at least this similar are proposed as the same
+# model in ALIASES_CSV, for review
+FUZZY_MIN_RATIO = 0.85
+APPROVED = {"y", "yes", "true", "1"}
+
+UNKNOWN_ID = -1
+
+KEY_RE = re.compile(r"[^a-z0-9]+")
+DIGITS_RE = re.compile(r"\d+")
+
+
+def key(value) -> str:
+    """Spelling-insensitive key: 'S-Class' / 's class' / 'SClass' -> 'sclass'."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return KEY_RE.sub("", str(value).lower())
+
+
+def make_key(value) -> str:
+    """Brand slug for a raw make ('Mercedes Benz', 'mercedes-benz' -> 'mercedes-benz')."""
+    raw = "" if value is None or (isinstance(value, float) and np.isnan(value)) else str(value).strip()
+    slug, end = BRAND_INDEX.match(raw)
+    # only when the whole make is a known brand ("Mitsubishi Fuso" stays its own make)
+    if slug is not None and not raw[end:].strip(" -"):
+        return slug
+    return "-".join(KEY_RE.split(raw.lower())).strip("-")
+
+
+# ---- Building ----------------------------------------------------------
+
+def collect_spellings(sources: Dict[str, tuple] = SOURCES) -> pd.DataFrame:
+    """(source, make, model, trim, count) for every distinct spelling in the sources that exist."""
+    frames = []
+    for name, (path, make_col, model_col, trim_col, count_col) in sources.items():
+        if not Path(path).exists():
+            print(f"    {name}: {path} not found, skipped")
+            continue
+        cols = [c for c in (make_col, model_col, trim_col, count_col) if c]
+        df = pd.read_csv(path, usecols=cols, dtype=str, low_memory=False)
+        df = pd.DataFrame({
+            "make": df[make_col],
+            "model": df[model_col],
+            "trim": df[trim_col] if trim_col else None,
+            "count": pd.to_numeric(df[count_col]) if count_col else 1,
+        })
+        grouped = df.groupby(["make", "model", "trim"], dropna=False)["count"].sum().reset_index()
+        grouped.insert(0, "source", name)
+        frames.append(grouped)
+        print(f"    {name}: {len(grouped):,} make/model/trim spellings from {path}")
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["source", "make", "model", "trim", "count"]
+    )
+
+
+def load_aliases(path: Path = ALIASES_CSV) -> pd.DataFrame:
+    if Path(path).exists():
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+    return pd.DataFrame(columns=["make", "alias", "canonical", "score", "approved"])
+
+
+def fuzzy_candidates(model_counts: Dict[str, Counter], reviewed: set) -> List[dict]:
+    """
+    Pairs of model keys within a make that look like one model spelled two
+    ways ('landcruiser' / 'landcuiser'). The less common key is the alias.
+    Keys with different numbers ('x5' / 'x6') or a swapped letter
+    ('esseries' / 'gsseries') name different models and are never proposed;
+    nor are pairs already reviewed.
+    """
+    rows = []
+    for make, counts in model_counts.items():
+        keys = sorted(counts, key=lambda k: (-counts[k], k))
+        for i, a in enumerate(keys):
+            for b in keys[i + 1:]:
+                if (make, b, a) in reviewed or min(len(a), len(b)) < 3:
+                    continue
+                if DIGITS_RE.findall(a) != DIGITS_RE.findall(b):
+                    continue
+                sm = SequenceMatcher(None, a, b)
+                if sm.real_quick_ratio() < FUZZY_MIN_RATIO or sm.quick_ratio() < FUZZY_MIN_RATIO:
+                    continue
+                score = sm.ratio()
+                if score >= FUZZY_MIN_RATIO and all(op != "replace" for op, *_ in sm.get_opcodes()):
+                    rows.append({"make": make, "alias": b, "canonical": a, "score": f"{score:.3f}", "approved": ""})
+    return rows
+
+
+def _assign_ids(keys: Iterable, previous: Dict) -> Dict:
+    """Keep the id of every key seen in an earlier build; new keys get the next free ids."""
+    ids = dict(previous)
+    next_id = max(ids.values(), default=-1) + 1
+    for k in sorted(set(keys) - set(ids)):
+        ids[k] = next_id
+        next_id += 1
+    return ids
+
+
+def _previous(path: Path, key_cols: List[str], id_col: str) -> Dict:
+    if not Path(path).exists():
+        return {}
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return {tuple(r[c] for c in key_cols) if len(key_cols) > 1 else r[key_cols[0]]: int(r[id_col])
+            for r in df.to_dict("records")}
+
+
+def _display_names(counter: Dict[tuple, Counter]) -> Dict[tuple, str]:
+    """Most common raw spelling of each key."""
+    return {k: c.most_common(1)[0][0] for k, c in counter.items()}
+
+
+def build(sources: Dict[str, tuple] = SOURCES, aliases_csv: Path = ALIASES_CSV, output_dir: Path = OUTPUT_DIR):
+    """
+    Collect spellings from every source, fold them by key and reviewed
+    alias, and write makes/models/trims id tables. New similarity matches
+    are appended to `aliases_csv` with an empty `approved` column; they only
+    take effect once marked approved.
+    """
+    start = time.perf_counter()
+    print("[+] Collecting make/model/trim spellings")
+    spellings = collect_spellings(sources)
+    spellings["make_key"] = spellings["make"].map(make_key)
+    spellings["model_key"] = spellings["model"].map(key)
+    spellings["trim_key"] = spellings["trim"].map(key)
+    spellings = spellings[(spellings["make_key"] != "") & (spellings["model_key"] != "")]
+
+    # Reviewed similarity matches
+    aliases = load_aliases(aliases_csv)
+    approved = {
+        (r["make"], r["alias"]): r["canonical"]
+        for r in aliases.to_dict("records") if r["approved"].strip().lower() in APPROVED
+    }
+    model_counts: Dict[str, Counter] = defaultdict(Counter)
+    for r in spellings[["make_key", "model_key", "count"]].itertuples(index=False):
+        model_counts[r.make_key][r.model_key] += int(r.count)
+
+    reviewed = {(r["make"], r["alias"], r["canonical"]) for r in aliases.to_dict("records")}
+    new = fuzzy_candidates(model_counts, reviewed)
+    if new:
+        aliases = pd.concat([aliases, pd.DataFrame(new)], ignore_index=True)
+        aliases_csv.parent.mkdir(parents=True, exist_ok=True)
+        aliases.sort_values(["make", "canonical", "alias"]).to_csv(aliases_csv, index=False)
+    pending = int((aliases["approved"].str.strip() == "").sum())
+
+    spellings["model_key"] = [
+        approved.get((m, k), k) for m, k in zip(spellings["make_key"], spellings["model_key"])
+    ]
+
+    # Display name per key = most common raw spelling
+    make_names, model_names, trim_names = defaultdict(Counter), defaultdict(Counter), defaultdict(Counter)
+    for r in spellings.itertuples(index=False):
+        make_names[r.make_key][str(r.make).strip()] += int(r.count)
+        model_names[(r.make_key, r.model_key)][str(r.model).strip()] += int(r.count)
+        if r.trim_key:
+            trim_names[(r.make_key, r.model_key, r.trim_key)][str(r.trim).strip()] += int(r.count)
+
+    output_dir = Path(output_dir)
+    make_ids = _assign_ids(make_names, _previous(output_dir / MAKES_CSV.name, ["make_key"], "make_id"))
+    model_ids = _assign_ids(
+        model_names, _previous(output_dir / MODELS_CSV.name, ["make_key", "model_key"], "model_id")
+    )
+    trim_ids = _assign_ids(
+        trim_names, _previous(output_dir / TRIMS_CSV.name, ["make_key", "model_key", "trim_key"], "trim_id")
+    )
+    make_display, model_display, trim_display = (
+        _display_names(make_names), _display_names(model_names), _display_names(trim_names)
+    )
+
+    makes = pd.DataFrame(
+        [(i, k, make_display.get(k, k)) for k, i in make_ids.items()],
+        columns=["make_id", "make_key", "make"],
+    )
+    models = pd.DataFrame(
+        [(i, make_ids[m], m, k, model_display.get((m, k), k)) for (m, k), i in model_ids.items() if m in make_ids],
+        columns=["model_id", "make_id", "make_key", "model_key", "model"],
+    )
+    trims = pd.DataFrame(
+        [(i, model_ids[(m, k)], m, k, t, trim_display.get((m, k, t), t))
+         for (m, k, t), i in trim_ids.items() if (m, k) in model_ids],
+        columns=["trim_id", "model_id", "make_key", "model_key", "trim_key", "trim"],
+    )
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    makes.sort_values("make_id").to_csv(output_dir / MAKES_CSV.name, index=False)
+    models.sort_values("model_id").to_csv(output_dir / MODELS_CSV.name, index=False)
+    trims.sort_values("trim_id").to_csv(output_dir / TRIMS_CSV.name, index=False)
+
+    print(f"[+] {len(makes):,} makes, {len(models):,} models, {len(trims):,} trims → {output_dir}")
+    print(f"[+] {len(approved):,} reviewed model aliases applied, {len(new):,} new candidates, "
+          f"{pending:,} awaiting review in {aliases_csv} ({time.perf_counter() - start:.1f}s)")
+
+
+# ---- Lookup ------------------------------------------------------------
+
+class Canonicalizer:
+    """
+    Resolves raw (make, model, trim) to integer (make_id, model_id, trim_id)
+    with hash lookups on the spelling keys. Unknown values get UNKNOWN_ID.
+    """
+
+    def __init__(self, output_dir: Path = OUTPUT_DIR, aliases_csv: Path = ALIASES_CSV):
+        output_dir = Path(output_dir)
+        makes = pd.read_csv(output_dir / MAKES_CSV.name, dtype=str, keep_default_na=False)
+        models = pd.read_csv(output_dir / MODELS_CSV.name, dtype=str, keep_default_na=False)
+        trims = pd.read_csv(output_dir / TRIMS_CSV.name, dtype=str, keep_default_na=False)
+
+        self.make_ids: Dict[str, int] = dict(zip(makes["make_key"], makes["make_id"].astype(int)))
+        self.model_ids: Dict[Tuple[str, str], int] = dict(
+            zip(zip(models["make_key"], models["model_key"]), models["model_id"].astype(int))
+        )
+        self.trim_ids: Dict[Tuple[int, str], int] = dict(
+            zip(zip(trims["model_id"].astype(int), trims["trim_key"]), trims["trim_id"].astype(int))
+        )
+        aliases = load_aliases(aliases_csv)
+        self.aliases: Dict[Tuple[str, str], str] = {
+            (r["make"], r["alias"]): r["canonical"]
+            for r in aliases.to_dict("records") if r["approved"].strip().lower() in APPROVED
+        }
+        self.names = {
+            "make": dict(zip(makes["make_id"].astype(int), makes["make"])),
+            "model": dict(zip(models["model_id"].astype(int), models["model"])),
+            "trim": dict(zip(trims["trim_id"].astype(int), trims["trim"])),
+        }
+
+    def resolve(self, make, model=None, trim=None) -> Tuple[int, int, int]:
+        mk = make_key(make)
+        make_id = self.make_ids.get(mk, UNKNOWN_ID)
+        model_k = key(model)
+        model_id = self.model_ids.get((mk, self.aliases.get((mk, model_k), model_k)), UNKNOWN_ID)
+        trim_id = self.trim_ids.get((model_id, key(trim)), UNKNOWN_ID) if model_id != UNKNOWN_ID else UNKNOWN_ID
+        return make_id, model_id, trim_id
+
+    def resolve_frame(self, make: pd.Series, model: pd.Series, trim: Optional[pd.Series] = None) -> pd.DataFrame:
+        """
+        Column version of resolve(): make_id / model_id / trim_id columns.
+        Each distinct (make, model, trim) is resolved once.
+        """
+        triples = pd.DataFrame({
+            "make": make.to_numpy(dtype=object),
+            "model": model.to_numpy(dtype=object),
+            "trim": trim.to_numpy(dtype=object) if trim is not None else None,
+        })
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(triples.astype("string").fillna("")))
+        resolved = np.array([self.resolve(*u) for u in uniques], dtype=np.int64).reshape(-1, 3)
+        ids = resolved[codes]
+        return pd.DataFrame(ids, columns=["make_id", "model_id", "trim_id"], index=make.index)
+
+
+def add_canonical_ids(df: pd.DataFrame, make_col: str, model_col: str, trim_col: Optional[str] = None,
+                      canon: Optional[Canonicalizer] = None) -> pd.DataFrame:
+    """df with make_id / model_id / trim_id columns added."""
+    canon = canon or Canonicalizer()
+    ids = canon.resolve_frame(df[make_col], df[model_col], df[trim_col] if trim_col else None)
+    return pd.concat([df, ids], axis=1)
+
+
+def main():
+    build()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Canonical make/model/trim ids from every listing source.")
+    parser.add_argument("mode", choices=["build", "resolve"], nargs="?", default="build",
+                        help="'build' the id tables; 'resolve' one make [model [trim]]")
+    parser.add_argument("values", nargs="*", help="resolve: make [model [trim]]")
+    args = parser.parse_args()
+
+    if args.mode == "build":
+        build()
+    else:
+        canon = Canonicalizer()
+        make_id, model_id, trim_id = canon.resolve(*(args.values + [None] * 3)[:3])
+        print(f"make_id={make_id} ({canon.names['make'].get(make_id)}), "
+              f"model_id={model_id} ({canon.names['model'].get(model_id)}), "
+              f"trim_id={trim_id} ({canon.names['trim'].get(trim_id)})")
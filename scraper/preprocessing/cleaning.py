@@ -1,3 +1,6 @@
+import argparse
+import re
+import time
 import pandas as pd
 from pathlib import Path
 
@@ -5,6 +8,10 @@ from pathlib import Path
 RAW_CSV   = Path("data/raw/dubicars_partial_320_pages.csv")
 CLEAN_CSV = Path("data/processed/dubicars_cars_clean.csv")
 
+# Benchmark inputs
+BENCH_DUBICARS_CSV = Path("data/processed/dubi/extended_dubi_listings.csv")
+BENCH_DUBIZZLE_CSV = Path("ai_training/datasets/dubizzle_cars_raw_price.csv")
+
 # ---- Brand list ----
 BRANDS = [
     "abarth", "acura", "aito", "ai-damani", "alfa-romeo", "ariel", "ashok-leyland",
@@ -42,8 +49,66 @@ BRANDS = [
 ]
 
 
-# Sort by word count (descending) so multi-word brands match first
-BRANDS = sorted(BRANDS, key=lambda b: len(b.split()), reverse=True)
+# Extra spellings that should resolve to a canonical brand slug
+BRAND_ALIASES = {
+    "mercedes": "mercedes-benz",
+    "vw": "volkswagen",
+    "chevy": "chevrolet",
+}
+
+# Tokens are split on whitespace *and* hyphens, so "Land Rover", "land-rover"
+# and "LAND - ROVER" all normalise to ("land", "rover").
+TOKEN_RE = re.compile(r"[^\s\-]+")
+
+
+class BrandIndex:
+    """
+    Prefix trie over normalised brand tokens with longest-match semantics,
+    e.g. "Mercedes-Maybach S 680" -> "mercedes-maybach" (not "mercedes-benz"),
+    "BMW Alpina B7" -> "bmw-alpina" (not "bmw").
+
+    A lookup walks at most a few tokens of the title instead of trying every
+    brand in turn.
+    """
+
+    def __init__(self, brands, aliases=None):
+        self.trie = {}
+
+        names = {b: b for b in brands}
+        names.update(aliases or {})
+
+        for name, slug in names.items():
+            node = self.trie
+            for tok in TOKEN_RE.findall(name.lower()):
+                node = node.setdefault(tok, {})
+            node[None] = slug  # terminal marker
+
+    def match(self, title: str):
+        """
+        Return (brand_slug, end_offset) for the longest brand prefix of title,
+        or (None, 0) if no brand matches at a token boundary.
+        """
+        node = self.trie
+        best, best_end = None, 0
+        for m in TOKEN_RE.finditer(title.lower()):
+            node = node.get(m.group())
+            if node is None:
+                break
+            if None in node:
+                best, best_end = node[None], m.end()
+        return best, best_end
+
+
+BRAND_INDEX = BrandIndex(BRANDS, BRAND_ALIASES)
+
+
+def _fallback_split(t: str):
+    # No known brand: first word is "brand", rest is type
+    parts = t.split()
+    if not parts:
+        return "", ""
+    first = parts[0]  # keep original casing of first word
+    return first, t[len(first):].strip(" -|")
 
 
 def extract_brand_model(title: str):
@@ -54,25 +119,30 @@ def extract_brand_model(title: str):
       - type_text = everything after the brand (model/variant/etc.)
     """
     t = (title or "").strip()
-    t_low = t.lower()
 
-    # 1) Try known brands as prefix
-    for b in BRANDS:
-        b_low = b.lower()
-        if t_low.startswith(b_low):
-            brand = b
-            type_text = t[len(b):].strip(" -|")
-            return brand, type_text
+    # 1) Longest known brand at the start of the title
+    brand, end = BRAND_INDEX.match(t)
+    if brand is not None:
+        return brand, t[end:].strip(" -|")
 
     # 2) Fallback: first word is "brand", rest is type
-    parts = t.split()
-    if not parts:
-        return "", ""
+    return _fallback_split(t)
 
-    first = parts[0]
-    brand = first  # keep original casing of first word
-    type_text = t[len(first):].strip(" -|")
 
+def extract_brand_model_batch(titles: pd.Series):
+    """
+    Column version of extract_brand_model: returns (brand, type) Series.
+    Each distinct title is matched once and the result mapped back, so
+    re-posted listings with identical titles cost nothing extra.
+    """
+    codes, uniques = pd.factorize(titles.fillna("").astype(str))
+    if len(uniques) == 0:
+        empty = pd.Series(index=titles.index, dtype="object")
+        return empty, empty.copy()
+
+    brands, types = zip(*map(extract_brand_model, uniques))
+    brand = pd.Series(pd.array(brands, dtype="object")[codes], index=titles.index)
+    type_text = pd.Series(pd.array(types, dtype="object")[codes], index=titles.index)
     return brand, type_text
 
 
@@ -82,7 +152,7 @@ def main():
     print(f"[+] Raw rows: {len(df)}")
 
     # Add brand + type columns (no dropping of any rows)
-    df["brand"], df["type"] = zip(*df["title"].apply(extract_brand_model))
+    df["brand"], df["type"] = extract_brand_model_batch(df["title"])
 
     # Quick sanity check preview
     print(df[["title", "brand", "type"]].head(15))
@@ -96,5 +166,60 @@ def main():
     print(f"[+] Final row count: {len(df)}")
 
 
+def _extract_brand_model_linear(title: str):
+    # Previous implementation (startswith against every brand), kept for the benchmark
+    t = (title or "").strip()
+    t_low = t.lower()
+    for b in BRANDS:
+        if t_low.startswith(b):
+            return b, t[len(b):].strip(" -|")
+    return _fallback_split(t)
+
+
+def main_bench(repeat: int = 3):
+    """
+    Time the old linear scan, the trie per row and the batch version on real
+    titles: the Dubicars listings plus synthetic "brand model trim" titles
+    built from the 34k-row Dubizzle set.
+    """
+    dubicars = pd.read_csv(BENCH_DUBICARS_CSV, usecols=["title"])["title"]
+    dubizzle = pd.read_csv(BENCH_DUBIZZLE_CSV, usecols=["brand", "model", "trim"])
+    dubizzle_titles = (
+        dubizzle["brand"].fillna("") + " " + dubizzle["model"].fillna("").astype(str)
+        + " " + dubizzle["trim"].fillna("").astype(str)
+    )
+
+    variants = [
+        ("linear apply", lambda s: s.apply(_extract_brand_model_linear).str[0]),
+        ("trie apply", lambda s: s.apply(extract_brand_model).str[0]),
+        ("trie batch", lambda s: extract_brand_model_batch(s)[0]),
+    ]
+
+    for name, titles in [("dubicars", dubicars), ("dubizzle", dubizzle_titles)]:
+        print(f"[+] {name}: {len(titles):,} titles")
+        brands = {}
+        for label, fn in variants:
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                brands[label] = fn(titles)
+                best = min(best, time.perf_counter() - start)
+            print(f"    {label:<13} {best * 1000:7.1f} ms  {len(titles) / best:>11,.0f} rows/s")
+
+        changed = (brands["linear apply"] != brands["trie batch"]).sum()
+        print(f"    brand differs from linear scan on {changed:,} titles "
+              f"(hyphen/space variants, longest match, aliases)")
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Split Dubicars titles into brand + type.")
+    parser.add_argument(
+        "mode", nargs="?", choices=["clean", "bench"], default="clean",
+        help="'clean' processes RAW_CSV; 'bench' times the brand matcher",
+    )
+    args = parser.parse_args()
+
+    if args.mode == "bench":
+        main_bench()
+    else:
+        main()
@@ -1,47 +1,176 @@
-import pandas as pd
+import argparse
+import csv
+import os
+import re
+import time
 from pathlib import Path
 
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+
+from scraper.preprocessing.dubizzle_empty_listings import CsvBatchWriter, map_batches
+
 # ---- Paths ----
-INPUT_DIR = Path("/Users/saif/Desktop/University Saif/Y3/dissertion/project/data/raw/dubuzzile")
-OUTPUT_CSV = Path("/Users/saif/Desktop/University Saif/Y3/dissertion/project/data/raw/dubizzle_combined.csv")
-
-def combine_csv_files():
-    print(f"[+] Combining CSV files from part 1 to 72...")
-    
-    all_data = []
-    
-    # Define the column names
-    columns = ['brand', 'model', 'type', 'price_aed', 'year', 'kms', 'url']
-    
-    for i in range(1, 73):  # Part 1 to 72
-        file_path = INPUT_DIR / f"dubizzle_used_cars_part_{i}.csv"
-        
-        if file_path.exists():
-            print(f"[{i}/72] Reading: {file_path.name}")
-            
-            # Read first file with header, rest without header
-            if i == 1:
-                df = pd.read_csv(file_path)
-            else:
-                df = pd.read_csv(file_path, header=None, names=columns)
-            
-            all_data.append(df)
-            print(f"         Rows: {len(df)}")
-        else:
-            print(f"[{i}/72] NOT FOUND: {file_path.name}")
-    
-    print(f"\n[+] Concatenating {len(all_data)} files...")
-    combined_df = pd.concat(all_data, ignore_index=True)
-    
-    print(f"[+] Total rows: {len(combined_df)}")
-    
-    # Save combined CSV
-    OUTPUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-    combined_df.to_csv(OUTPUT_CSV, index=False)
-    print(f"\n[✓] Combined CSV saved to: {OUTPUT_CSV}")
-    print(f"[✓] Final row count: {len(combined_df)}")
-    print(f"[✓] Unique brands: {combined_df['brand'].nunique()}")
+INPUT_DIR = Path("data/raw/dubuzzile")
+PART_GLOB = "dubizzle_used_cars_part_*.csv"
+# .parquet (default) or .csv; scraper.columnar.read_table("...dubizzle_combined.csv")
+# picks up the Parquet file
+OUTPUT_PATH = Path("data/raw/dubizzle_combined.parquet")
+
+WORKERS = os.cpu_count() or 1
+
+# Fixed schema of every part file. Part 1 starts with this header, the
+# others have no header row at all.
+SCHEMA = pa.schema([
+    ("brand", pa.string()),
+    ("model", pa.string()),
+    ("type", pa.string()),
+    ("price_aed", pa.float64()),
+    ("year", pa.int64()),
+    ("kms", pa.float64()),
+    ("url", pa.string()),
+])
+COLUMNS = SCHEMA.names
+
+# Numeric columns are read as text and coerced afterwards (coerce_numbers):
+# Arrow's own conversion fails the whole file on one cell like "401,000"
+NUMERIC = [f.name for f in SCHEMA if not pa.types.is_string(f.type)]
+RAW_SCHEMA = pa.schema([(name, pa.string()) for name in COLUMNS])
+
+# What is stripped before parsing: thousands separators and a unit or currency
+# around the number ("401,000" / "AED 95,000" / "120,000 km")
+NOT_NUMBER_RE = r",|^[A-Za-z\s]+|[A-Za-z\s]+$"
+NUMBER_RE = r"^-?[0-9]+(\.[0-9]+)?$"
+
+PART_RE = re.compile(r"_part_(\d+)\.csv$")
+
+
+def discover_parts(input_dir: Path = INPUT_DIR):
+    """Part files sorted by part number, plus any gaps in the numbering."""
+    parts = sorted(
+        (int(PART_RE.search(p.name).group(1)), p)
+        for p in Path(input_dir).glob(PART_GLOB) if PART_RE.search(p.name)
+    )
+    numbers = [n for n, _ in parts]
+    gaps = sorted(set(range(1, max(numbers) + 1)) - set(numbers)) if numbers else []
+    return parts, gaps
+
+
+def has_header(path: Path) -> bool:
+    """
+    True if the file's first row is the COLUMNS header. A first row that looks
+    like a header (no digits at all) but names other columns is an error.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        first = next(csv.reader(f), [])
+    if [c.strip() for c in first] == COLUMNS:
+        return True
+    if first and not any(ch.isdigit() for ch in "".join(first)):
+        raise ValueError(f"{path.name}: unexpected header {first} (expected {COLUMNS})")
+    return False
+
+
+def coerce_numbers(table: pa.Table):
+    """
+    Cast the NUMERIC text columns to their SCHEMA types. Separators and units
+    are stripped first; a value that still is not a number (e.g. "call for
+    price") becomes null instead of failing the part.
+    Returns (table, {column: [bad values]}).
+    """
+    bad = {}
+    columns = []
+    for field in SCHEMA:
+        col = table.column(field.name)
+        if field.name in NUMERIC:
+            cleaned = pc.replace_substring_regex(col, NOT_NUMBER_RE, "")
+            valid = pc.match_substring_regex(cleaned, NUMBER_RE)
+            given = pc.not_equal(pc.utf8_trim_whitespace(col), "")
+            invalid = pc.and_(given, pc.invert(valid))
+            if pc.any(invalid).as_py():
+                bad[field.name] = col.filter(invalid).to_pylist()
+            numbers = pc.if_else(valid, cleaned, None).cast(pa.float64())
+            col = pc.trunc(numbers).cast(field.type) if pa.types.is_integer(field.type) else numbers
+        columns.append(col)
+    return pa.Table.from_arrays(columns, schema=SCHEMA), bad
+
+
+def read_part(item):
+    """
+    Read one part file with the fixed schema. Returns (number, path, table,
+    header, bad values per column, seconds).
+    """
+    number, path = item
+    start = time.perf_counter()
+    header = has_header(path)
+    try:
+        table = pcsv.read_csv(
+            path,
+            read_options=pcsv.ReadOptions(column_names=COLUMNS, skip_rows=1 if header else 0),
+            convert_options=pcsv.ConvertOptions(column_types=RAW_SCHEMA),
+        )
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"{path.name}: does not match the part schema: {e}") from e
+    table, bad = coerce_numbers(table)
+    return number, path, table, header, bad, time.perf_counter() - start
+
+
+def combine_csv_files(input_dir: Path = INPUT_DIR, output_path: Path = OUTPUT_PATH, workers: int = WORKERS):
+    parts, gaps = discover_parts(input_dir)
+    if not parts:
+        raise FileNotFoundError(f"No {PART_GLOB} files in {input_dir}")
+    print(f"[+] Combining {len(parts)} part files from {input_dir} with {workers} workers...")
+    for n in gaps:
+        print(f"    NOT FOUND: dubizzle_used_cars_part_{n}.csv")
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = output_path.with_name(output_path.name + ".part")
+    if output_path.suffix == ".csv":
+        writer = CsvBatchWriter(part_path, SCHEMA)
+    else:
+        writer = pq.ParquetWriter(part_path, SCHEMA, compression="zstd")
+
+    start = time.perf_counter()
+    total_rows = total_bytes = total_bad = 0
+    brands = set()
+    try:
+        # Files are read concurrently but written in part order, one row group per file
+        results = map_batches(read_part, parts, workers)
+        for i, (number, path, table, header, bad, seconds) in enumerate(results, start=1):
+            if number == 1 and not header:
+                print(f"    [!] {path.name} has no header row")
+            elif number != 1 and header:
+                print(f"    [!] {path.name} has a header row (skipped)")
+            writer.write(table)
+            size = path.stat().st_size
+            total_rows += table.num_rows
+            total_bytes += size
+            brands.update(table.column("brand").drop_null().unique().to_pylist())
+            print(f"[{i}/{len(parts)}] {path.name}: {table.num_rows:,} rows, "
+                  f"{size / 1e6:.1f} MB in {seconds * 1000:.0f} ms")
+            for column, values in bad.items():
+                total_bad += len(values)
+                print(f"    [!] {len(values):,} {column} values are not numbers, left empty: {values[:5]}")
+    finally:
+        writer.close()
+    os.replace(part_path, output_path)
+
+    elapsed = time.perf_counter() - start
+    print(f"\n[✓] Combined dataset saved to: {output_path}")
+    print(f"[✓] Final row count: {total_rows:,} "
+          f"({total_bytes / 1e6:.1f} MB in {elapsed:.1f}s, {total_bytes / 1e6 / max(elapsed, 1e-9):.0f} MB/s)")
+    print(f"[✓] Unique brands: {len(brands)}")
+    if total_bad:
+        print(f"[!] {total_bad:,} non-numeric price_aed / year / kms values left empty")
 
 
 if __name__ == "__main__":
-    combine_csv_files()
+    parser = argparse.ArgumentParser(description="Combine the Dubizzle part CSVs into one dataset.")
+    parser.add_argument("--input-dir", type=Path, default=INPUT_DIR)
+    parser.add_argument("--output", type=Path, default=OUTPUT_PATH, help=".parquet (default) or .csv")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="part files read concurrently")
+    args = parser.parse_args()
+
+    combine_csv_files(args.input_dir, args.output, args.workers)
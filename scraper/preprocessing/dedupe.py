@@ -0,0 +1,526 @@
+import argparse
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scraper.columnar import write_table
+from scraper.preprocessing import canonical
+from scraper.preprocessing.brand_extract import extract_model_batch
+from scraper.preprocessing.cleaning import BRAND_INDEX, extract_brand_model_batch
+from scraper.preprocessing.validate import output_paths
+from scraper.websites.scraper_auto_ae import OUTPUT_PATH as AUTO_AE_CSV
+
+# ---- Paths -------------------------------------------------------------
+
+# Rows that passed validate.py; the quarantined ones are left out
+DUBICARS_CSV = output_paths("dubicars")[0]
+DUBIZZLE_CSV = output_paths("dubizzle")[0]
+
+OUTPUT_PATH = Path("data/processed/listings_dedup.csv")  # .csv or .parquet
+
+# ---- Blocking + matching -----------------------------------------------
+
+KMS_BUCKET = 10_000     # km per bucket
+PRICE_BUCKET = 0.10     # log-width of a price bucket (~10%)
+
+# Neighbouring (kms, price) buckets are probed too, so a pair straddling a
+# bucket edge is still compared. Only "forward" neighbours are listed, which
+# visits every pair of adjacent blocks exactly once.
+NEIGHBOURS = [(0, 1), (1, -1), (1, 0), (1, 1)]
+
+# A block plus its neighbours bigger than this (e.g. one dealer's stock of
+# new cars) is not compared all-pairs: its listings are sorted by mileage and
+# each is only compared with the next WINDOW listings.
+MAX_BLOCK_SIZE = 64
+WINDOW = 16
+
+# How much each field counts towards the pair score; a field only counts
+# when both listings have it.
+WEIGHTS = {
+    "title": 0.30,
+    "trim": 0.20,
+    "color": 0.15,
+    "specs": 0.10,
+    "kms": 0.15,
+    "price": 0.10,
+}
+MATCH_THRESHOLD = 0.80
+
+# Beyond these the pair is rejected outright, whatever the other fields say:
+# dealers list several identical units of one model, so only mileage, price,
+# colour and specs tell them apart.
+KMS_TOLERANCE = 1_000        # km, or ...
+KMS_TOLERANCE_REL = 0.05     # ... this share of the mileage, whichever is larger
+PRICE_TOLERANCE = 0.05       # relative price difference
+
+# Sources whose model column is a listing field, not text cut from the title:
+# their model names (plus canonical.py's models table, once built) are the
+# known models every listing's model is reduced to
+KNOWN_MODEL_SOURCES = {"dubicars", "dubizzle"}
+
+# Unified schema every source is mapped onto
+COLUMNS = [
+    "source", "url", "title", "brand", "model", "year", "kms", "price",
+    "trim", "color", "specs",
+]
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+NUMBER_RE = re.compile(r"[^\d.]")
+COMBINING_RE = re.compile(r"[\u0300-\u036f]")
+MISSING = {"", "n/a", "na", "unknown", "other", "other color", "trim other", "nan", "none", "-"}
+COLOR_ALIASES = {"gray": "grey", "silver grey": "silver", "off white": "white"}
+
+
+# ---- Loading -----------------------------------------------------------
+
+def _clean_text(s: pd.Series) -> pd.Series:
+    # accents folded: "Huracán" and "Huracan" are one model
+    s = s.astype("string").str.normalize("NFKD").str.replace(COMBINING_RE, "", regex=True)
+    s = s.str.strip().str.lower()
+    return s.mask(s.isin(MISSING))
+
+
+def _to_number(s: pd.Series) -> pd.Series:
+    """'164,000 km' / '125,000 AED' / 110000 -> float (NaN when unparseable)."""
+    return pd.to_numeric(s.astype("string").str.replace(NUMBER_RE, "", regex=True), errors="coerce")
+
+
+def _brand_slug(s: pd.Series) -> pd.Series:
+    codes, uniques = pd.factorize(s.fillna("").astype(str))
+    slugs = np.array([BRAND_INDEX.match(b)[0] or b.strip().lower() for b in uniques] + [""], dtype=object)
+    return pd.Series(slugs[codes], index=s.index)
+
+
+def load_dubicars(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, low_memory=False)
+    brand, type_ = extract_brand_model_batch(df["title"])
+    return pd.DataFrame({
+        "source": "dubicars",
+        "url": df["url"],
+        "title": df["title"],
+        "brand": _brand_slug(df["make_detail"]).where(df["make_detail"].notna(), brand),
+        "model": df["model_detail"].where(df["model_detail"].notna(), extract_model_batch(type_, brand)),
+        "year": df["year"],
+        "kms": df["kms_numeric"],
+        "price": df["price"],
+        "trim": None,  # Dubicars has no trim field; it is part of the title
+        "color": df.get("color_detail"),
+        "specs": df.get("specs_detail"),
+    })
+
+
+def load_dubizzle(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, low_memory=False)
+    title = (
+        df["brand"].fillna("") + " " + df["model"].fillna("").astype(str)
+        + " " + df["trim"].fillna("").astype(str)
+    ).str.strip()
+    return pd.DataFrame({
+        "source": "dubizzle",
+        "url": df["url"],
+        "title": title,
+        "brand": _brand_slug(df["brand"]),
+        "model": df["model"],
+        "year": df["year"],
+        "kms": df["kms"],
+        "price": df["price_aed"],
+        "trim": df["trim"],
+        "color": df["exterior_color"],
+        "specs": df["regional_specs"],
+    })
+
+
+def load_auto_ae(path: Path) -> pd.DataFrame:
+    df = pd.read_csv(path, low_memory=False)
+    brand, type_ = extract_brand_model_batch(df["title"])
+    return pd.DataFrame({
+        "source": "auto_ae",
+        "url": df["url"],
+        "title": df["title"],
+        "brand": brand,
+        "model": extract_model_batch(type_, brand),
+        "year": df["year"],
+        "kms": df["kms_raw"],
+        "price": df["price_raw"],
+        "trim": df["trim"].astype("string").str.replace(r"^Trim\s+", "", regex=True),
+        "color": df["color"],
+        "specs": df["specs_detail"],
+    })
+
+
+SOURCES = {
+    "dubicars": (DUBICARS_CSV, load_dubicars),
+    "dubizzle": (DUBIZZLE_CSV, load_dubizzle),
+    "auto_ae": (AUTO_AE_CSV, load_auto_ae),
+}
+
+
+def known_models(df: pd.DataFrame) -> dict:
+    """
+    {brand slug: set of model keys} from canonical.MODELS_CSV (if built) and
+    the model fields of KNOWN_MODEL_SOURCES in `df` (brand already cleaned).
+    """
+    known = defaultdict(set)
+    if canonical.MODELS_CSV.exists():
+        models = pd.read_csv(canonical.MODELS_CSV, usecols=["make_key", "model_key"], dtype=str, keep_default_na=False)
+        for make, model in zip(models["make_key"], models["model_key"]):
+            known[make].add(model)
+    rows = df[df["source"].isin(KNOWN_MODEL_SOURCES) & df["brand"].notna()]
+    for brand, model in zip(rows["brand"], rows["model"]):
+        model_key = canonical.key(model)
+        if model_key:
+            known[brand].add(model_key)
+    return known
+
+
+def base_model(brand: str, model: str, known: dict, aliases: dict) -> str:
+    """
+    Key of the shortest run of leading words of `model` that is a known model
+    of `brand` (after reviewed aliases): auto.ae's "Hilux VIII Facelift 2" ->
+    "hilux", Dubicars' "AMG GT 43" and auto.ae's "AMG GT 63 II" -> "amggt".
+    The whole model's key when no prefix is known. Only used for blocking,
+    so a coarse model just means a few more pairs get scored.
+    """
+    vocab = known.get(brand, ())
+    prefix = ""
+    for word in str(model).split():
+        prefix += canonical.key(word)
+        resolved = aliases.get((brand, prefix), prefix)
+        if resolved in vocab:
+            return resolved
+    return prefix
+
+
+def base_models(df: pd.DataFrame) -> pd.Series:
+    """base_model() for every row; each distinct (brand, model) is resolved once."""
+    known = known_models(df)
+    aliases = canonical.load_aliases()
+    aliases = {
+        (r["make"], r["alias"]): r["canonical"]
+        for r in aliases.to_dict("records") if r["approved"].strip().lower() in canonical.APPROVED
+    }
+    present = df["brand"].notna() & df["model"].notna()
+    pairs = pd.MultiIndex.from_arrays([df["brand"].where(present, ""), df["model"].where(present, "")])
+    codes, uniques = pd.factorize(pairs)
+    keys = np.array([base_model(b, m, known, aliases) if b and m else "" for b, m in uniques], dtype=object)
+    return pd.Series(keys[codes], index=df.index).replace("", pd.NA).astype("string")
+
+
+def normalise(df: pd.DataFrame) -> pd.DataFrame:
+    """Bring the unified columns to comparable forms (numbers, lower-case text, spec region)."""
+    df = df[COLUMNS].reset_index(drop=True)
+    df["brand"] = _clean_text(df["brand"])
+    df["model"] = _clean_text(df["model"])
+    # "S-Class" / "s class" / "SClass" all block together, and so do one
+    # model's listings with and without generation / facelift / variant words
+    df["model"] = base_models(df)
+    df["year"] = _to_number(df["year"])
+    df["kms"] = _to_number(df["kms"])
+    df["price"] = _to_number(df["price"])
+    df["price"] = df["price"].where(df["price"] > 0)
+    df["trim"] = _clean_text(df["trim"])
+    df["color"] = _clean_text(df["color"]).replace(COLOR_ALIASES)
+    # "GCC Specs" / "GCC" / "gcc specs" -> "gcc"
+    df["specs"] = _clean_text(df["specs"]).str.split().str[0]
+    return df
+
+
+# ---- Blocking ----------------------------------------------------------
+
+def block_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """(brand, model, year, kms bucket, price bucket) per listing; -1 for a missing number."""
+    kms_b = (df["kms"] // KMS_BUCKET).fillna(-1).astype(int)
+    price_b = np.floor(np.log(df["price"].to_numpy(dtype=float)) / PRICE_BUCKET)
+    price_b = pd.Series(price_b, index=df.index).fillna(-1).astype(int)
+    return pd.DataFrame({
+        "brand": df["brand"].fillna(""),
+        "model": df["model"].fillna(""),
+        "year": df["year"].fillna(-1).astype(int),
+        "kms_b": kms_b,
+        "price_b": price_b,
+    })
+
+
+def _windowed_pairs(rows, others, kms):
+    """Pairs within `rows` and between `rows` and `others` that are close in mileage order."""
+    merged = sorted([(kms[i], False, i) for i in rows] + [(kms[j], True, j) for j in others])
+    for p, (_, p_other, i) in enumerate(merged):
+        for _, q_other, j in merged[p + 1:p + 1 + WINDOW]:
+            if not (p_other and q_other):
+                yield i, j
+
+
+def candidate_pairs(keys: pd.DataFrame, kms: np.ndarray):
+    """
+    Yield (i, j) row pairs that share a block or sit in adjacent kms/price
+    blocks of the same brand, model and year. Listings without a brand,
+    model or year are never paired.
+    """
+    blocks = defaultdict(list)
+    for i, key in enumerate(keys.itertuples(index=False, name=None)):
+        brand, model, year, _, _ = key
+        if brand and model and year >= 0:
+            blocks[key].append(i)
+
+    for key, rows in blocks.items():
+        brand, model, year, kms_b, price_b = key
+        others = [
+            j for dk, dp in NEIGHBOURS
+            for j in blocks.get((brand, model, year, kms_b + dk, price_b + dp), ())
+        ]
+        if len(rows) + len(others) > MAX_BLOCK_SIZE:
+            yield from _windowed_pairs(rows, others, kms)
+            continue
+
+        for a in range(len(rows)):
+            for b in range(a + 1, len(rows)):
+                yield rows[a], rows[b]
+        for i in rows:
+            for j in others:
+                yield i, j
+
+
+# ---- Scoring -----------------------------------------------------------
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return float("nan")
+    return len(a & b) / len(a | b)
+
+
+def _containment(a: frozenset, b: frozenset) -> float:
+    """Share of the shorter token set found in the other: Dubicars titles add dealer text."""
+    if not a or not b:
+        return float("nan")
+    return len(a & b) / min(len(a), len(b))
+
+
+def _closeness(a: float, b: float, tolerance: float) -> float:
+    """1 for equal values, falling to 0 at `tolerance`; -1 beyond it; NaN if either is missing."""
+    if a != a or b != b:  # NaN
+        return float("nan")
+    diff = abs(a - b)
+    return -1.0 if diff > tolerance else 1.0 - diff / tolerance
+
+
+def score_pair(rec_i: tuple, rec_j: tuple) -> float:
+    """
+    Weighted similarity of two listings in [0, 1] over the fields both have,
+    or 0 when they disagree on colour, specs, mileage or price. Unless both
+    have a real mileage, only priced listings on two different sites match.
+    Records are (source, title_tokens, trim_tokens, color, specs, kms, price).
+    """
+    src_i, ti, tri, ci, si, ki, pi = rec_i
+    src_j, tj, trj, cj, sj, kj, pj = rec_j
+
+    if (ci and cj and ci != cj) or (si and sj and si != sj):
+        return 0.0
+    # New cars (a few km at most) are told apart by nothing but price, and a
+    # dealer lists identical units side by side: a site's own listings of them
+    # are separate cars, and across sites both need a price to be compared
+    if not (ki > KMS_TOLERANCE and kj > KMS_TOLERANCE):
+        if src_i == src_j or not (pi == pi and pj == pj):
+            return 0.0
+    kms = _closeness(ki, kj, max(KMS_TOLERANCE, KMS_TOLERANCE_REL * max(ki, kj)))
+    price = _closeness(pi, pj, PRICE_TOLERANCE * max(pi, pj))
+    if kms < 0 or price < 0:
+        return 0.0
+
+    parts = {
+        "title": _containment(ti, tj),
+        "trim": _jaccard(tri, trj),
+        "color": 1.0 if ci and cj else float("nan"),
+        "specs": 1.0 if si and sj else float("nan"),
+        "kms": kms,
+        "price": price,
+    }
+    total = weight = 0.0
+    for field, value in parts.items():
+        if value == value:
+            total += WEIGHTS[field] * value
+            weight += WEIGHTS[field]
+    return total / weight if weight else 0.0
+
+
+def _tokens(s: pd.Series):
+    s = s.str.normalize("NFKD").str.replace(COMBINING_RE, "", regex=True).str.lower()
+    return [frozenset(WORD_RE.findall(v)) if isinstance(v, str) else frozenset() for v in s]
+
+
+# ---- Clustering --------------------------------------------------------
+
+class UnionFind:
+    def __init__(self, n: int):
+        self.parent = np.arange(n)
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:  # path compression
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i: int, j: int) -> None:
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+class Clusters(UnionFind):
+    """
+    UnionFind that keeps each cluster's mileage and price range, its
+    colour/specs and the sites its new cars (no real mileage) come from, so a
+    merge is only made when every member of the merged cluster is within
+    tolerance of every other (complete linkage): A~B and B~C no longer pull
+    in a C that is too far from A, or a second new car from A's site.
+    """
+
+    def __init__(self, kms: np.ndarray, price: np.ndarray, color: list, specs: list, source: list):
+        super().__init__(len(kms))
+        self.kms_lo, self.kms_hi = kms.copy(), kms.copy()
+        self.price_lo, self.price_hi = price.copy(), price.copy()
+        self.color, self.specs = list(color), list(specs)
+        self.new_sources = [
+            frozenset() if k > KMS_TOLERANCE else frozenset([src]) for k, src in zip(kms, source)
+        ]
+
+    def compatible(self, i: int, j: int) -> bool:
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return True
+        for values in (self.color, self.specs):
+            if values[ri] and values[rj] and values[ri] != values[rj]:
+                return False
+        if self.new_sources[ri] & self.new_sources[rj]:
+            return False
+        # The widest pair is (lowest, highest); NaN ranges (no values) pass
+        kms_lo = np.fmin(self.kms_lo[ri], self.kms_lo[rj])
+        kms_hi = np.fmax(self.kms_hi[ri], self.kms_hi[rj])
+        if kms_hi - kms_lo > max(KMS_TOLERANCE, KMS_TOLERANCE_REL * kms_hi):
+            return False
+        price_lo = np.fmin(self.price_lo[ri], self.price_lo[rj])
+        price_hi = np.fmax(self.price_hi[ri], self.price_hi[rj])
+        return not price_hi - price_lo > PRICE_TOLERANCE * price_hi
+
+    def union(self, i: int, j: int) -> None:
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return
+        root, other = min(ri, rj), max(ri, rj)
+        self.parent[other] = root
+        self.kms_lo[root] = np.fmin(self.kms_lo[root], self.kms_lo[other])
+        self.kms_hi[root] = np.fmax(self.kms_hi[root], self.kms_hi[other])
+        self.price_lo[root] = np.fmin(self.price_lo[root], self.price_lo[other])
+        self.price_hi[root] = np.fmax(self.price_hi[root], self.price_hi[other])
+        self.color[root] = self.color[root] or self.color[other]
+        self.specs[root] = self.specs[root] or self.specs[other]
+        self.new_sources[root] = self.new_sources[root] | self.new_sources[other]
+
+
+def dedupe(df: pd.DataFrame, threshold: float = MATCH_THRESHOLD) -> pd.DataFrame:
+    """
+    Add `cluster_id` (the row number of the cluster's first listing) and
+    `cluster_size` to a frame in the unified schema. Rows with the same URL
+    always share a cluster; other pairs that share a block and score at
+    least `threshold` are merged best-first, each merge only if the whole
+    merged cluster stays within the mileage/price/colour/specs tolerances
+    and holds at most one new car per site.
+    """
+    df = normalise(df)
+    n = len(df)
+    kms = df["kms"].to_numpy(dtype=float)
+    price = df["price"].to_numpy(dtype=float)
+    color = df["color"].fillna("").tolist()
+    specs = df["specs"].fillna("").tolist()
+    uf = Clusters(kms, price, color, specs, df["source"].tolist())
+
+    # Re-scrapes of the same listing
+    for rows in df.groupby("url", sort=False).indices.values():
+        for r in rows[1:]:
+            uf.union(rows[0], r)
+
+    records = list(zip(
+        df["source"].tolist(),
+        _tokens(df["title"].astype("string")),
+        _tokens(df["trim"]),
+        color,
+        specs,
+        kms,
+        price,
+    ))
+
+    compared = 0
+    matches = []
+    for i, j in candidate_pairs(block_keys(df), df["kms"].fillna(-1).to_numpy()):
+        compared += 1
+        score = score_pair(records[i], records[j])
+        if score >= threshold:
+            matches.append((score, i, j))
+
+    matched = rejected = 0
+    for _, i, j in sorted(matches, key=lambda m: -m[0]):
+        if uf.compatible(i, j):
+            uf.union(i, j)
+            matched += 1
+        else:
+            rejected += 1
+
+    df["cluster_id"] = [uf.find(i) for i in range(n)]
+    df["cluster_size"] = df.groupby("cluster_id")["cluster_id"].transform("size")
+
+    all_pairs = n * (n - 1) // 2
+    print(f"[+] {n:,} listings: compared {compared:,} candidate pairs "
+          f"({compared / max(all_pairs, 1) * 100:.4f}% of all {all_pairs:,}), {matched:,} matches, "
+          f"{rejected:,} rejected by their clusters")
+    return df
+
+
+def main(output_path: Path = OUTPUT_PATH, threshold: float = MATCH_THRESHOLD):
+    frames = []
+    for name, (path, loader) in SOURCES.items():
+        if not Path(path).exists():
+            print(f"[!] {name}: {path} not found, skipping")
+            continue
+        frame = loader(path)
+        print(f"[+] {name}: {len(frame):,} listings from {path}")
+        frames.append(frame)
+    if not frames:
+        raise FileNotFoundError("No source listings found")
+
+    start = time.perf_counter()
+    df = dedupe(pd.concat(frames, ignore_index=True), threshold)
+    elapsed = time.perf_counter() - start
+
+    dupes = df[df["cluster_size"] > 1]
+    print(f"[+] {df['cluster_id'].nunique():,} distinct cars; {len(dupes):,} listings are in "
+          f"{dupes['cluster_id'].nunique():,} duplicate clusters ({elapsed:.1f}s)")
+    cross = dupes.groupby("cluster_id")["source"].nunique()
+    print(f"    {(cross > 1).sum():,} clusters span more than one site")
+
+    output_path = Path(output_path)
+    if output_path.suffix == ".parquet":
+        write_table(df, output_path)
+    else:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(output_path, index=False)
+    print(f"[+] Saved listings with cluster ids -> {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cluster duplicate listings across Dubicars, Dubizzle and auto.ae.")
+    parser.add_argument("--dubicars", type=Path, default=DUBICARS_CSV)
+    parser.add_argument("--dubizzle", type=Path, default=DUBIZZLE_CSV)
+    parser.add_argument("--auto-ae", type=Path, default=AUTO_AE_CSV)
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD, help="minimum pair score to merge")
+    parser.add_argument("--output", type=Path, default=OUTPUT_PATH, help=".csv or .parquet")
+    args = parser.parse_args()
+
+    SOURCES["dubicars"] = (args.dubicars, load_dubicars)
+    SOURCES["dubizzle"] = (args.dubizzle, load_dubizzle)
+    SOURCES["auto_ae"] = (args.auto_ae, load_auto_ae)
+    main(args.output, args.threshold)
@@ -1,11 +1,16 @@
+import argparse
 import time
 from pathlib import Path
 from typing import Dict, List
 
 import pandas as pd
-import requests
 from bs4 import BeautifulSoup, Tag
 
+from scraper.html_archive import reparse
+from scraper.http_client import HttpClient
+from scraper.preprocessing.cleaning import extract_brand_model
+from scraper.websites.scraper_dubicars import DELTA_CSV
+
 # ---- Paths -------------------------------------------------------------
 
 INPUT_CSV = Path("data/processed/dubicars_cars_clean.csv")
@@ -162,18 +167,19 @@ def parse_listing_details(html: str) -> Dict[str, str]:
     return data
 
 
-def fetch_listing(url: str) -> Dict[str, str]:
+def fetch_listing(url: str, client: HttpClient) -> Dict[str, str]:
     """
     Download one listing and return extracted specs. Returns {} on failure.
+    The client archives the raw HTML and sends conditional requests, so an
+    unchanged listing costs a 304.
     """
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
-        resp.raise_for_status()
+        html = client.get(url, kind="dubicars_detail")
     except Exception as e:
         print(f"[!] Error fetching {url}: {e}")
         return {}
 
-    return parse_listing_details(resp.text)
+    return parse_listing_details(html)
 
 
 # ---- Main runner -------------------------------------------------------
@@ -197,6 +203,7 @@ def main():
     
     print(f"[+] Found {total} total rows, processing first {total_to_process} rows")
 
+    client = HttpClient(headers=HEADERS, timeout=REQUEST_TIMEOUT)
     requests_made = 0  # counter for requests in current batch
 
     for idx, row in df_to_process.iterrows():
@@ -212,7 +219,7 @@ def main():
             continue
 
         print(f"[{idx+1}/{total_to_process}] Fetching {url} ...")
-        details = fetch_listing(url)
+        details = fetch_listing(url, client)
         requests_made += 1
 
         if not details:
@@ -236,6 +243,9 @@ def main():
                 time.sleep(PAUSE_AFTER_BATCH)
                 print(f"[▶] Resuming scraping...")
 
+    client.report()
+    client.close()
+
     # final save
     FINAL_CSV.parent.mkdir(parents=True, exist_ok=True)
     df.to_csv(FINAL_CSV, index=False)
@@ -243,5 +253,104 @@ def main():
     print(f"[+] Total requests made: {requests_made}")
 
 
+def main_incremental():
+    """
+    Fetch details only for the new / re-priced listings in DELTA_CSV and merge
+    them into FINAL_CSV, replacing any older row with the same URL.
+    """
+    print(f"[+] Reading delta: {DELTA_CSV.resolve()}")
+    delta = pd.read_csv(DELTA_CSV)
+    if delta.empty:
+        print("[+] Delta is empty, nothing to fetch.")
+        return
+
+    # Same brand/type split cleaning.py applies to the full crawl
+    delta["brand"], delta["type"] = zip(*delta["title"].apply(extract_brand_model))
+
+    for col in KEY_PREFIXES.values():
+        if col not in delta.columns:
+            delta[col] = pd.NA
+
+    client = HttpClient(headers=HEADERS, timeout=REQUEST_TIMEOUT)
+    total = len(delta)
+
+    for i, (idx, row) in enumerate(delta.iterrows(), start=1):
+        url = row.get("url")
+        if not isinstance(url, str) or not url.startswith("http"):
+            print(f"[i] Skipping row {idx} – no valid URL")
+            continue
+
+        print(f"[{i}/{total}] ({row['change']}) Fetching {url} ...")
+        details = fetch_listing(url, client)
+        for col_name, value in details.items():
+            delta.at[idx, col_name] = value
+
+        time.sleep(SLEEP_BETWEEN_REQUESTS)
+
+    client.report()
+    client.close()
+
+    if FINAL_CSV.exists():
+        final = pd.read_csv(FINAL_CSV)
+        final = final[~final["url"].isin(delta["url"])]
+        merged = pd.concat([final, delta.drop(columns=["change", "previous_price"], errors="ignore")],
+                           ignore_index=True)
+    else:
+        merged = delta.drop(columns=["change", "previous_price"], errors="ignore")
+
+    FINAL_CSV.parent.mkdir(parents=True, exist_ok=True)
+    merged.to_csv(FINAL_CSV, index=False)
+    print(f"[+] Merged {total} delta rows → {FINAL_CSV.resolve()} ({len(merged)} rows)")
+
+
+def main_reparse():
+    """
+    Refill every detail column from the HTML archive using the current
+    parse_listing_details, without re-fetching any listing.
+    """
+    print(f"[+] Reading: {INPUT_CSV.resolve()}")
+    df = pd.read_csv(INPUT_CSV)
+
+    if "url" not in df.columns:
+        raise ValueError("Input CSV must contain a 'url' column with listing URLs.")
+
+    for col in KEY_PREFIXES.values():
+        if col not in df.columns:
+            df[col] = pd.NA
+
+    details_by_url = {
+        url: details
+        for url, details in reparse(parse_listing_details, kind="dubicars_detail")
+        if details
+    }
+
+    # Rebuild the detail columns column-wise instead of row-by-row .at writes
+    matched = df["url"].map(details_by_url)
+    has_details = matched.notna()
+    for col in dict.fromkeys(KEY_PREFIXES.values()):
+        parsed = matched[has_details].map(lambda d: d.get(col, pd.NA))
+        df.loc[has_details, col] = parsed
+
+    FINAL_CSV.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(FINAL_CSV, index=False)
+    print(f"[+] Re-parsed details for {int(has_details.sum())}/{len(df)} rows")
+    print(f"[+] Final CSV saved → {FINAL_CSV.resolve()}")
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Enrich Dubicars listings with detail-page specs.")
+    parser.add_argument(
+        "mode", nargs="?", choices=["crawl", "incremental", "reparse"], default="crawl",
+        help=(
+            "'crawl' fetches listing pages; 'incremental' only fetches the rows in the "
+            "search delta; 'reparse' re-runs parse_listing_details over the HTML archive"
+        ),
+    )
+    args = parser.parse_args()
+
+    if args.mode == "reparse":
+        main_reparse()
+    elif args.mode == "incremental":
+        main_incremental()
+    else:
+        main()
@@ -3,9 +3,10 @@ from pathlib import Path
 from typing import Dict, List
 
 import pandas as pd
-import requests
 from bs4 import BeautifulSoup, Tag
 
+from scraper.http_client import HttpClient
+
 # ---- Paths -------------------------------------------------------------
 
 INPUT_CSV = Path("data/processed/dubicars_cars_clean.csv")
@@ -163,18 +164,19 @@ def parse_listing_details(html: str) -> Dict[str, str]:
     return data
 
 
-def fetch_listing(url: str) -> Dict[str, str]:
+def fetch_listing(url: str, client: HttpClient) -> Dict[str, str]:
     """
     Download one listing and return extracted specs. Returns {} on failure.
+    The client archives the raw HTML and sends conditional requests, so an
+    unchanged listing costs a 304.
     """
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
-        resp.raise_for_status()
+        html = client.get(url, kind="dubicars_detail")
     except Exception as e:
         print(f"[!] Error fetching {url}: {e}")
         return {}
 
-    return parse_listing_details(resp.text)
+    return parse_listing_details(html)
 
 
 # ---- Main runner -------------------------------------------------------
@@ -197,6 +199,7 @@ def main():
     
     print(f"[SCRAPER 2] Processing rows {START_ROW} to {START_ROW + MAX_ROWS - 1} ({total_to_process} rows)")
 
+    client = HttpClient(headers=HEADERS, timeout=REQUEST_TIMEOUT)
     requests_made = 0  # counter for requests in current batch
 
     for idx, row in df_to_process.iterrows():
@@ -212,7 +215,7 @@ def main():
             continue
 
         print(f"[SCRAPER 2] [{idx+1}/{START_ROW + total_to_process}] Fetching {url} ...")
-        details = fetch_listing(url)
+        details = fetch_listing(url, client)
         requests_made += 1
 
         if not details:
@@ -236,6 +239,9 @@ def main():
                 time.sleep(PAUSE_AFTER_BATCH)
                 print(f"[SCRAPER 2] [▶] Resuming scraping...")
 
+    client.report()
+    client.close()
+
     # final save
     FINAL_CSV.parent.mkdir(parents=True, exist_ok=True)
     df_to_process.to_csv(FINAL_CSV, index=False)
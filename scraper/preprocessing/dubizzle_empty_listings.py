@@ -0,0 +1,348 @@
+import argparse
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+
+# ---- Config ------------------------------------------------------------
+
+ALL_FIELDS = [
+    "brand","model","type","price_aed","year","kms","url",
+    "trim","horsepower","doors","fuel_type","cylinders",
+    "interior_color","exterior_color","body_type","seating_capacity",
+    "entertainment_and_technology","engine_capacity_cc",
+    "steering_side","regional_specs"
+]
+
+# Missing-fields threshold (out of ~20 columns).
+# Rows with only brand/model/type/price/year/kms/url filled have ~13 missing -> good target.
+MISSING_ALL_THRESHOLD = 12
+
+# Values that count as "not filled in" (compared after strip + lower)
+NULL_LIKE = pa.array(["", "na", "n/a", "none", "null", "-", "--"])
+
+BLOCK_BYTES = 8 << 20  # CSV bytes per batch; memory stays ~this x (2 * workers)
+WORKERS = os.cpu_count() or 1
+
+
+# ---- Batches -----------------------------------------------------------
+
+class SkippedRows:
+    """
+    invalid_row_handler for pyarrow.csv: skips a ragged row (wrong number
+    of columns) instead of failing the whole file, and counts it.
+    """
+
+    def __init__(self, path: Path, show: int = 5):
+        self.path = path
+        self.show = show
+        self.count = 0
+
+    def __call__(self, row) -> str:
+        self.count += 1
+        if self.count <= self.show:
+            print(f"[!] {Path(self.path).name}: skipped a row with {row.actual_columns} columns "
+                  f"(expected {row.expected_columns}): {row.text[:80]!r}")
+        return "skip"
+
+
+def read_batches(
+    path: Path,
+    block_bytes: int = BLOCK_BYTES,
+    skipped: Optional[SkippedRows] = None,
+) -> Iterator[pa.RecordBatch]:
+    """
+    Stream a CSV as Arrow record batches. Every column is read as text,
+    exactly as written ("" stays "", 115000 stays "115000"), so rows are
+    written back out unchanged. Quoted values may span lines; rows with the
+    wrong number of columns are skipped and counted in `skipped`.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        raise ValueError("No header found in CSV (fieldnames is empty).")
+
+    return pcsv.open_csv(
+        path,
+        read_options=pcsv.ReadOptions(block_size=block_bytes),
+        parse_options=pcsv.ParseOptions(
+            newlines_in_values=True,
+            invalid_row_handler=skipped if skipped is not None else SkippedRows(path),
+        ),
+        convert_options=pcsv.ConvertOptions(column_types={c: pa.string() for c in header}),
+    )
+
+
+def map_batches(fn: Callable, batches: Iterable, workers: int = WORKERS) -> Iterator:
+    """
+    fn(batch) for every batch, in order, on a thread pool (Arrow kernels
+    release the GIL). At most 2 * workers batches are in flight, so memory
+    stays bounded however big the file is.
+    """
+    if workers <= 1:
+        yield from map(fn, batches)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(fn, batch))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class CsvBatchWriter:
+    """CSV output written batch by batch; every string value is quoted (Arrow's "needed" style)."""
+
+    def __init__(self, path: Path, schema: pa.Schema):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.rows = 0
+        self._f = open(self.path, "w", newline="", encoding="utf-8")
+        # header through the csv module, so it looks like every other CSV here (unquoted)
+        csv.writer(self._f).writerow(schema.names)
+        self._f.flush()
+        self._writer = pcsv.CSVWriter(
+            self._f.buffer, schema,
+            write_options=pcsv.WriteOptions(include_header=False, quoting_style="needed"),
+        )
+
+    def write(self, batch) -> None:
+        """Append a RecordBatch or Table."""
+        self._writer.write(batch)
+        self.rows += batch.num_rows
+
+    def close(self) -> None:
+        self._writer.close()
+        self._f.close()
+
+
+# ---- Vectorized checks -------------------------------------------------
+
+def normalise(col: pa.Array) -> pa.Array:
+    """Stripped values, with null-like ones ("N/A", "none", "--", ...) blanked to ""."""
+    col = pc.utf8_trim_whitespace(col)
+    return pc.if_else(pc.is_in(pc.utf8_lower(col), value_set=NULL_LIKE), "", col)
+
+
+def missing_counts(batch: pa.RecordBatch) -> np.ndarray:
+    """
+    Number of ALL_FIELDS that are empty or null-like in each row, computed a
+    column at a time over the whole batch. A file with none of ALL_FIELDS
+    gets -1 for every row (treated as empty, like before).
+    """
+    fields = [f for f in ALL_FIELDS if f in batch.schema.names]
+    if not fields:
+        return np.full(batch.num_rows, -1)
+    missing = np.zeros(batch.num_rows, dtype=np.int16)
+    for f in fields:
+        col = pc.utf8_lower(pc.utf8_trim_whitespace(batch.column(f)))
+        missing += pc.is_in(col, value_set=NULL_LIKE).to_numpy(zero_copy_only=False)
+    return missing
+
+
+def empty_mask(missing: np.ndarray) -> np.ndarray:
+    return (missing >= MISSING_ALL_THRESHOLD) | (missing < 0)
+
+
+# ---- Split: empty vs kept listings -------------------------------------
+
+def _split_batch(batch: pa.RecordBatch):
+    missing = missing_counts(batch)
+    empty = empty_mask(missing)
+    mask = pa.array(empty)
+    return batch.filter(mask), batch.filter(pc.invert(mask)), missing[empty]
+
+
+def split_empty_listings(
+    input_csv: Path,
+    out_empty: Path,
+    out_keep: Path,
+    out_report: Optional[Path] = None,
+    block_bytes: int = BLOCK_BYTES,
+    workers: int = WORKERS,
+) -> str:
+    """
+    Stream input_csv in batches and route every row to out_empty (missing
+    >= MISSING_ALL_THRESHOLD of ALL_FIELDS) or out_keep. Returns the report.
+    """
+    if not Path(input_csv).exists():
+        raise FileNotFoundError(f"Input CSV not found: {input_csv}")
+
+    start = time.perf_counter()
+    skipped = SkippedRows(input_csv)
+    reader = read_batches(input_csv, block_bytes, skipped)
+    schema = reader.schema
+    n_fields = sum(f in schema.names for f in ALL_FIELDS)
+    empty_out, keep_out = CsvBatchWriter(out_empty, schema), CsvBatchWriter(out_keep, schema)
+    examples = []
+
+    for empty, kept, missing in map_batches(_split_batch, reader, workers):
+        empty_out.write(empty)
+        keep_out.write(kept)
+        if len(examples) < 10 and empty.num_rows:
+            urls = empty.column("url").to_pylist() if "url" in schema.names else [""] * empty.num_rows
+            for m, url in zip(missing[:10 - len(examples)], urls):
+                m = max(int(m), 0)
+                examples.append((m, n_fields - m, url))
+    empty_out.close()
+    keep_out.close()
+
+    elapsed = time.perf_counter() - start
+    total = empty_out.rows + keep_out.rows
+    report = (
+        f"Input: {input_csv}\n"
+        f"Empty listings CSV: {out_empty}\n"
+        f"Kept listings CSV: {out_keep}\n\n"
+        f"Rule:\n"
+        f"- Mark row as EMPTY if missing >= {MISSING_ALL_THRESHOLD} fields from ALL_FIELDS ({len(ALL_FIELDS)} total)\n\n"
+        f"Counts:\n"
+        f"- Empty rows: {empty_out.rows}\n"
+        f"- Kept rows: {keep_out.rows}\n"
+        f"- Skipped malformed rows: {skipped.count}\n\n"
+        f"Examples (missing_count, non_empty_count, url):\n"
+        + "\n".join([f"- {e}" for e in examples])
+    )
+    if out_report is not None:
+        Path(out_report).write_text(report, encoding="utf-8")
+    print(report)
+    print(f"\n[+] {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s, {workers} workers)")
+    return report
+
+
+# ---- Merge: re-enriched rows back into the main CSV --------------------
+
+def load_reenriched(path: Path, block_bytes: int = BLOCK_BYTES):
+    """
+    Re-enriched rows that are no longer empty, plus their normalised URLs
+    (last one wins for a repeated URL). Returns (table, urls, dropped_count);
+    malformed rows count as dropped.
+    """
+    kept: List[pa.RecordBatch] = []
+    dropped = 0
+    skipped = SkippedRows(path)
+    reader = read_batches(path, block_bytes, skipped)
+    for batch in reader:
+        empty = empty_mask(missing_counts(batch))
+        dropped += int(empty.sum())
+        batch = batch.filter(pa.array(~empty))
+        kept.append(batch.filter(pc.not_equal(normalise(batch.column("url")), "")))
+    table = pa.Table.from_batches(kept, schema=reader.schema)
+    dropped += skipped.count
+
+    urls = normalise(table.column("url").combine_chunks())
+    # keep the last row of each URL: first occurrence in the reversed order
+    rev = np.arange(len(urls))[::-1]
+    _, first = np.unique(urls.take(pa.array(rev)).to_numpy(zero_copy_only=False), return_index=True)
+    last = np.sort(rev[first])
+    return table.take(pa.array(last)), urls.take(pa.array(last)), dropped
+
+
+def _merge_batch(batch: pa.RecordBatch, reenriched: pa.Table, re_urls: pa.Array):
+    # position of each row's URL in the re-enriched table, null when absent
+    idx = pc.index_in(normalise(batch.column("url")), value_set=re_urls)
+    replace = pc.is_valid(idx)
+    empty = empty_mask(missing_counts(batch))
+
+    columns = []
+    for name in batch.schema.names:
+        col = batch.column(name)
+        if name in reenriched.column_names:
+            # take() with a null index yields null; if_else then keeps the original value
+            col = pc.if_else(replace, reenriched.column(name).take(idx).combine_chunks(), col)
+        columns.append(col)
+    merged = pa.RecordBatch.from_arrays(columns, schema=batch.schema)
+
+    replace_np = replace.to_numpy(zero_copy_only=False)
+    keep = replace_np | ~empty
+    return merged.filter(pa.array(keep)), int(replace_np.sum()), int((~replace_np & empty).sum())
+
+
+def merge_reenriched(
+    reenriched_csv: Path,
+    main_csv: Path,
+    output_csv: Path,
+    block_bytes: int = BLOCK_BYTES,
+    workers: int = WORKERS,
+) -> None:
+    """
+    Stream main_csv in batches; rows whose URL was re-enriched are replaced
+    by the re-enriched version, rows that are still empty are dropped, and
+    everything else is written through unchanged, in the original order.
+    Only the (small) re-enriched file is held in memory, as a URL index.
+    """
+    if not Path(reenriched_csv).exists():
+        raise FileNotFoundError(f"Re-enriched CSV not found: {reenriched_csv}")
+    if not Path(main_csv).exists():
+        raise FileNotFoundError(f"Main enriched CSV not found: {main_csv}")
+
+    start = time.perf_counter()
+    print(f"[1/3] Loading re-enriched listings from: {Path(reenriched_csv).name}")
+    reenriched, re_urls, dropped_re = load_reenriched(reenriched_csv, block_bytes)
+    print(f"    ✓ Loaded {reenriched.num_rows} enriched rows")
+    print(f"    ✓ Dropped {dropped_re} still-empty rows")
+
+    print(f"\n[2/3] Streaming main enriched CSV: {Path(main_csv).name} -> {Path(output_csv).name}")
+    skipped = SkippedRows(main_csv)
+    reader = read_batches(main_csv, block_bytes, skipped)
+    out = CsvBatchWriter(output_csv, reader.schema)
+    total_read = updated = dropped_main = 0
+    merge = lambda batch: (batch.num_rows, *_merge_batch(batch, reenriched, re_urls))
+    for n_read, kept, n_updated, n_dropped in map_batches(merge, reader, workers):
+        total_read += n_read
+        updated += n_updated
+        dropped_main += n_dropped
+        out.write(kept)
+    out.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"    ✓ Total rows read from main CSV: {total_read}")
+    print(f"    ✓ Updated rows: {updated}")
+    print(f"    ✓ Dropped still-empty rows from main: {dropped_main}")
+    print(f"    ✓ Skipped malformed rows in main: {skipped.count}")
+
+    print(f"\n[3/3] Summary:")
+    print(f"    • Re-enriched rows loaded: {reenriched.num_rows}")
+    print(f"    • Still-empty rows dropped from re-enriched: {dropped_re}")
+    print(f"    • Listings updated in main CSV: {updated}")
+    print(f"    • Still-empty rows dropped from main CSV: {dropped_main}")
+    print(f"    • Total rows dropped: {dropped_re + dropped_main}")
+    print(f"    • Final output rows: {out.rows}")
+    print(f"    • Output: {output_csv}")
+    print(f"    • {total_read:,} rows in {elapsed:.1f}s ({total_read / max(elapsed, 1e-9):,.0f} rows/s, {workers} workers)")
+    print(f"\n✓ Done!")
+
+
+if __name__ == "__main__":
+    from scraper.preprocessing import dubizzile_empty_listings_extractor as extractor
+    from scraper.preprocessing import update_enriched_from_reenriched as updater
+
+    parser = argparse.ArgumentParser(description="Split out / merge back empty Dubizzle listings in batches.")
+    parser.add_argument(
+        "mode", choices=["split", "merge"],
+        help="'split' separates empty listings for re-enrichment; 'merge' folds the re-enriched rows back in",
+    )
+    parser.add_argument("--block-mb", type=int, default=BLOCK_BYTES >> 20, help="CSV megabytes per batch")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="batches processed concurrently")
+    args = parser.parse_args()
+
+    if args.mode == "split":
+        split_empty_listings(
+            extractor.INPUT_CSV, extractor.OUT_EMPTY, extractor.OUT_KEEP, extractor.OUT_REPORT,
+            block_bytes=args.block_mb << 20, workers=args.workers,
+        )
+    else:
+        merge_reenriched(
+            updater.REENRICHED_CSV, updater.MAIN_ENRICHED_CSV, updater.OUTPUT_CSV,
+            block_bytes=args.block_mb << 20, workers=args.workers,
+        )
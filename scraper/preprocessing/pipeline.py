@@ -0,0 +1,330 @@
+import argparse
+import ast
+import csv
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from scraper.preprocessing import (
+    brand_extract,
+    canonical,
+    cleaning,
+    combine_dubizzle_csvs,
+    dubicars_second_scrape,
+    dubizzile_empty_listings_extractor,
+    update_enriched_from_reenriched,
+    validate,
+)
+
+# ---- Config ------------------------------------------------------------
+
+CACHE_JSON = Path("data/processed/pipeline_cache.json")
+PIPELINE_WORKERS = 4  # independent stages run side by side
+LOCAL_PACKAGES = ("scraper", "ai_training")  # imports from these are part of a stage's code
+
+
+@dataclass
+class Stage:
+    """
+    One preprocessing step: `run` reads `inputs` and writes `outputs`.
+
+    `run` must be a module-level function (it is sent to a worker process)
+    that takes no arguments; the scripts already read their paths from
+    module constants, so the stage just points at those.
+    """
+    name: str
+    run: Callable[[], None]
+    inputs: Sequence[Path]
+    outputs: Sequence[Path]
+    network: bool = False  # fetches live pages, only runs when asked for by name
+
+
+STAGES = [
+    Stage(
+        "dubicars_clean", cleaning.main,
+        inputs=[cleaning.RAW_CSV],
+        outputs=[cleaning.CLEAN_CSV],
+    ),
+    Stage(
+        "dubicars_models", brand_extract.main,
+        inputs=[brand_extract.INPUT_CSV],
+        outputs=[brand_extract.OUTPUT_CSV, brand_extract.MODEL_COUNTS_CSV],
+    ),
+    Stage(
+        "dubicars_enrich", dubicars_second_scrape.main,
+        inputs=[dubicars_second_scrape.INPUT_CSV],
+        outputs=[dubicars_second_scrape.FINAL_CSV],
+        network=True,
+    ),
+    Stage(
+        "dubicars_validate", validate.validate_dubicars,
+        inputs=[validate.PROFILES["dubicars"]["path"], validate.BRANDS_CSV],
+        outputs=list(validate.output_paths("dubicars")),
+    ),
+    Stage(
+        "dubizzle_combine", combine_dubizzle_csvs.combine_csv_files,
+        inputs=[combine_dubizzle_csvs.INPUT_DIR],
+        outputs=[combine_dubizzle_csvs.OUTPUT_PATH],
+    ),
+    Stage(
+        "dubizzle_split_empty", dubizzile_empty_listings_extractor.main,
+        inputs=[dubizzile_empty_listings_extractor.INPUT_CSV],
+        outputs=[
+            dubizzile_empty_listings_extractor.OUT_EMPTY,
+            dubizzile_empty_listings_extractor.OUT_KEEP,
+        ],
+    ),
+    Stage(
+        "dubizzle_update", update_enriched_from_reenriched.main,
+        inputs=[
+            update_enriched_from_reenriched.MAIN_ENRICHED_CSV,
+            update_enriched_from_reenriched.REENRICHED_CSV,
+        ],
+        outputs=[update_enriched_from_reenriched.OUTPUT_CSV],
+    ),
+    Stage(
+        "dubizzle_validate", validate.validate_dubizzle,
+        inputs=[validate.PROFILES["dubizzle"]["path"], validate.BRANDS_CSV],
+        outputs=list(validate.output_paths("dubizzle")),
+    ),
+    Stage(
+        # The alias review file is an output: approving a match there makes the stage stale
+        "canonical_ids", canonical.main,
+        inputs=[path for path, *_ in canonical.SOURCES.values()],
+        outputs=[canonical.MAKES_CSV, canonical.MODELS_CSV, canonical.TRIMS_CSV, canonical.ALIASES_CSV],
+    ),
+]
+
+
+# ---- Hashing -----------------------------------------------------------
+
+def hash_path(path: Path) -> Optional[str]:
+    """sha256 of a file, or of every file under a directory (names + bytes). None if missing."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    h = hashlib.sha256()
+    for f in files:
+        h.update(str(f.relative_to(path) if path.is_dir() else f.name).encode())
+        with open(f, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def _local_imports(path: Path) -> List[str]:
+    """Names of the LOCAL_PACKAGES modules (and maybe their attributes) a file imports."""
+    names = []
+    for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+        if isinstance(node, ast.Import):
+            names += [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            # "from pkg import mod" imports a module, "from mod import NAME" doesn't
+            names += [node.module] + [f"{node.module}.{a.name}" for a in node.names]
+    return [n for n in names if n.split(".")[0] in LOCAL_PACKAGES]
+
+
+@lru_cache(maxsize=None)
+def code_files(source: Path) -> Tuple[Path, ...]:
+    """`source` plus every repo module it imports, directly or through other repo modules."""
+    seen, todo = set(), [Path(source).resolve()]
+    while todo:
+        path = todo.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        for name in _local_imports(path):
+            try:
+                spec = importlib.util.find_spec(name)
+            except ImportError:  # an attribute, not a submodule
+                continue
+            if spec is not None and spec.origin and spec.origin.endswith(".py"):
+                todo.append(Path(spec.origin).resolve())
+    return tuple(sorted(seen))
+
+
+def stage_fingerprint(stage: Stage) -> Dict[str, Optional[str]]:
+    """
+    Hashes of the stage's inputs plus the source of the script that implements
+    it and of every repo module that script imports (e.g. cleaning.BRAND_ALIASES
+    for the validate stages).
+    """
+    fp = {str(p): hash_path(p) for p in stage.inputs}
+    for source in code_files(Path(inspect.getsourcefile(stage.run))):
+        fp["code:" + os.path.relpath(source)] = hash_path(source)
+    return fp
+
+
+def count_rows(path: Path) -> Optional[int]:
+    """Data rows in a CSV output (quoted newlines handled); None for other files."""
+    path = Path(path)
+    if path.suffix.lower() != ".csv" or not path.exists():
+        return None
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+def load_cache() -> dict:
+    if CACHE_JSON.exists():
+        return json.loads(CACHE_JSON.read_text())
+    return {}
+
+
+def save_cache(cache: dict) -> None:
+    CACHE_JSON.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CACHE_JSON.with_name(CACHE_JSON.name + ".tmp")
+    tmp.write_text(json.dumps(cache, indent=2, sort_keys=True))
+    os.replace(tmp, CACHE_JSON)
+
+
+def is_fresh(stage: Stage, cache: dict) -> bool:
+    """True when inputs + code match the last successful run and the outputs are untouched."""
+    entry = cache.get(stage.name)
+    if entry is None or entry["inputs"] != stage_fingerprint(stage):
+        return False
+    return all(entry["outputs"].get(str(p)) == hash_path(p) for p in stage.outputs)
+
+
+# ---- Scheduling --------------------------------------------------------
+
+def upstream(stages: List[Stage]) -> Dict[str, List[str]]:
+    """stage name -> names of the stages that produce one of its inputs."""
+    producers = {str(p): s.name for s in stages for p in s.outputs}
+    return {
+        s.name: sorted({producers[str(p)] for p in s.inputs if str(p) in producers} - {s.name})
+        for s in stages
+    }
+
+
+def select(targets: Sequence[str]) -> List[Stage]:
+    """The named stages plus everything upstream of them; all non-network stages by default."""
+    by_name = {s.name: s for s in STAGES}
+    if not targets:
+        return [s for s in STAGES if not s.network]
+
+    unknown = [t for t in targets if t not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)} (choose from {', '.join(by_name)})")
+
+    deps = upstream(STAGES)
+    wanted, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(deps[name])
+    return [s for s in STAGES if s.name in wanted]
+
+
+def run_pipeline(
+    targets: Sequence[str] = (),
+    force: bool = False,
+    workers: int = PIPELINE_WORKERS,
+    dry_run: bool = False,
+) -> List[dict]:
+    """
+    Run the selected stages in dependency order. A stage starts as soon as
+    every stage it depends on has finished, so independent branches (the
+    Dubicars and Dubizzle chains) run in parallel. Stages whose inputs, code
+    and outputs are unchanged since their last run are skipped.
+    """
+    stages = select(targets)
+    deps = upstream(stages)
+    cache = load_cache()
+
+    results: Dict[str, dict] = {}
+    pending = {s.name: s for s in stages}
+    running = {}
+
+    def settle(stage: Stage, status: str, seconds: float = 0.0) -> None:
+        rows = [count_rows(p) for p in stage.outputs]
+        rows = [n for n in rows if n is not None]
+        results[stage.name] = {
+            "stage": stage.name,
+            "status": status,
+            "seconds": seconds,
+            "rows": sum(rows) if rows else None,
+        }
+        print(f"[+] {stage.name}: {status} ({seconds:.1f}s)")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name in list(pending):
+                stage = pending[name]
+                if any(d not in results for d in deps[name]):
+                    continue
+                del pending[name]
+
+                if any(results[d]["status"] in ("failed", "blocked") for d in deps[name]):
+                    settle(stage, "blocked")
+                    continue
+                # in a dry run, upstream stages that "would run" stand in for their outputs
+                upstream_changed = any(results[d]["status"] == "would run" for d in deps[name])
+                missing = [str(p) for p in stage.inputs if not Path(p).exists()]
+                if missing and not upstream_changed:
+                    print(f"    missing input: {', '.join(missing)}")
+                    settle(stage, "blocked")
+                    continue
+                if not force and not upstream_changed and is_fresh(stage, cache):
+                    settle(stage, "cached")
+                    continue
+                if dry_run:
+                    settle(stage, "would run")
+                    continue
+
+                print(f"[+] {stage.name}: running")
+                running[pool.submit(stage.run)] = (stage, time.perf_counter())
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, started = running.pop(future)
+                seconds = time.perf_counter() - started
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"    {stage.name} failed: {e!r}")
+                    settle(stage, "failed", seconds)
+                    continue
+                cache[stage.name] = {
+                    "inputs": stage_fingerprint(stage),
+                    "outputs": {str(p): hash_path(p) for p in stage.outputs},
+                }
+                save_cache(cache)
+                settle(stage, "ran", seconds)
+
+    report = [results[s.name] for s in stages]
+    print("\n[+] Pipeline summary")
+    print(f"    {'stage':<22} {'status':<10} {'seconds':>8} {'rows':>10}")
+    for r in report:
+        rows = f"{r['rows']:,}" if r["rows"] is not None else "-"
+        print(f"    {r['stage']:<22} {r['status']:<10} {r['seconds']:>8.1f} {rows:>10}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the preprocessing stages from raw scrapes to enriched CSVs.")
+    parser.add_argument(
+        "stages", nargs="*",
+        help=(
+            "stages to bring up to date, with everything upstream of them "
+            f"(default: all offline stages). Known: {', '.join(s.name for s in STAGES)}"
+        ),
+    )
+    parser.add_argument("--force", action="store_true", help="ignore the cache and re-run every selected stage")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS, help="stages run in parallel")
+    parser.add_argument("--dry-run", action="store_true", help="only show which stages would run")
+    args = parser.parse_args()
+
+    run_pipeline(args.stages, force=args.force, workers=args.workers, dry_run=args.dry_run)
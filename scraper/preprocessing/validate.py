@@ -0,0 +1,304 @@
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from scraper.preprocessing.cleaning import BRAND_ALIASES
+from scraper.preprocessing.dubicars_second_scrape import FINAL_CSV as DUBICARS_CSV
+from scraper.preprocessing.update_enriched_from_reenriched import OUTPUT_CSV as DUBIZZLE_CSV
+
+# ---- Paths -------------------------------------------------------------
+
+BRANDS_CSV = Path("data/brands.csv")
+OUTPUT_DIR = Path("data/processed/validation")
+TRAINING_CSV = Path("ai_training/datasets/train_raw_price.csv")
+
+# ---- Limits ------------------------------------------------------------
+
+AS_OF_YEAR = date.today().year  # for listings without a date of their own
+MIN_YEAR = 1990
+MAX_YEAR = AS_OF_YEAR + 1  # next year's models go on sale mid-year
+MIN_PRICE_AED = 1_000
+MAX_PRICE_AED = 50_000_000
+MAX_KMS = 2_000_000
+MAX_VEHICLE_AGE = MAX_YEAR - MIN_YEAR
+MAX_KMS_PER_YEAR = 100_000  # ~275 km every day of the car's life
+
+# A plain number as written by the scrapers: "110000", "110000.0"
+NUMBER_FORMAT = r"\d+(?:\.\d+)?"
+
+# ---- Sources -----------------------------------------------------------
+
+# Each source's column for every field the rules check. Rules whose field a
+# source doesn't have are skipped for it. "listed" is the listing's own date
+# (Dubicars' "Updated on"), which ages the car instead of today's date.
+PROFILES = {
+    "dubizzle": {
+        "path": DUBIZZLE_CSV,
+        "fields": {"url": "url", "brand": "brand", "price": "price_aed", "year": "year", "kms": "kms"},
+    },
+    "dubicars": {
+        "path": DUBICARS_CSV,
+        "fields": {
+            "url": "url", "brand": "make_detail", "price": "price", "year": "year", "kms": "kms_numeric",
+            "listed": "updated_on",
+        },
+    },
+    "training": {
+        "path": TRAINING_CSV,
+        "fields": {
+            "brand": "brand", "price": "price_aed", "kms": "kms",
+            "vehicle_age": "vehicle_age", "kms_per_year": "kms_per_year",
+        },
+    },
+}
+
+
+# ---- Rules -------------------------------------------------------------
+
+@dataclass
+class Rule:
+    """
+    One data-quality check. `check` gets the source's columns for `fields`
+    (as text, exactly as read) and returns a boolean mask of violating rows.
+
+    "error" rules send a row to quarantine; "warn" rules are only reported.
+    `optional` fields follow the others and are passed as None when the
+    source doesn't have them.
+    """
+    name: str
+    fields: Sequence[str]
+    check: Callable[..., np.ndarray]
+    severity: str = "error"
+    description: str = ""
+    optional: Sequence[str] = ()
+
+
+def _number(s: pd.Series) -> pd.Series:
+    return pd.to_numeric(s, errors="coerce")
+
+
+def _mask(s: pd.Series) -> np.ndarray:
+    return s.fillna(False).to_numpy(dtype=bool)
+
+
+def required(field: str) -> Rule:
+    return Rule(
+        f"{field}_required", [field],
+        lambda s: s.isna().to_numpy(),
+        description=f"{field} is missing",
+    )
+
+
+def matches(field: str, pattern: str, description: str) -> Rule:
+    """Non-missing values must match `pattern` in full."""
+    return Rule(
+        f"{field}_format", [field],
+        lambda s: _mask(s.notna() & ~s.str.fullmatch(pattern)),
+        description=description,
+    )
+
+
+def in_range(field: str, lo: float, hi: float) -> Rule:
+    """Values that parse as numbers must lie in [lo, hi] (unparseable ones are the format rule's job)."""
+    return Rule(
+        f"{field}_range", [field],
+        lambda s: _mask((_number(s) < lo) | (_number(s) > hi)),
+        description=f"{field} outside {lo} to {hi}",
+    )
+
+
+def in_reference(field: str, values: set, normalise: Callable[[pd.Series], pd.Series], source: str) -> Rule:
+    """Non-missing values must appear (after `normalise`) in `values`."""
+    return Rule(
+        f"{field}_known", [field],
+        lambda s: _mask(s.notna() & ~normalise(s).isin(values)),
+        severity="warn",
+        description=f"{field} not in {source}",
+    )
+
+
+def _slug(s: pd.Series) -> pd.Series:
+    """'Land Rover' / 'land_rover' / ' LAND-ROVER ' -> 'land-rover'."""
+    return s.str.strip().str.lower().str.replace(r"[\s_]+", "-", regex=True)
+
+
+def load_brands(path: Path = BRANDS_CSV) -> set:
+    """Every spelling of a known brand: names and slugs from brands.csv plus the cleaning aliases."""
+    brands = pd.read_csv(path, dtype=str)
+    known = set(_slug(brands["Brand"])) | set(_slug(brands["Slug"]))
+    return known | set(BRAND_ALIASES)
+
+
+def _kms_per_year(kms: pd.Series, age: pd.Series) -> np.ndarray:
+    rate = _number(kms) / _number(age).clip(lower=1)
+    return _mask(rate > MAX_KMS_PER_YEAR)
+
+
+def _listing_year(year: pd.Series, listed: Optional[pd.Series]) -> pd.Series:
+    """Year each listing was posted, AS_OF_YEAR where it has no readable date."""
+    if listed is None:
+        return pd.Series(AS_OF_YEAR, index=year.index)
+    dates = pd.to_datetime(listed.str.replace(r"^\s*updated on\s*", "", case=False, regex=True),
+                           format="mixed", dayfirst=True, errors="coerce")
+    return dates.dt.year.fillna(AS_OF_YEAR)
+
+
+def build_rules(brands: set) -> List[Rule]:
+    return [
+        required("url"),
+        matches("url", r"https?://\S+", "url is not an http(s) link"),
+        required("price"),
+        matches("price", NUMBER_FORMAT, "price is not a plain number (e.g. '125,000 AED')"),
+        in_range("price", MIN_PRICE_AED, MAX_PRICE_AED),
+        required("year"),
+        matches("year", r"\d{4}(?:\.0+)?", "year is not a 4-digit year"),
+        in_range("year", MIN_YEAR, MAX_YEAR),
+        required("kms"),
+        matches("kms", NUMBER_FORMAT, "kms is not a plain number (e.g. '110,000 km')"),
+        in_range("kms", 0, MAX_KMS),
+        in_range("vehicle_age", 0, MAX_VEHICLE_AGE),
+        in_reference("brand", brands, _slug, BRANDS_CSV.name),
+        Rule(
+            "kms_per_year_plausible", ["kms", "year"],
+            lambda kms, year, listed: _kms_per_year(kms, _listing_year(year, listed) - _number(year)),
+            description=f"more than {MAX_KMS_PER_YEAR:,} km per year of age",
+            optional=["listed"],
+        ),
+        Rule(
+            "kms_per_year_plausible", ["kms", "vehicle_age"],
+            _kms_per_year,
+            description=f"more than {MAX_KMS_PER_YEAR:,} km per year of age",
+        ),
+        Rule(
+            "kms_per_year_consistent", ["kms", "vehicle_age", "kms_per_year"],
+            lambda kms, age, rate: _mask(
+                (_number(rate) - _number(kms) / _number(age).where(_number(age) > 0)).abs() > 1
+            ),
+            description="kms_per_year != kms / vehicle_age",
+        ),
+    ]
+
+
+# ---- Validation --------------------------------------------------------
+
+def run_rules(df: pd.DataFrame, fields: Dict[str, str], rules: List[Rule]):
+    """
+    Evaluate every applicable rule over the whole frame.
+    Returns ({rule name: violation mask}, applicable rules).
+    """
+    masks: Dict[str, np.ndarray] = {}
+    applied = []
+
+    def has(field: str) -> bool:
+        return field in fields and fields[field] in df.columns
+
+    for rule in rules:
+        if not all(has(f) for f in rule.fields):
+            continue
+        mask = rule.check(
+            *(df[fields[f]] for f in rule.fields),
+            *(df[fields[f]] if has(f) else None for f in rule.optional),
+        )
+        # two rules may share a name (the same check for different columns)
+        masks[rule.name] = masks[rule.name] | mask if rule.name in masks else mask
+        if rule.name not in {r.name for r in applied}:
+            applied.append(rule)
+    return masks, applied
+
+
+def output_paths(name: str, output_dir: Path = OUTPUT_DIR):
+    """(valid, quarantine, report) CSVs written for a source."""
+    output_dir = Path(output_dir)
+    return (
+        output_dir / f"{name}_valid.csv",
+        output_dir / f"{name}_quarantine.csv",
+        output_dir / f"{name}_report.csv",
+    )
+
+
+def validate(
+    input_csv: Path,
+    fields: Dict[str, str],
+    name: str,
+    output_dir: Path = OUTPUT_DIR,
+    brands_csv: Path = BRANDS_CSV,
+) -> pd.DataFrame:
+    """
+    Check `input_csv` and write, to `output_dir`:
+      <name>_valid.csv       rows that pass every "error" rule (values untouched)
+      <name>_quarantine.csv  the other rows, plus a failed_rules column
+      <name>_report.csv      violations per rule
+    Returns the report.
+    """
+    input_csv = Path(input_csv)
+    if not input_csv.exists():
+        raise FileNotFoundError(f"Input CSV not found: {input_csv}")
+
+    start = time.perf_counter()
+    # As text, so formats are checked on what the scraper actually wrote
+    df = pd.read_csv(input_csv, dtype=str, keep_default_na=False, na_values=[""], low_memory=False)
+    print(f"[+] {name}: {len(df):,} rows from {input_csv}")
+
+    masks, rules = run_rules(df, fields, build_rules(load_brands(brands_csv)))
+
+    errors = [r.name for r in rules if r.severity == "error"]
+    bad = np.zeros(len(df), dtype=bool)
+    for rule_name in errors:
+        bad |= masks[rule_name]
+
+    quarantine = df[bad].copy()
+    failed = np.column_stack([masks[r] for r in errors])[bad] if errors else np.zeros((0, 0), bool)
+    quarantine["failed_rules"] = [";".join(np.array(errors)[row]) for row in failed]
+
+    report = pd.DataFrame([
+        {
+            "rule": r.name,
+            "severity": r.severity,
+            "columns": ",".join(fields[f] for f in r.fields),
+            "violations": int(masks[r.name].sum()),
+            "pct": round(100 * masks[r.name].mean(), 3) if len(df) else 0.0,
+            "example": next(iter(df.loc[masks[r.name], fields[r.fields[0]]].head(1)), ""),
+            "description": r.description,
+        }
+        for r in rules
+    ])
+
+    valid_csv, quarantine_csv, report_csv = output_paths(name, output_dir)
+    valid_csv.parent.mkdir(parents=True, exist_ok=True)
+    df[~bad].to_csv(valid_csv, index=False)
+    quarantine.to_csv(quarantine_csv, index=False)
+    report.to_csv(report_csv, index=False)
+
+    print(report[["rule", "severity", "violations", "pct", "example"]].to_string(index=False))
+    print(f"[+] Kept {len(df) - len(quarantine):,} rows, quarantined {len(quarantine):,} "
+          f"({time.perf_counter() - start:.2f}s) → {output_dir}")
+    return report
+
+
+def main(profile: str = "dubizzle", input_csv: Optional[Path] = None, output_dir: Path = OUTPUT_DIR):
+    spec = PROFILES[profile]
+    return validate(input_csv or spec["path"], spec["fields"], profile, output_dir)
+
+
+def validate_dubizzle():
+    main("dubizzle")
+
+
+def validate_dubicars():
+    main("dubicars")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a listings CSV against the data-quality rules.")
+    parser.add_argument("profile", choices=list(PROFILES), help="which source's columns to check")
+    parser.add_argument("--input", type=Path, default=None, help="CSV to check (default: the profile's usual file)")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    main(args.profile, args.input, args.output_dir)
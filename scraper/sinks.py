@@ -0,0 +1,149 @@
+import csv
+import io
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+
+class RowSink:
+    """
+    Append-only destination for scraped rows.
+
+    Rows are written one batch (usually one page) at a time, so memory stays
+    constant no matter how long the crawl runs. Every batch is flushed as a
+    unit, and the file only appears under its final name once close() is
+    called; until then it lives at `<path>.part`, which doubles as the
+    partial backup of an interrupted crawl.
+    """
+
+    def __init__(self, path: Path, columns: Sequence[str]):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.part_path = self.path.with_name(self.path.name + ".part")
+        self.rows_written = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        self._write_batch(rows)
+        self.rows_written += len(rows)
+
+    def _write_batch(self, rows: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def _finish(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._finish()
+        os.replace(self.part_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # keep the .part file as the partial backup, don't publish it
+            self._finish()
+        return False
+
+
+class CsvSink(RowSink):
+    """CSV file; each batch is serialised in memory and appended with one write + fsync."""
+
+    def __init__(self, path: Path, columns: Sequence[str]):
+        super().__init__(path, columns)
+        self._f = open(self.part_path, "w", newline="", encoding="utf-8")
+        csv.writer(self._f).writerow(self.columns)
+
+    def _write_batch(self, rows):
+        buf = io.StringIO()
+        csv.DictWriter(buf, fieldnames=self.columns).writerows(rows)
+        self._f.write(buf.getvalue())
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def _finish(self):
+        if not self._f.closed:
+            self._f.close()
+
+
+class SqliteSink(RowSink):
+    """SQLite table; each batch is one transaction."""
+
+    def __init__(self, path: Path, columns: Sequence[str], table: str = "listings"):
+        super().__init__(path, columns)
+        if self.part_path.exists():
+            self.part_path.unlink()
+        self.table = table
+        self._db = sqlite3.connect(self.part_path)
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        self._db.execute(f'CREATE TABLE "{table}" ({cols})')
+        self._insert = (
+            f'INSERT INTO "{table}" ({cols}) VALUES ({", ".join("?" for _ in self.columns)})'
+        )
+
+    def _write_batch(self, rows):
+        with self._db:
+            self._db.executemany(
+                self._insert, [tuple(row.get(c) for c in self.columns) for row in rows]
+            )
+
+    def _finish(self):
+        self._db.close()
+
+
+class ParquetSink(RowSink):
+    """
+    Parquet file with one row group per batch (needs pyarrow).
+
+    Columns are stored as strings unless `types` gives a pyarrow type for them;
+    scraped values are raw text, typing happens in preprocessing.
+    """
+
+    def __init__(self, path: Path, columns: Sequence[str], types: Optional[Dict[str, Any]] = None):
+        super().__init__(path, columns)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        types = types or {}
+        self.schema = pa.schema([(c, types.get(c, pa.string())) for c in self.columns])
+        self._writer = pq.ParquetWriter(self.part_path, self.schema, compression="zstd")
+
+    def _write_batch(self, rows):
+        pa = self._pa
+        arrays = []
+        for field in self.schema:
+            values = [row.get(field.name) for row in rows]
+            if field.type == pa.string():
+                values = [None if v is None else str(v) for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def _finish(self):
+        self._writer.close()
+
+
+SINKS = {
+    ".csv": CsvSink,
+    ".sqlite": SqliteSink,
+    ".db": SqliteSink,
+    ".parquet": ParquetSink,
+}
+
+
+def open_sink(path: Path, columns: Sequence[str]) -> RowSink:
+    """Pick the sink implementation from the output file extension."""
+    path = Path(path)
+    try:
+        sink_cls = SINKS[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported output format '{path.suffix}' (use one of {', '.join(SINKS)})"
+        )
+    return sink_cls(path, columns)
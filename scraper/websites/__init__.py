@@ -0,0 +1 @@
+# Website Scrapers Package
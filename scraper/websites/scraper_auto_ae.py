@@ -0,0 +1,213 @@
+import argparse
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from scraper.crawler import crawl_pages
+from scraper.html_archive import reparse
+from scraper.http_client import HttpClient
+from scraper.sinks import open_sink
+
+MAX_PAGES = 582          # how many pages to try
+SLEEP_SECONDS = 1.0      # min gap between page requests (be nice!)
+CRAWL_WORKERS = 4        # pages fetched + parsed concurrently
+
+BASE_URL = "https://auto.ae"
+SEARCH_URL = "https://auto.ae/sale/car/all/?page={page}"
+
+OUTPUT_PATH = Path("data/raw/auto_ae/auto_ae_listings.csv")  # .csv, .parquet or .sqlite
+DEBUG_HTML = Path("debug/auto_ae.html")
+
+# Same column order as the existing data/raw/auto_ae/*.csv files
+COLUMNS = [
+    "title", "year", "kms_raw", "price_raw", "url", "trim", "color",
+    "steering_side", "engine_fuel", "vehicle_type", "specs_detail",
+]
+# ... which hold this for a field the card does not show
+MISSING = "N/A"
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0.0.0 Safari/537.36"
+    )
+}
+
+# Only the results list is parsed; the rest of the ~1.3 MB Next.js page
+# (inline JSON, scripts, filters) is never turned into a tree.
+RESULTS_MARKER = '<ul class="SearchAdvertsList_root'
+RESULTS_ONLY = SoupStrainer("ul", class_=lambda c: c and c.startswith("SearchAdvertsList_root"))
+
+
+def _text(card, class_prefix: str):
+    # CSS-module class names carry a build hash suffix, so match on the prefix
+    el = card.select_one(f'[class^="{class_prefix}__"], [class*=" {class_prefix}__"]')
+    return el.get_text(" ", strip=True) if el else None
+
+
+def parse_listings(html: str, features: str = "lxml"):
+    """
+    Extract car listings from an auto.ae search results page. Fields a
+    card does not show are MISSING ("N/A"), as in the existing CSVs.
+    """
+    # Skip the head + filter markup before the list without tokenizing it
+    start = html.find(RESULTS_MARKER)
+    if start > 0:
+        html = html[start:]
+    soup = BeautifulSoup(html, features, parse_only=RESULTS_ONLY)
+
+    rows = []
+
+    # each ad = one li with id="ad-<id>" (promo blocks have no id)
+    for card in soup.select('li[id^="ad-"]'):
+        title = _text(card, "SearchAdvertCard_name")
+        # the price <b> shares its box with promo popup text, so take the <b> only
+        price_el = card.select_one('[class^="SearchAdvertCard_price_value__"] > b')
+        price_raw = price_el.get_text(" ", strip=True) if price_el else None
+
+        # skip junk (no real title/price)
+        if not title or not price_raw:
+            continue
+
+        url = None
+        link_el = card.select_one('a[href*="/sale/car/"]')
+        if link_el is not None:
+            href = link_el["href"]
+            url = href if href.startswith("http") else BASE_URL + href
+
+        # "Trim X • Colour • Left-Hand Drive" (trim is optional)
+        trim = color = steering_side = None
+        specs_ul = card.select_one('ul[class^="Specs_root__"]')
+        if specs_ul is not None:
+            for li in specs_ul.find_all("li", recursive=False):
+                if "Specs_dot" in " ".join(li.get("class") or []):
+                    continue
+                value = li.get_text(" ", strip=True)
+                if value.startswith("Trim "):
+                    trim = value
+                elif value.endswith("Hand Drive"):
+                    steering_side = value
+                elif value:
+                    color = value
+
+        # two stats lists: [engine/fuel, drive, gearbox] and [body, specs, warranty]
+        engine_fuel = vehicle_type = specs_detail = None
+        stats = card.select('ul[class^="SearchAdvertCard_stats__"]')
+        if len(stats) >= 1:
+            first = stats[0].find("li")
+            engine_fuel = first.get_text(" ", strip=True) if first else None
+        if len(stats) >= 2:
+            items = [li.get_text(" ", strip=True) for li in stats[1].find_all("li")]
+            vehicle_type = items[0] if items else None
+            specs_detail = next((v for v in items if v.endswith("Specs")), None)
+
+        row = {
+            "title": title,
+            "year": _text(card, "SearchAdvertCard_year"),
+            "kms_raw": _text(card, "SearchAdvertCard_mileage"),
+            "price_raw": price_raw,
+            "url": url,
+            "trim": trim,
+            "color": color,
+            "steering_side": steering_side,
+            "engine_fuel": engine_fuel,
+            "vehicle_type": vehicle_type,
+            "specs_detail": specs_detail,
+        }
+        rows.append({k: v if v else MISSING for k, v in row.items()})
+
+    return rows
+
+
+def main(output_path: Path = OUTPUT_PATH):
+    client = HttpClient(headers=HEADERS, timeout=20)
+
+    pages_scraped = 0
+    page_urls = [SEARCH_URL.format(page=page) for page in range(1, MAX_PAGES + 1)]
+    print(f"[+] Crawling up to {MAX_PAGES} pages with {CRAWL_WORKERS} workers -> {output_path}")
+
+    # Rows go to disk page by page; nothing accumulates in memory
+    with open_sink(output_path, COLUMNS) as sink:
+        for page, (url, rows) in enumerate(
+            crawl_pages(client, page_urls, parse_listings, kind="auto_ae_search",
+                        workers=CRAWL_WORKERS, min_interval=SLEEP_SECONDS),
+            start=1,
+        ):
+            print(f"[+] Page {page}: {url} -> {len(rows)} listings")
+            if not rows:
+                print("    No listings on this page, stopping.")
+                break
+
+            sink.write_rows(rows)
+            pages_scraped += 1
+
+    client.report()
+    client.close()
+    print(f"[+] Finished. Scraped {sink.rows_written} listings from {pages_scraped} pages -> {output_path}")
+
+
+def main_reparse(output_path: Path = OUTPUT_PATH):
+    """
+    Rebuild the output from the archived auto.ae search pages.
+    """
+    with open_sink(output_path, COLUMNS) as sink:
+        for _, rows in reparse(parse_listings, kind="auto_ae_search"):
+            sink.write_rows(rows)
+    print(f"[+] Re-parsed {sink.rows_written} listings -> {output_path}")
+
+
+def main_bench(iterations: int = 20):
+    """
+    Time parse_listings on the saved debug page with each parser backend,
+    with and without restricting the tree to the results list.
+    """
+    html = DEBUG_HTML.read_text(encoding="utf-8")
+    print(f"[+] Benchmarking on {DEBUG_HTML} ({len(html) / 1e6:.2f} MB), {iterations} iterations")
+
+    def full_parse(page_html, features):
+        # baseline: build the whole tree, then run the same extraction
+        soup = BeautifulSoup(page_html, features)
+        ul = soup.find("ul", class_=lambda c: c and c.startswith("SearchAdvertsList_root"))
+        return parse_listings(str(ul), features) if ul else []
+
+    variants = [
+        ("lxml, results only", lambda h: parse_listings(h, "lxml")),
+        ("html.parser, results only", lambda h: parse_listings(h, "html.parser")),
+        ("lxml, full tree", lambda h: full_parse(h, "lxml")),
+        ("html.parser, full tree", lambda h: full_parse(h, "html.parser")),
+    ]
+
+    for name, fn in variants:
+        n_cards = len(fn(html))  # warm-up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(html)
+        per_page = (time.perf_counter() - start) / iterations
+        print(f"    {name:<28} {per_page * 1000:8.1f} ms/page  "
+              f"{n_cards / per_page:8.0f} cards/s  ({n_cards} cards)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape auto.ae search pages.")
+    parser.add_argument(
+        "mode", nargs="?", choices=["crawl", "reparse", "bench"], default="crawl",
+        help=(
+            "'crawl' fetches live pages; 'reparse' re-runs parse_listings over the "
+            "HTML archive; 'bench' times the parser on debug/auto_ae.html"
+        ),
+    )
+    parser.add_argument("--iterations", type=int, default=20, help="bench iterations")
+    parser.add_argument(
+        "--output", type=Path, default=OUTPUT_PATH,
+        help="output file; the extension picks the format (.csv, .parquet, .sqlite)",
+    )
+    args = parser.parse_args()
+
+    if args.mode == "reparse":
+        main_reparse(args.output)
+    elif args.mode == "bench":
+        main_bench(args.iterations)
+    else:
+        main(args.output)
@@ -1,13 +1,35 @@
+import argparse
+import os
 import time
 import json
-import requests
+from pathlib import Path
+
 import pandas as pd
 from bs4 import BeautifulSoup
 
+from scraper.crawler import crawl_pages
+from scraper.html_archive import reparse
+from scraper.http_client import HttpClient
+from scraper.sinks import open_sink
+
 MAX_PAGES = 332          # how many pages to try
-SLEEP_SECONDS = 1.5      # pause between pages (be nice!)
-PARTIAL_SAVE_EVERY = 20  # save a backup every N pages
+SLEEP_SECONDS = 1.5      # min gap between page requests (be nice!)
+CRAWL_WORKERS = 4        # pages fetched + parsed concurrently
+
+OUTPUT_PATH = Path("dubicars_cars_seed.csv")  # .csv, .parquet or .sqlite
+
+# Row schema written by parse_listings
+COLUMNS = [
+    "listing_id", "title", "price", "currency", "city",
+    "year", "kms_raw", "kms_numeric", "url",
+]
+
+# Incremental mode: stop paginating after this many consecutive listings that
+# are already known with an unchanged price (search results are newest-first).
+STOP_AFTER_UNCHANGED = 60
 
+STATE_JSON = Path("data/processed/dubi/dubicars_crawl_state.json")
+DELTA_CSV = Path("data/processed/dubi/dubicars_delta.csv")
 
 
 BASE_URL = "https://www.dubicars.com"
@@ -40,6 +62,7 @@ def parse_listings(html: str):
         ga4_raw = card.get("data-ga4-detail")
         sp_raw = card.get("data-sp-item")
 
+        listing_id = None
         price = None
         currency = None
         city = None
@@ -54,6 +77,7 @@ def parse_listings(html: str):
                 currency = ga4.get("currency")
                 city = ga4.get("city")
                 year = ga4.get("car_year")
+                listing_id = ga4.get("item_id") or ga4.get("id")
             except Exception:
                 pass
 
@@ -67,6 +91,8 @@ def parse_listings(html: str):
                     year = sp.get("y")
                 if km_numeric is None:
                     km_numeric = sp.get("km")
+                if listing_id is None:
+                    listing_id = sp.get("id")
             except Exception:
                 pass
 
@@ -91,6 +117,7 @@ def parse_listings(html: str):
 
         rows.append(
             {
+                "listing_id": listing_id,
                 "title": title,
                 "price": price,
                 "currency": currency,
@@ -106,50 +133,177 @@ def parse_listings(html: str):
     return rows
 
 
-def main():
-    all_rows = []
+def listing_key(row) -> str:
+    """Stable identity of a listing: the site's id if present, else its URL."""
+    if row.get("listing_id") is not None:
+        return str(row["listing_id"])
+    return str(row.get("url"))
+
+
+def load_state() -> dict:
+    """Last known {listing_key: {"price": ..., "url": ...}} from previous runs."""
+    if not STATE_JSON.exists():
+        return {}
+    with open(STATE_JSON, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict) -> None:
+    """Write the crawl state atomically so an interrupted run can't corrupt it."""
+    STATE_JSON.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = STATE_JSON.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_JSON)
+
+
+def update_state(state: dict, rows) -> None:
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    for row in rows:
+        state[listing_key(row)] = {
+            "price": str(row["price"]),
+            "url": row.get("url"),
+            "last_seen": now,
+        }
+
+
+def main(output_path: Path = OUTPUT_PATH):
+    client = HttpClient(headers=HEADERS, timeout=20)
+    state = load_state()
     pages_scraped = 0
 
-    for page in range(1, MAX_PAGES + 1):
-        url = SEARCH_URL.format(page=page)
-        print(f"[+] Loading page {page}: {url}")
+    page_urls = [SEARCH_URL.format(page=page) for page in range(1, MAX_PAGES + 1)]
+    print(f"[+] Crawling up to {MAX_PAGES} pages with {CRAWL_WORKERS} workers -> {output_path}")
+
+    # Each page's rows are appended as they arrive; until the crawl finishes
+    # the sink's .part file is the partial backup.
+    with open_sink(output_path, COLUMNS) as sink:
+        for page, (url, rows) in enumerate(
+            crawl_pages(client, page_urls, parse_listings, kind="dubicars_search",
+                        workers=CRAWL_WORKERS, min_interval=SLEEP_SECONDS),
+            start=1,
+        ):
+            print(f"[+] Page {page}: {url}")
+
+            # debug dump of first page
+            if page == 1:
+                with open("debug_dubicars_page1.html", "w", encoding="utf-8") as f:
+                    f.write(client.archive.get(url) or "")
+                print("[+] Wrote debug_dubicars_page1.html")
+
+            if not rows:
+                print("    No listings on this page, stopping.")
+                break
+
+            sink.write_rows(rows)
+            # a full crawl is the baseline for the next incremental run
+            update_state(state, rows)
+            pages_scraped += 1
+
+    client.report()
+    client.close()
+    save_state(state)
+
+    print(f"[+] Finished. Scraped {sink.rows_written} listings from {pages_scraped} pages -> {output_path}")
+    print(f"[+] Crawl state updated: {len(state)} known listings -> {STATE_JSON}")
+
 
-        resp = requests.get(url, headers=HEADERS, timeout=20)
-        resp.raise_for_status()
-        html = resp.text
+def main_incremental():
+    """
+    Only collect listings that are new or whose price changed since the last
+    run. Pagination stops once STOP_AFTER_UNCHANGED known, unchanged listings
+    appear in a row. The delta is written to DELTA_CSV for the detail scraper.
+    """
+    state = load_state()
+    if not state:
+        print("[!] No crawl state yet – run a full crawl first.")
+        return
+
+    client = HttpClient(headers=HEADERS, timeout=20)
+    delta_rows = []
+    unchanged_run = 0
+    pages_scraped = 0
 
-        # debug dump of first page
-        if page == 1:
-            with open("debug_dubicars_page1.html", "w", encoding="utf-8") as f:
-                f.write(html)
-            print("[+] Wrote debug_dubicars_page1.html")
+    page_urls = [SEARCH_URL.format(page=page) for page in range(1, MAX_PAGES + 1)]
+
+    for page, (url, rows) in enumerate(
+        crawl_pages(client, page_urls, parse_listings, kind="dubicars_search",
+                    workers=CRAWL_WORKERS, min_interval=SLEEP_SECONDS),
+        start=1,
+    ):
+        print(f"[+] Page {page}: {url}")
 
-        rows = parse_listings(html)
         if not rows:
             print("    No listings on this page, stopping.")
             break
-
-        all_rows.extend(rows)
         pages_scraped += 1
 
-        # partial backup every N pages
-        if pages_scraped % PARTIAL_SAVE_EVERY == 0:
-            tmp_name = f"dubicars_partial_{pages_scraped}_pages.csv"
-            pd.DataFrame(all_rows).to_csv(tmp_name, index=False)
-            print(f"[+] Saved partial backup: {tmp_name}")
+        for row in rows:
+            known = state.get(listing_key(row))
+            if known is None:
+                row["change"] = "new"
+            elif known["price"] != str(row["price"]):
+                row["change"] = "price_changed"
+                row["previous_price"] = known["price"]
+            else:
+                unchanged_run += 1
+                continue
 
-        # be polite
-        time.sleep(SLEEP_SECONDS)
+            unchanged_run = 0
+            delta_rows.append(row)
+
+        # unchanged listings on this page still count as "seen" today
+        update_state(state, rows)
+
+        if unchanged_run >= STOP_AFTER_UNCHANGED:
+            print(f"    {unchanged_run} unchanged listings in a row, stopping.")
+            break
+
+    client.report()
+    client.close()
+    save_state(state)
+
+    DELTA_CSV.parent.mkdir(parents=True, exist_ok=True)
+    delta_df = pd.DataFrame(delta_rows) if delta_rows else pd.DataFrame(columns=["url", "change"])
+    delta_df.to_csv(DELTA_CSV, index=False)
+
+    n_new = sum(1 for r in delta_rows if r["change"] == "new")
+    print(f"[+] Finished. {pages_scraped} pages, {n_new} new, "
+          f"{len(delta_rows) - n_new} price changes -> {DELTA_CSV}")
 
-    if not all_rows:
-        print("[+] No data scraped, nothing to save.")
-        return
 
-    df = pd.DataFrame(all_rows)
-    out_name = "dubicars_cars_seed.csv"
-    df.to_csv(out_name, index=False)
-    print(f"[+] Finished. Scraped {len(df)} listings from {pages_scraped} pages -> {out_name}")
+def main_reparse(output_path: Path = OUTPUT_PATH):
+    """
+    Rebuild the seed file from the HTML archive with the current parser,
+    without touching the network.
+    """
+    pages = 0
+    with open_sink(output_path, COLUMNS) as sink:
+        for _, rows in reparse(parse_listings, kind="dubicars_search"):
+            sink.write_rows(rows)
+            pages += 1
+
+    print(f"[+] Re-parsed {sink.rows_written} listings from {pages} archived pages -> {output_path}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scrape Dubicars search pages.")
+    parser.add_argument(
+        "mode", nargs="?", choices=["crawl", "incremental", "reparse"], default="crawl",
+        help=(
+            "'crawl' fetches every search page; 'incremental' only collects new or "
+            "re-priced listings; 'reparse' re-runs parse_listings over the HTML archive"
+        ),
+    )
+    parser.add_argument(
+        "--output", type=Path, default=OUTPUT_PATH,
+        help="seed output; the extension picks the format (.csv, .parquet, .sqlite)",
+    )
+    args = parser.parse_args()
+
+    if args.mode == "reparse":
+        main_reparse(args.output)
+    elif args.mode == "incremental":
+        main_incremental()
+    else:
+        main(args.output)
@@ -2,10 +2,18 @@
 ML Service for loading and using the CatBoost model.
 """
 import os
+import sys
 import json
 import numpy as np
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+
+# The feature code is shared with training (ai_training/features.py)
+REPO_ROOT = Path(__file__).resolve().parents[3]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.append(str(REPO_ROOT))
+
+from ai_training.features import SCHEMA_HASH, build_features_from_records, check_schema
 
 
 class MLService:
@@ -33,15 +41,6 @@ class MLService:
                 str(base_path / "server/models/catboost/calibration_info.json")
             )
             
-            # Load model
-            if Path(model_path).exists():
-                self.model = CatBoostRegressor()
-                self.model.load_model(model_path)
-                self.model_loaded = True
-                print(f"✅ Model loaded from: {model_path}")
-            else:
-                print(f"⚠️ Model file not found: {model_path}")
-            
             # Load calibration info
             if Path(calibration_path).exists():
                 with open(calibration_path, 'r') as f:
@@ -50,6 +49,17 @@ class MLService:
             else:
                 print(f"⚠️ Calibration file not found: {calibration_path}")
                 self.calibration_info = {"calibration_factor": 1.0}
+            
+            # Load model, refusing one trained on a different feature schema
+            if Path(model_path).exists():
+                model = CatBoostRegressor()
+                model.load_model(model_path)
+                check_schema(model, self.calibration_info.get("feature_schema_hash"))
+                self.model = model
+                self.model_loaded = True
+                print(f"✅ Model loaded from: {model_path} (feature schema {SCHEMA_HASH})")
+            else:
+                print(f"⚠️ Model file not found: {model_path}")
                 
         except ImportError:
             print("⚠️ CatBoost not installed. Install with: pip install catboost")
@@ -66,31 +76,42 @@ class MLService:
         Returns:
             Dictionary with predicted_price, confidence_low, confidence_high
         """
+        return self.predict_prices([features])[0]
+    
+    def predict_prices(self, listings: List[Dict[str, Any]]) -> List[Dict[str, float]]:
+        """
+        Predict prices for many listings with one model call.
+        
+        Args:
+            listings: List of car feature dictionaries
+            
+        Returns:
+            One predict_price() result per listing
+        """
         if not self.model_loaded:
             raise RuntimeError("Model not loaded. Check model file path.")
         
-        # Prepare features for model
-        feature_vector = self._prepare_features(features)
+        # Same feature engineering as training
+        X = build_features_from_records(listings)
         
         # Get prediction with uncertainty
         try:
-            pred = self.model.predict(
-                feature_vector,
-                prediction_type="RMSEWithUncertainty"
-            )
+            # [mu, log sigma] for the RMSEWithUncertainty model and for a
+            # distilled MultiRMSE student (ai_training/distill.py)
+            pred = self.model.predict(X, prediction_type="RawFormulaVal")
             pred = np.asarray(pred)
             
             if pred.ndim == 2 and pred.shape[1] >= 2:
-                mu_log = pred[0, 0]
-                sigma_log = np.sqrt(max(pred[0, 1], 0))
+                mu_log = pred[:, 0]
+                sigma_log = np.exp(pred[:, 1])
             else:
-                mu_log = pred[0] if pred.ndim > 0 else pred
-                sigma_log = 0.1  # Default uncertainty
+                mu_log = pred.reshape(-1)
+                sigma_log = np.full(len(mu_log), 0.1)  # Default uncertainty
                 
         except Exception:
             # Fallback to simple prediction
-            mu_log = self.model.predict(feature_vector)[0]
-            sigma_log = 0.1
+            mu_log = np.asarray(self.model.predict(X)).reshape(-1)
+            sigma_log = np.full(len(mu_log), 0.1)
         
         # Apply calibration
         calibration_factor = self.calibration_info.get("calibration_factor", 1.0)
@@ -103,62 +124,15 @@ class MLService:
         confidence_low = np.exp(mu_log - z_score * sigma_calibrated)
         confidence_high = np.exp(mu_log + z_score * sigma_calibrated)
         
-        return {
-            "predicted_price": round(float(predicted_price), 0),
-            "confidence_low": round(float(confidence_low), 0),
-            "confidence_high": round(float(confidence_high), 0),
-            "confidence_level": 0.90
-        }
-    
-    def _prepare_features(self, features: Dict[str, Any]) -> list:
-        """
-        Prepare feature vector for the model.
-        
-        This should match the feature order used during training.
-        """
-        # Calculate derived features
-        current_year = 2026
-        vehicle_age = current_year - features.get("year", 2020)
-        kms = features.get("mileage", 50000)
-        kms_per_year = kms / max(vehicle_age, 1)
-        
-        # Map features to model input order
-        # TODO: This should match the exact feature order from training
-        feature_values = [
-            features.get("brand", "Unknown"),
-            features.get("model", "Unknown"),
-            features.get("trim", "Unknown"),
-            features.get("fuel_type", "Petrol"),
-            features.get("body_type", "Unknown"),
-            features.get("steering_side", "Left"),
-            features.get("regional_specs", "GCC"),
-            str(features.get("doors", "4")),
-            str(features.get("seating_capacity", "5")),
-            str(features.get("cylinders", "4")),
-            self._get_age_bucket(vehicle_age),
-            kms,
-            vehicle_age,
-            kms_per_year,
-            features.get("horsepower", 200),
-            features.get("engine_cc", 2000),
+        return [
+            {
+                "predicted_price": round(float(p), 0),
+                "confidence_low": round(float(lo), 0),
+                "confidence_high": round(float(hi), 0),
+                "confidence_level": 0.90
+            }
+            for p, lo, hi in zip(predicted_price, confidence_low, confidence_high)
         ]
-        
-        return [feature_values]
-    
-    def _get_age_bucket(self, age: int) -> str:
-        """Convert age to bucket category."""
-        if age <= 1:
-            return "0-1"
-        elif age <= 3:
-            return "2-3"
-        elif age <= 5:
-            return "4-5"
-        elif age <= 7:
-            return "6-7"
-        elif age <= 10:
-            return "8-10"
-        else:
-            return "10+"
     
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the loaded model."""
@@ -166,5 +140,6 @@ class MLService:
             "model_loaded": self.model_loaded,
             "calibration_factor": self.calibration_info.get("calibration_factor") if self.calibration_info else None,
             "model_type": "CatBoost with RMSEWithUncertainty",
+            "feature_schema_hash": SCHEMA_HASH,
             "target_coverage": 0.90
         }
@@ -0,0 +1,192 @@
+"""
+Parity of the compiled model extractor in brand_extract.py with the original
+per-row implementation, kept here as the reference.
+"""
+import random
+import re
+
+import pandas as pd
+import pytest
+
+from scraper.preprocessing.brand_extract import (
+    classify_token,
+    extract_model_batch,
+    extract_model_from_type,
+)
+
+
+def reference_extract_model(type_str: str, brand: str = "") -> str:
+    """Original per-row implementation (before the cached token classifier)."""
+    if not isinstance(type_str, str):
+        return ""
+
+    # Normalise whitespace
+    s = re.sub(r"\s+", " ", type_str).strip()
+    if not s:
+        return ""
+
+    # Many dealers use " - " as a separator for description bits.
+    # Replace " - " with "|" so we can reuse the same split logic.
+    s = s.replace(" - ", " | ")
+
+    # Take only the first segment before marketing separators
+    first_seg = re.split(r"[|,/]", s, maxsplit=1)[0]
+    first_seg = first_seg.strip()
+    if not first_seg:
+        return ""
+
+    tokens = first_seg.split()
+
+    # Tokens where we stop because they are engine/body/spec stuff, not model
+    stopwords = {
+        "HP", "HP)", "BHP",
+        "AWD", "FWD", "RWD",
+        "SUV", "Sedan", "Coupe", "Hatchback", "Pickup", "Van",
+        "A/T", "AT", "Automatic", "Tiptronic", "CVT",
+        "GCC", "Specs", "SPECS",
+        "Petrol", "Diesel", "Hybrid", "Electric",
+        "EXCELLENT", "DEAL", "CONDITION", "OFFER",
+        "ONLY", "PRICE", "CLEAN", "WARRANTY", "SERVICE",
+        "HISTORY", "FULL", "OPTION", "OPTIONS",
+        "KM", "KMS",
+    }
+
+    # Function words that almost always mean "description is starting"
+    function_stops = {"for", "our", "with", "and", "or", "from", "in", "on", "by", "per", "at"}
+
+    brand_lower = (brand or "").strip().lower()
+    brand_main = brand_lower.split()[0] if brand_lower else ""
+
+    model_tokens = []
+
+    for i, tok in enumerate(tokens):
+        t_clean = tok.strip("(),")
+
+        # 1) If the brand reappears AFTER we've already got some model tokens,
+        #    that usually means the dealer has started a new phrase.
+        if brand_lower:
+            t_low = t_clean.lower()
+            if model_tokens and (t_low == brand_lower or t_low == brand_main):
+                break
+
+        # 2) Engine displacement anywhere in the token (1.4L, 3.6L, 2L-6CYL, etc.)
+        if re.search(r"\d+(\.\d+)?L", t_clean, flags=re.IGNORECASE):
+            break
+
+        # 3) 4-digit year (19xx or 20xx)
+        if re.match(r"^(19|20)\d{2}$", t_clean):
+            break
+
+        # 4) Mileage tokens like "74,000Km" / "120000KM"
+        if re.match(r"^\d[\d,]*km$", t_clean, flags=re.IGNORECASE):
+            break
+
+        # 5) Generic hard stopwords
+        if t_clean.upper() in stopwords:
+            break
+
+        # 6) Horsepower-like tokens: "360HP", "108-HP", etc.
+        upper = t_clean.upper()
+        if re.match(r"^\d{2,4}(-?HP)?$", upper):
+            if "HP" in upper:
+                break
+            # Else, let numeric handling below decide
+
+        # 7) Plain numeric token (potential model OR horsepower / weird code)
+        if re.match(r"^\d{2,4}$", t_clean):
+            next_tok = tokens[i + 1].strip("(),") if i + 1 < len(tokens) else ""
+            if next_tok.upper() in {"HP", "HP)", "BHP"}:
+                break
+            # If it's the first token, allow it as model (e.g. "07", "001", "1500")
+            if model_tokens:
+                break
+
+        # 8) Function words once the model has started
+        if model_tokens and t_clean.lower() in function_stops:
+            break
+
+        model_tokens.append(t_clean if t_clean else tok)
+
+    model = " ".join(model_tokens).strip()
+    return model if model else first_seg
+
+
+# (type, brand) pairs covering each rule: hyphenated names and " - " separators,
+# leading numeric models, horsepower, engine sizes, years, mileage, spec and
+# function stopwords, the brand repeated mid-title, and empty / missing input.
+CASES = [
+    ("S-Class S 500 4MATIC", "Mercedes-Benz"),
+    ("AMG GT-R - Full Service History", "Mercedes-Benz"),
+    ("CX-5 2.5L AWD GCC Specs", "Mazda"),
+    ("F-150 Raptor 3.5L V6 - 2021 - 45,000Km", "Ford"),
+    ("Range Rover Sport HSE Dynamic, Panoramic", "Land Rover"),
+    ("Land Cruiser GXR V8 4.0L Automatic GCC SPECS", "Toyota"),
+    ("07 Turbo Edition", "Mitsubishi"),
+    ("001 Limited", "Brand"),
+    ("1500 Laramie Crew Cab", "RAM"),
+    ("911 Carrera 4S Coupe", "Porsche"),
+    ("911 385 HP Cabriolet", "Porsche"),
+    ("Patrol 400 HP V8", "Nissan"),
+    ("Camry 2020 Hybrid", "Toyota"),
+    ("Corolla 1.6L 120HP Sedan", "Toyota"),
+    ("Civic 108-HP FWD", "Honda"),
+    ("Accord Sport 74,000Km", "Honda"),
+    ("EXCELLENT DEAL for our Patrol LE Platinum", "Nissan"),
+    ("Patrol for sale with warranty", "Nissan"),
+    ("X5 xDrive40i BMW X5 M Sport", "BMW"),
+    ("Range Rover Velar Land Rover Warranty", "Land Rover"),
+    ("Model 3 Long Range / Dual Motor", "Tesla"),
+    ("G 63 AMG | Brabus Kit", "Mercedes-Benz"),
+    ("(Q7) 45 TFSI quattro", "Audi"),
+    ("A6, 2019, GCC", "Audi"),
+    ("  Tahoe   LTZ   ", "Chevrolet"),
+    ("GCC Specs Only", "Kia"),
+    ("2021", "Hyundai"),
+    ("- Sportage", "Kia"),
+    ("", "Toyota"),
+    ("Yaris Hatchback", ""),
+    ("Sunny SV", None),
+    (None, "Nissan"),
+    (float("nan"), "Nissan"),
+]
+
+VOCAB = [
+    "S-Class", "CX-5", "F-150", "GT-R", "Land", "Cruiser", "X5", "07", "1500", "911", "385",
+    "2.0L", "4.0L", "2L-6CYL", "360HP", "108-HP", "HP", "HP)", "(BHP)", "2019", "1999",
+    "74,000Km", "120000KM", "AWD", "SUV", "GCC", "Specs", "Automatic", "A/T", "EXCELLENT",
+    "DEAL", "for", "our", "with", "and", "FULL", "OPTION", "-", "|", ",", "/", "Toyota", "toyota",
+    "Limited", "Sport", "(Platinum)", "", "  ",
+]
+
+
+@pytest.fixture(autouse=True)
+def _clear_token_cache():
+    classify_token.cache_clear()
+    yield
+
+
+@pytest.mark.parametrize("type_str, brand", CASES)
+def test_extract_model_matches_reference(type_str, brand):
+    assert extract_model_from_type(type_str, brand) == reference_extract_model(type_str, brand)
+
+
+def test_random_titles_match_reference():
+    rng = random.Random(0)
+    for _ in range(5000):
+        type_str = " ".join(rng.choice(VOCAB) for _ in range(rng.randint(1, 8)))
+        brand = rng.choice(["Toyota", "Land Rover", "Mercedes-Benz", ""])
+        assert extract_model_from_type(type_str, brand) == reference_extract_model(type_str, brand), type_str
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_extract_model_batch_matches_reference(workers, monkeypatch):
+    # the pool only starts above PARALLEL_MIN_ROWS distinct pairs
+    monkeypatch.setattr("scraper.preprocessing.brand_extract.PARALLEL_MIN_ROWS", 1)
+    types = pd.Series([t for t, _ in CASES] * 3, index=range(100, 100 + 3 * len(CASES)))
+    brands = pd.Series([b for _, b in CASES] * 3, index=types.index)
+
+    models = extract_model_batch(types, brands, workers=workers)
+
+    expected = [reference_extract_model(t, "" if pd.isna(b) else b) for t, b in zip(types, brands)]
+    assert models.index.equals(types.index)
+    assert models.tolist() == expected
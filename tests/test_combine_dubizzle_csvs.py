@@ -0,0 +1,20 @@
+"""
+combine_dubizzle_csvs.py on part files with malformed numeric cells.
+"""
+import pyarrow.csv as pcsv
+
+from scraper.preprocessing.combine_dubizzle_csvs import combine_csv_files
+
+
+def test_malformed_numbers_are_coerced_not_fatal(tmp_path):
+    (tmp_path / "dubizzle_used_cars_part_1.csv").write_text(
+        'brand,model,type,price_aed,year,kms,url\n'
+        'Toyota,Camry,SE,"401,000",2019,"120,000 km",u1\n'
+        'Nissan,Patrol,LE,call for price,20x9,,u2\n'
+    )
+    out = tmp_path / "combined.csv"
+
+    combine_csv_files(tmp_path, out, 1)
+
+    rows = pcsv.read_csv(out).to_pylist()
+    assert [(r["price_aed"], r["year"], r["kms"]) for r in rows] == [(401000, 2019, 120000), (None, None, None)]
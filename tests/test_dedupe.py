@@ -0,0 +1,105 @@
+"""
+Cross-site duplicate clustering in dedupe.py, from CSVs in the Dubicars and
+auto.ae layouts through the source loaders.
+"""
+from itertools import count
+
+import pandas as pd
+import pytest
+
+from scraper.preprocessing import canonical, dedupe
+
+DUBICARS_COLUMNS = [
+    "title", "url", "make_detail", "model_detail", "year", "kms_numeric", "price",
+    "color_detail", "specs_detail",
+]
+LISTING_IDS = count(1)
+AUTO_AE_COLUMNS = [
+    "title", "year", "kms_raw", "price_raw", "url", "trim", "color",
+    "steering_side", "engine_fuel", "vehicle_type", "specs_detail",
+]
+
+
+@pytest.fixture(autouse=True)
+def _no_canonical_tables(monkeypatch, tmp_path):
+    # known models come from the listings alone, whatever is built on disk
+    monkeypatch.setattr(canonical, "MODELS_CSV", tmp_path / "models.csv")
+    load_aliases = canonical.load_aliases
+    monkeypatch.setattr(canonical, "load_aliases", lambda: load_aliases(tmp_path / "aliases.csv"))
+
+
+def load(tmp_path, dubicars_rows, auto_ae_rows):
+    dubicars_csv, auto_ae_csv = tmp_path / "dubicars.csv", tmp_path / "auto_ae.csv"
+    pd.DataFrame(dubicars_rows, columns=DUBICARS_COLUMNS).to_csv(dubicars_csv, index=False)
+    pd.DataFrame(auto_ae_rows, columns=AUTO_AE_COLUMNS).to_csv(auto_ae_csv, index=False)
+    frames = [dedupe.load_dubicars(dubicars_csv), dedupe.load_auto_ae(auto_ae_csv)]
+    return dedupe.dedupe(pd.concat(frames, ignore_index=True))
+
+
+def dubicars(title, model, year, kms, price, color="White", specs="GCC", make="Toyota", url=None):
+    return [title, url or f"https://www.dubicars.com/{next(LISTING_IDS)}.html",
+            make, model, year, kms, price, color, specs]
+
+
+def auto_ae(title, year, kms, price, trim="N/A", color="White", specs="GCC Specs", url=None):
+    return [title, year, f"{kms:,} km", f"{price:,} AED",
+            url or f"https://auto.ae/dubai/sale/car/id/{next(LISTING_IDS)}/",
+            trim, color, "Left-Hand Drive", "N/A", "N/A", specs]
+
+
+def test_same_car_on_auto_ae_and_dubicars_is_one_cluster(tmp_path):
+    df = load(
+        tmp_path,
+        [
+            dubicars("Toyota Hilux GLXS 2.7L | Monthly 1,200/- | 0% DP | Warranty", "Hilux", 2021, 64000, 98000),
+            dubicars("Lamborghini Huracan 2018 I LAMBORGHINI HURACAN I FULL SERVICE HISTORY", "Huracan",
+                     2018, 16197, 660000, color="Blue", specs="European Specs", make="Lamborghini"),
+        ],
+        [
+            auto_ae("Toyota Hilux VIII Facelift 2", 2021, 64000, 99000),
+            auto_ae("Lamborghini Huracán I", 2018, 16197, 639999, color="Blue", specs="European Specs"),
+        ],
+    )
+
+    assert df["cluster_id"].nunique() == 2
+    assert (df.groupby("cluster_id")["source"].nunique() == 2).all()
+    assert set(df["model"]) == {"hilux", "huracan"}
+
+
+def test_base_model_drops_generation_and_variant_words():
+    known = {"toyota": {"hilux", "rav4", "landcruiser"}, "land-rover": {"rangerover", "rangeroversport"}}
+
+    assert dedupe.base_model("toyota", "Hilux VIII Facelift 2", known, {}) == "hilux"
+    assert dedupe.base_model("toyota", "RAV4 V XA50", known, {}) == "rav4"
+    assert dedupe.base_model("toyota", "Land Cruiser 300 Series", known, {}) == "landcruiser"
+    assert dedupe.base_model("land-rover", "Range Rover Sport P525 II", known, {}) == "rangerover"
+    assert dedupe.base_model("toyota", "Supra V", known, {}) == "suprav"
+    assert dedupe.base_model("toyota", "LC 300", {"toyota": {"landcruiser"}},
+                             {("toyota", "lc"): "landcruiser"}) == "landcruiser"
+
+
+def test_new_units_on_one_site_stay_apart(tmp_path):
+    # one dealer's identical new cars: 0 km, near-identical prices, different URLs
+    df = load(
+        tmp_path,
+        [dubicars("Toyota Land Cruiser 300 GXR 3.5L", "Land Cruiser", 2025, 0, 245000 + i * 1000) for i in range(4)],
+        [auto_ae("Toyota Land Cruiser 300 Series", 2025, 0, 245000 + i * 1000) for i in range(4)],
+    )
+
+    assert df.groupby("source")["cluster_id"].nunique().to_dict() == {"auto_ae": 4, "dubicars": 4}
+
+
+def test_cluster_members_stay_within_price_tolerance(tmp_path):
+    # each neighbour is within 5% of the next, the ends are not
+    df = load(
+        tmp_path,
+        [
+            dubicars("Ferrari Purosangue", "Purosangue", 2024, 5000, 2_590_000, color="Red", make="Ferrari"),
+            dubicars("Ferrari Purosangue", "Purosangue", 2024, 5000, 2_750_000, color="Red", make="Ferrari"),
+        ],
+        [auto_ae("Ferrari Purosangue I", 2024, 5000, 2_670_000, color="Red")],
+    )
+
+    prices = df.groupby("cluster_id")["price"].agg(["min", "max"])
+    assert ((prices["max"] - prices["min"]) <= dedupe.PRICE_TOLERANCE * prices["max"]).all()
+    assert df["cluster_id"].nunique() == 2
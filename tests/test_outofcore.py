@@ -0,0 +1,29 @@
+"""
+Row ids and folds in outofcore.py stay with their rows as sources grow.
+"""
+import pandas as pd
+
+from ai_training.outofcore import row_id_folds, stream_rows
+
+
+def ids_by_url(sources):
+    ids = [i for ids, _, _ in stream_rows(sources, target="price_aed") for i in ids]
+    urls = [u for source in sources for u in pd.read_csv(source)["url"]]
+    return dict(zip(urls, zip(ids, row_id_folds(ids))))
+
+
+def test_row_keeps_id_and_fold_when_rows_are_inserted_before_it(tmp_path):
+    rows = pd.DataFrame({
+        "url": [f"https://example.com/{i}" for i in range(50)],
+        "brand": "toyota", "model": "camry", "kms": range(0, 50_000, 1000), "price_aed": 50_000.0,
+    })
+    first, second = tmp_path / "first.csv", tmp_path / "second.csv"
+    rows[:25].to_csv(first, index=False)
+    rows[25:].to_csv(second, index=False)
+    before = ids_by_url([first, second])
+
+    new = rows[:5].assign(url=[f"https://example.com/new-{i}" for i in range(5)])
+    pd.concat([new, rows[:25]]).to_csv(first, index=False)
+    after = ids_by_url([first, second])
+
+    assert all(after[url] == before[url] for url in rows["url"])
@@ -0,0 +1,27 @@
+"""
+Stage fingerprints in pipeline.py cover the code a stage imports.
+"""
+import inspect
+from pathlib import Path
+
+from scraper.preprocessing import cleaning, pipeline, validate
+
+
+def stage(name):
+    return next(s for s in pipeline.STAGES if s.name == name)
+
+
+def test_validate_stage_fingerprint_covers_cleaning_aliases():
+    code = pipeline.code_files(Path(inspect.getsourcefile(validate.validate_dubicars)))
+
+    assert Path(cleaning.__file__).resolve() in code
+
+
+def test_fingerprint_changes_with_imported_module(monkeypatch):
+    validate_stage = stage("dubicars_validate")
+    before = pipeline.stage_fingerprint(validate_stage)
+    cleaning_py = Path(cleaning.__file__).resolve()
+    real_hash = pipeline.hash_path
+    monkeypatch.setattr(pipeline, "hash_path", lambda p: "edited" if Path(p).resolve() == cleaning_py else real_hash(p))
+
+    assert pipeline.stage_fingerprint(validate_stage) != before